@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
-from .models import Category, Product, Retailer, Order, Employee, Truck, Shipment,OdooCredentials
+from .models import Category, Product, Retailer, Order, Employee, Truck, Shipment,OdooCredentials, AllocationJob, Trip, StockReservation, OrderBatch, OdooOutboxMessage
+from .odoo_outbox import requeue_dead_messages
 
 # ✅ Category Admin
 @admin.register(Category)
@@ -40,7 +41,7 @@ class EmployeeAdmin(admin.ModelAdmin):
 # ✅ Retailer Admin
 @admin.register(Retailer)
 class RetailerAdmin(admin.ModelAdmin):
-    list_display = ('retailer_id', 'name', 'address', 'contact', 'distance_from_warehouse')  # Changed 'id' to 'retailer_id'
+    list_display = ('retailer_id', 'name', 'address', 'contact', 'distance_from_warehouse', 'latitude', 'longitude')  # Changed 'id' to 'retailer_id'
     search_fields = ('name', 'address')
 
 
@@ -61,4 +62,41 @@ class ShipmentAdmin(admin.ModelAdmin):
 @admin.register(OdooCredentials)
 class OdooCredentialsAdmin(admin.ModelAdmin):
     list_display = ('user', 'db', 'username')  # Fields to display in the admin list view
-    search_fields = ('user__username', 'db', 'username')  
\ No newline at end of file
+    search_fields = ('user__username', 'db', 'username')
+
+@admin.register(AllocationJob)
+class AllocationJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'status', 'strategy', 'orders_processed', 'orders_total', 'allocated_count', 'skipped_count', 'created_at')
+    list_filter = ('status',)
+
+
+@admin.register(Trip)
+class TripAdmin(admin.ModelAdmin):
+    list_display = ('trip_id', 'employee', 'min_distance', 'max_distance', 'load', 'created_at')
+    search_fields = ('employee__user__username',)
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('reservation_id', 'product', 'order', 'quantity', 'status', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('product__name',)
+
+
+@admin.register(OrderBatch)
+class OrderBatchAdmin(admin.ModelAdmin):
+    list_display = ('batch_id', 'created_by', 'idempotency_key', 'order_count', 'created_at')
+    search_fields = ('idempotency_key', 'created_by__username')
+    exclude = ('response',)
+
+
+@admin.register(OdooOutboxMessage)
+class OdooOutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('message_id', 'operation', 'product', 'status', 'attempts', 'next_attempt_at', 'last_error')
+    list_filter = ('status', 'operation')
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected dead messages")
+    def requeue(self, request, queryset):
+        count = requeue_dead_messages(queryset.values_list('message_id', flat=True))
+        self.message_user(request, f"Requeued {count} message(s)")
@@ -1,107 +1,290 @@
 import logging
+from django.conf import settings
 from django.db import transaction
-from django.db.models import F
+from django.db.models import Q
+from django.db.models.functions import Mod
 from rest_framework.response import Response
-from .models import Order, Employee, Shipment, Product
+from .models import Order, Employee, Shipment, Product, Truck, AllocationEvent
+from .allocation_engine import get_strategy, plan_allocation
+from .dashboard import bump_versions
+from .events import emit, emit_shipments
+from .stock import available_to_promise, recompute_product_status, reserve_stock
 
 logger = logging.getLogger(__name__)
 
-def allocate_shipments(request):
+PARTITION_FIELDS = {
+    'product': 'product_id',
+    'category': 'product__category_id',
+}
+
+
+def record_allocation_event(kind, **fields):
+    """Queue an event for the incremental allocator worker, if it is enabled."""
+    if getattr(settings, "INCREMENTAL_ALLOCATION", False):
+        return AllocationEvent.objects.create(kind=kind, **fields)
+    return None
+
+
+def record_allocation_events(kind, rows):
+    """Queue many events of one kind with a single INSERT, if the incremental allocator is enabled."""
+    if getattr(settings, "INCREMENTAL_ALLOCATION", False) and rows:
+        return AllocationEvent.objects.bulk_create([AllocationEvent(kind=kind, **fields) for fields in rows])
+    return []
+
+
+def apply_allocation_plan(plan, touched_product_ids=()):
     """
-    Allocate shipments dynamically based on truck capacity, retailer distance, and product stock.
+    Persist an in-memory allocation plan with set-based writes.
+
+    :param plan: List of ``(order, employee)`` or ``(order, employee, trip)`` tuples,
+                 orders must be pending
+    :param touched_product_ids: Extra products whose status should be recomputed
+    :return: The created shipments, in plan order
+
+    The per-row ``save()`` calls this replaces would fire the Order and
+    Shipment signals; their effects are applied here explicitly instead:
+    the orders' stock is reserved, the trucks used are marked unavailable and
+    the table versions behind the dashboard and the ETags are bumped and
+    the live events are emitted.
+    """
+    if not plan:
+        recompute_product_status(touched_product_ids)
+        return []
+
+    shipments = Shipment.objects.bulk_create(
+        [
+            Shipment(order=order, employee=employee, trip=trip[0] if trip else None, status='in_transit')
+            for order, employee, *trip in plan
+        ]
+    )
+
+    Order.objects.filter(order_id__in=[order.order_id for order, *_ in plan]).update(status='allocated')
+    for order, *_ in plan:
+        order.status = 'allocated'
+    bump_versions(Order, Shipment)
+    emit('order', 'updated', [order.order_id for order, *_ in plan])
+    emit_shipments('created', shipments)
+
+    # Hold the stock in the reservation ledger instead of rewriting each product row
+    reserve_stock([order for order, *_ in plan])
+
+    Truck.objects.filter(truck_id__in={employee.truck_id for _, employee, *_ in plan}).update(is_available=False)
+
+    recompute_product_status(touched_product_ids)
+
+    logger.info(f"Allocated {len(shipments)} orders across {len({order.product_id for order, *_ in plan})} products")
+    return shipments
+
+
+def allocate_to_employees(orders, employees, strategy=None, stock=None, capacities=None, dry_run=False):
+    """
+    Plan and persist the allocation of ``orders`` to the trucks of ``employees``.
+
+    :param orders: Pending orders in priority order
+    :param employees: Employees (with ``truck`` loaded) whose trucks are free
+    :param strategy: Allocation strategy name or instance
+    :param stock: Optional dict ``product_id -> available-to-promise quantity``;
+                  computed with ``available_to_promise`` when omitted
+    :param capacities: Optional dict ``truck_id -> remaining capacity``; the full
+                       ``truck.capacity`` is used when omitted
+    :param dry_run: Only plan; allocated entries get ``status: "planned"``, the
+                    chosen truck and employee, and no shipment id
+    :return: Tuple ``(allocated_orders, skipped_orders)`` in the API result format
     """
     allocated_orders = []
     skipped_orders = []
 
-    try:
-        with transaction.atomic():
-            # Fetch all pending orders with related product and retailer
-            orders = Order.objects.filter(status='pending').select_related('product', 'retailer').order_by('order_date')
+    employees_by_truck = {emp.truck.truck_id: emp for emp in employees}
+    orders_by_id = {order.order_id: order for order in orders}
 
-            # Get truck IDs currently in transit
-            assigned_truck_ids = set(
-                Shipment.objects.filter(status='in_transit').values_list('employee__truck__truck_id', flat=True)
-            )
+    packable_orders = []
+    for order in orders:
+        if not order.product_id or not order.retailer_id:
+            skipped_orders.append({"order_id": order.order_id, "reason": "Invalid product or retailer"})
+            continue
+        packable_orders.append((order.order_id, order.product_id, order.required_qty))
+    if stock is None:
+        stock = available_to_promise({product_id for _, product_id, _ in packable_orders})
 
-            # Get employees who have available trucks
-            available_employees = Employee.objects.exclude(truck__truck_id__in=assigned_truck_ids).select_related('truck')
+    assignments, skipped = plan_allocation(
+        packable_orders,
+        [
+            (emp.truck.truck_id, emp.truck.capacity if capacities is None else capacities[emp.truck.truck_id])
+            for emp in employees
+        ],
+        stock,
+        strategy,
+    )
 
-            if not available_employees.exists():
-                return Response({"error": "No available employees with trucks"}, status=400)
+    for order_id, reason in skipped:
+        skipped_orders.append({"order_id": order_id, "reason": reason})
 
-            # Map truck capacities
-            truck_capacity_map = {emp.truck.truck_id: emp.truck.capacity for emp in available_employees}
+    if dry_run:
+        for order_id, truck_id in assignments:
+            allocated_orders.append({
+                "order_id": order_id,
+                "shipment_id": None,
+                "truck_id": truck_id,
+                "employee_id": employees_by_truck[truck_id].employee_id,
+                "status": "planned"
+            })
+        return allocated_orders, skipped_orders
 
-            for order in orders:
-                product = order.product
-                retailer = order.retailer
+    # Apply the whole plan in a handful of set-based statements
+    shipments = apply_allocation_plan(
+        [(orders_by_id[order_id], employees_by_truck[truck_id]) for order_id, truck_id in assignments],
+        touched_product_ids={orders_by_id[order_id].product_id for order_id, _ in skipped},
+    )
 
-                if not product or not retailer:
-                    skipped_orders.append({"order_id": order.order_id, "reason": "Invalid product or retailer"})
-                    continue
+    # A batch run invalidates the incremental allocator's in-memory state
+    if shipments:
+        transaction.on_commit(lambda: record_allocation_event('resync'))
 
-                if product.available_quantity < order.required_qty:
-                    skipped_orders.append({"order_id": order.order_id, "reason": "Insufficient stock"})
+    for shipment in shipments:
+        allocated_orders.append({
+            "order_id": shipment.order_id,
+            "shipment_id": shipment.shipment_id,
+            "status": "allocated"
+        })
 
-                    # ❌ Removed: No need to update total_required_quantity here (was causing double count)
+    return allocated_orders, skipped_orders
 
-                    # Refresh and update status
-                    product.refresh_from_db()
-                    product.update_status()
-                    product.save(update_fields=['status'])
 
-                    continue
+def busy_trucks():
+    """
+    Trucks of in-transit shipments, as a subquery for ``truck_id__in`` filters.
 
-                # Find an employee with a truck that has enough capacity
-                employee = next(
-                    (emp for emp in available_employees if truck_capacity_map.get(emp.truck.truck_id, 0) >= order.required_qty),
-                    None
-                )
+    Shipments of employees without a truck are left out: a NULL in the
+    subquery would make ``NOT IN`` match no truck at all.
+    """
+    return Shipment.objects.filter(status='in_transit', employee__truck__isnull=False).values('employee__truck_id')
 
-                if not employee:
-                    skipped_orders.append({"order_id": order.order_id, "reason": "No suitable truck available"})
-                    continue
 
-                truck = employee.truck  
+def _claim_free_employees(limit=None, lock=True):
+    """
+    Employees whose trucks are free, with the trucks locked (SKIP LOCKED) in
+    the current transaction unless ``lock`` is false.
 
-                # Create a new shipment
-                shipment = Shipment.objects.create(
-                    order=order,
-                    employee=employee,
-                    status='in_transit'
-                )
+    :param limit: Claim at most this many trucks
+    """
+    trucks = Truck.objects.filter(employee__isnull=False).exclude(truck_id__in=busy_trucks()).order_by('truck_id')
+    if lock:
+        trucks = trucks.select_for_update(skip_locked=True)
+    truck_ids = list(trucks.values_list('truck_id', flat=True)[:limit])
+    if lock:
+        # Another worker may have committed shipments between the snapshot and the lock
+        truck_ids = set(truck_ids) - set(
+            Shipment.objects.filter(status='in_transit', employee__truck_id__in=truck_ids)
+            .values_list('employee__truck_id', flat=True)
+        )
+    return list(Employee.objects.filter(truck_id__in=truck_ids).select_related('truck').order_by('truck_id'))
+
+
+def _claim_stock(orders, lock=True):
+    """
+    Available-to-promise stock of the products of ``orders``.
+
+    Products are locked in id order so workers sharing a product cannot
+    deadlock; the lock serialises reservations, the product rows themselves
+    are not written.
+    """
+    products = Product.objects.filter(product_id__in={order.product_id for order in orders})
+    if lock:
+        products = products.select_for_update().order_by('product_id')
+    return available_to_promise(list(products.values_list('product_id', flat=True)))
 
-                # Log product details before update
-                logger.info(f"Before update: Product {product.name} - Available: {product.available_quantity}, Required: {product.total_required_quantity}, Status: {product.status}")
 
-                # Reduce available quantity
-                Product.objects.filter(product_id=product.product_id).update(
-                    available_quantity=F('available_quantity') - order.required_qty
-                )
+def run_allocation(strategy=None, dry_run=False):
+    """
+    Allocate every pending order onto the trucks that are not in transit.
+
+    Orders, trucks and products are locked like in ``allocate_partition``,
+    so runs and partition workers never hand out the same order, truck or
+    stock twice. A dry run reads without locking.
 
-                # Refresh and update status
-                product.refresh_from_db()
-                product.update_status()
-                product.save(update_fields=['status'])
+    :param strategy: Allocation strategy name or instance
+    :param dry_run: Compute the full plan from the current data without writing anything
+    :return: Dict with ``allocated_orders`` and ``skipped_orders``
+    :raises ValueError: If no employee has a free truck
+    """
+    with transaction.atomic():
+        orders = Order.objects.filter(status='pending').order_by('order_date', 'order_id')
+        if not dry_run:
+            # Rows claimed by a concurrent run or partition worker are left to it
+            orders = orders.select_for_update(skip_locked=True, of=('self',))
+        orders = list(orders)
 
-                # Log product details after update
-                logger.info(f"After update: Product {product.name} - Available: {product.available_quantity}, Required: {product.total_required_quantity}, Status: {product.status}")
+        available_employees = _claim_free_employees(lock=not dry_run)
+        if not available_employees:
+            raise ValueError("No available employees with trucks")
 
-                # Update truck capacity
-                truck_capacity_map[truck.truck_id] -= order.required_qty
+        allocated_orders, skipped_orders = allocate_to_employees(
+            orders, available_employees, strategy, _claim_stock(orders, lock=not dry_run), dry_run=dry_run
+        )
 
-                # Mark order as allocated
-                order.status = 'allocated'
-                order.save()
+    return {"allocated_orders": allocated_orders, "skipped_orders": skipped_orders}
 
-                allocated_orders.append({
-                    "order_id": order.order_id,
-                    "shipment_id": shipment.shipment_id,
-                    "status": "allocated"
-                })
 
-        return Response({"allocated_orders": allocated_orders, "skipped_orders": skipped_orders})
+def allocate_shipments(request):
+    """
+    Allocate shipments dynamically based on truck capacity, retailer distance, and product stock.
 
+    The packing itself is done in memory by ``allocation_engine``; the
+    strategy can be picked with the ``strategy`` field of the request and
+    ``"dry_run": true`` returns the plan without persisting it.
+    """
+    dry_run = str(request.data.get("dry_run", "")).lower() in ("1", "true", "yes")
+    try:
+        strategy = get_strategy(request.data.get("strategy"))
+        result = run_allocation(strategy, dry_run=dry_run)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
     except Exception as e:
         logger.error(f"Error: {str(e)}")
-        return Response({"error": str(e)}, status=500)
\ No newline at end of file
+        return Response({"error": str(e)}, status=500)
+
+    if dry_run:
+        result["dry_run"] = True
+    return Response(result)
+
+
+def allocate_partition(partition=0, partitions=1, partition_by='product', strategy=None, order_limit=1000, truck_limit=50,
+                       after=None):
+    """
+    Allocate one slice of the pending orders, safe to run from several workers at once.
+
+    Orders are split by ``product_id`` (or category) modulo ``partitions``.
+    The worker claims up to ``order_limit`` pending orders and ``truck_limit``
+    free trucks with ``SELECT ... FOR UPDATE SKIP LOCKED``, so concurrent
+    workers never see the same rows, and locks the products it draws stock
+    from so their quantities cannot be oversold. Busy trucks and order
+    statuses are re-checked once the locks are held.
+
+    :param after: ``(order_date, order_id)`` cursor returned by the previous call;
+                  claiming resumes after it so stuck orders do not block the rest
+    :return: Dict with the usual ``allocated_orders`` / ``skipped_orders`` lists plus
+             ``cursor``, which is ``None`` once the end of the partition is reached
+    """
+    if partition_by not in PARTITION_FIELDS:
+        raise ValueError(f"partition_by must be one of: {', '.join(PARTITION_FIELDS)}")
+
+    with transaction.atomic():
+        orders = Order.objects.filter(status='pending')
+        if partitions > 1:
+            orders = orders.annotate(
+                partition_key=Mod(PARTITION_FIELDS[partition_by], partitions)
+            ).filter(partition_key=partition)
+        if after is not None:
+            order_date, order_id = after
+            orders = orders.filter(Q(order_date__gt=order_date) | Q(order_date=order_date, order_id__gt=order_id))
+        orders = list(
+            orders.select_for_update(skip_locked=True, of=('self',)).order_by('order_date', 'order_id')[:order_limit]
+        )
+        if not orders:
+            return {"allocated_orders": [], "skipped_orders": [], "cursor": None}
+
+        employees = _claim_free_employees(truck_limit)
+        allocated_orders, skipped_orders = allocate_to_employees(orders, employees, strategy, _claim_stock(orders))
+
+    cursor = (orders[-1].order_date, orders[-1].order_id) if len(orders) == order_limit else None
+    return {"allocated_orders": allocated_orders, "skipped_orders": skipped_orders, "cursor": cursor}
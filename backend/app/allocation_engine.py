@@ -0,0 +1,157 @@
+"""
+Bin-packing engine used by allocation.
+
+The engine works on plain ids and integers only, so it can plan an allocation
+without touching the database. Callers translate the plan back into model
+writes (see ``allocation.py``).
+"""
+from bisect import bisect_left, insort
+
+
+class FirstFitIndex:
+    """
+    Max segment tree over truck capacities kept in preference order.
+
+    ``find`` returns the left-most truck whose remaining capacity fits the
+    requested quantity in O(log n), which is exactly what the old linear
+    ``next(...)`` scan returned.
+    """
+
+    def __init__(self, capacities):
+        size = 1
+        while size < max(len(capacities), 1):
+            size *= 2
+        self.size = size
+        self.tree = [-1] * (2 * size)
+        self.tree[size:size + len(capacities)] = capacities
+        for i in range(size - 1, 0, -1):
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def find(self, qty):
+        """Return the position of the first truck that fits ``qty`` or -1."""
+        tree = self.tree
+        if tree[1] < qty:
+            return -1
+        i = 1
+        while i < self.size:
+            i = 2 * i if tree[2 * i] >= qty else 2 * i + 1
+        return i - self.size
+
+    def consume(self, position, qty):
+        i = position + self.size
+        self.tree[i] -= qty
+        i //= 2
+        while i:
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+            i //= 2
+
+
+class BestFitIndex:
+    """
+    Sorted ``(remaining_capacity, key)`` index.
+
+    ``find`` returns the truck with the smallest remaining capacity that still
+    fits the requested quantity (ties go to the smallest key). Keys default to
+    list positions; ``add``/``remove`` let long-lived callers key it by truck id.
+    """
+
+    def __init__(self, capacities):
+        self.remaining = dict(enumerate(capacities))
+        self.keys = sorted((capacity, key) for key, capacity in self.remaining.items())
+
+    def __contains__(self, key):
+        return key in self.remaining
+
+    def find(self, qty):
+        idx = bisect_left(self.keys, (qty, -1))
+        if idx == len(self.keys):
+            return -1
+        return self.keys[idx][1]
+
+    def consume(self, key, qty):
+        """Take ``qty`` from a truck; a negative ``qty`` gives capacity back."""
+        capacity = self.remove(key)
+        self.add(key, capacity - qty)
+
+    def add(self, key, capacity):
+        self.remaining[key] = capacity
+        insort(self.keys, (capacity, key))
+
+    def remove(self, key):
+        capacity = self.remaining.pop(key)
+        del self.keys[bisect_left(self.keys, (capacity, key))]
+        return capacity
+
+
+class AllocationStrategy:
+    """A capacity index plus the order in which orders are packed."""
+
+    def __init__(self, name, index_class, decreasing=False):
+        self.name = name
+        self.index_class = index_class
+        self.decreasing = decreasing
+
+    def sort_orders(self, orders):
+        if not self.decreasing:
+            return list(orders)
+        # sorted() is stable, so equal quantities keep their priority order
+        return sorted(orders, key=lambda order: order[2], reverse=True)
+
+
+STRATEGIES = {}
+DEFAULT_STRATEGY = "first_fit"
+
+
+def register_strategy(strategy):
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+register_strategy(AllocationStrategy("first_fit", FirstFitIndex))
+register_strategy(AllocationStrategy("first_fit_decreasing", FirstFitIndex, decreasing=True))
+register_strategy(AllocationStrategy("best_fit_decreasing", BestFitIndex, decreasing=True))
+
+
+def get_strategy(name=None):
+    """Look up a registered strategy, raising ``ValueError`` for unknown names."""
+    name = name or DEFAULT_STRATEGY
+    try:
+        return STRATEGIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown allocation strategy '{name}'. Choose from: {', '.join(sorted(STRATEGIES))}")
+
+
+def plan_allocation(orders, trucks, stock, strategy=None):
+    """
+    Pack orders into trucks without touching the database.
+
+    :param orders: Iterable of ``(order_id, product_id, qty)`` in priority order
+    :param trucks: List of ``(truck_id, capacity)`` in preference order
+    :param stock: Dict ``product_id -> available quantity``
+    :param strategy: Strategy name or ``AllocationStrategy`` instance
+    :return: Tuple ``(assignments, skipped)`` where assignments is a list of
+             ``(order_id, truck_id)`` and skipped a list of ``(order_id, reason)``
+    """
+    if not isinstance(strategy, AllocationStrategy):
+        strategy = get_strategy(strategy)
+
+    remaining_stock = dict(stock)
+    index = strategy.index_class([capacity for _, capacity in trucks])
+    assignments = []
+    skipped = []
+
+    for order_id, product_id, qty in strategy.sort_orders(orders):
+        if remaining_stock.get(product_id, 0) < qty:
+            skipped.append((order_id, "Insufficient stock"))
+            continue
+
+        position = index.find(qty)
+        if position < 0:
+            skipped.append((order_id, "No suitable truck available"))
+            continue
+
+        index.consume(position, qty)
+        remaining_stock[product_id] -= qty
+        assignments.append((order_id, trucks[position][0]))
+
+    return assignments, skipped
@@ -0,0 +1,165 @@
+"""
+Background allocation jobs.
+
+``/api/allocation-jobs/`` only queues an ``AllocationJob``; the
+``run_allocation_jobs`` command executes it in chunks of pending orders.
+Every chunk commits its shipments, its ``AllocationJobResult`` rows and the
+job's progress counters, so clients can poll progress and page through the
+results while the job is still running. Workers hold a lease on the job that
+every chunk renews; a job whose worker died is reclaimed by the next
+``claim_next_job`` once the lease expires and resumes where it stopped.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .allocation import allocate_to_employees, busy_trucks
+from .models import AllocationJob, AllocationJobResult, Employee, Order, Product, Shipment
+from .stock import available_to_promise
+
+logger = logging.getLogger(__name__)
+
+# Seconds a worker may go without finishing a chunk before its job can be reclaimed
+LEASE_SECONDS = 5 * 60
+
+
+def allocate_job_chunk(truck_ids, strategy=None, after=None, chunk_size=500):
+    """
+    Allocate the next ``chunk_size`` pending orders onto the job's trucks.
+
+    Trucks keep whatever capacity earlier chunks left on them, so chunking
+    packs the same way as a single ``allocate_shipments`` run. Orders are
+    claimed with SKIP LOCKED and trucks and products are locked, like
+    ``allocate_partition``.
+
+    :return: Tuple ``(orders_claimed, allocated_orders, skipped_orders, cursor)``
+    """
+    with transaction.atomic():
+        orders = Order.objects.filter(status='pending')
+        if after is not None:
+            order_date, order_id = after
+            orders = orders.filter(Q(order_date__gt=order_date) | Q(order_date=order_date, order_id__gt=order_id))
+        orders = list(
+            orders.select_for_update(skip_locked=True, of=('self',)).order_by('order_date', 'order_id')[:chunk_size]
+        )
+        if not orders:
+            return 0, [], [], None
+
+        employees = list(
+            Employee.objects.filter(truck_id__in=truck_ids)
+            .select_related('truck')
+            .select_for_update(of=('truck',))
+            .order_by('truck_id')
+        )
+        loads = dict(
+            Shipment.objects.filter(status='in_transit', employee__truck_id__in=truck_ids)
+            .values_list('employee__truck_id')
+            .annotate(load=Sum('order__required_qty'))
+        )
+        capacities = {emp.truck_id: max(0, emp.truck.capacity - loads.get(emp.truck_id, 0)) for emp in employees}
+
+        product_ids = list(
+            Product.objects.select_for_update()
+            .filter(product_id__in={order.product_id for order in orders})
+            .order_by('product_id')
+            .values_list('product_id', flat=True)
+        )
+        stock = available_to_promise(product_ids)
+
+        allocated_orders, skipped_orders = allocate_to_employees(orders, employees, strategy, stock, capacities)
+
+    cursor = (orders[-1].order_date, orders[-1].order_id) if len(orders) == chunk_size else None
+    return len(orders), allocated_orders, skipped_orders, cursor
+
+
+class JobLeaseLost(Exception):
+    """The job's lease expired and another worker reclaimed it."""
+
+
+def run_allocation_job(job, chunk_size=500):
+    """
+    Execute a claimed job, recording progress and results after every chunk.
+
+    Each chunk commits its shipments, results, cursor and a renewed lease
+    together, so a job reclaimed after its worker died resumes after the last
+    committed chunk, on the same trucks, without repeating results.
+    """
+    if job.truck_ids is None:
+        # The job packs onto the trucks that were free when it started
+        job.truck_ids = list(
+            Employee.objects.filter(truck__isnull=False).exclude(truck_id__in=busy_trucks())
+            .values_list('truck_id', flat=True)
+        )
+        job.started_at = timezone.now()
+        job.orders_total = Order.objects.filter(status='pending').count()
+        job.save(update_fields=['truck_ids', 'started_at', 'orders_total'])
+    cursor = None if job.cursor_order_id is None else (job.cursor_order_date, job.cursor_order_id)
+
+    try:
+        while True:
+            with transaction.atomic():
+                claimed, allocated_orders, skipped_orders, cursor = allocate_job_chunk(
+                    job.truck_ids, job.strategy or None, cursor, chunk_size
+                )
+                AllocationJobResult.objects.bulk_create(
+                    [
+                        AllocationJobResult(job=job, order_id=entry["order_id"], allocated=True,
+                                            shipment_id=entry["shipment_id"])
+                        for entry in allocated_orders
+                    ] + [
+                        AllocationJobResult(job=job, order_id=entry["order_id"], allocated=False,
+                                            reason=entry["reason"])
+                        for entry in skipped_orders
+                    ]
+                )
+                lease = timezone.now() + timedelta(seconds=LEASE_SECONDS)
+                changes = {
+                    "orders_processed": F('orders_processed') + claimed,
+                    "allocated_count": F('allocated_count') + len(allocated_orders),
+                    "skipped_count": F('skipped_count') + len(skipped_orders),
+                    "cursor_order_date": cursor[0] if cursor else None,
+                    "cursor_order_id": cursor[1] if cursor else None,
+                    "locked_until": lease,
+                }
+                if cursor is None:
+                    changes.update(status='completed', finished_at=timezone.now(), locked_until=None)
+                # Rolls the chunk back if another worker reclaimed the job meanwhile
+                if not AllocationJob.objects.filter(job_id=job.job_id, locked_until=job.locked_until).update(**changes):
+                    raise JobLeaseLost()
+                job.locked_until = lease
+            if cursor is None:
+                return True
+    except JobLeaseLost:
+        logger.warning(f"Allocation job {job.job_id} was reclaimed by another worker")
+        return False
+    except Exception as e:
+        logger.error(f"Allocation job {job.job_id} failed: {e}")
+        AllocationJob.objects.filter(job_id=job.job_id, locked_until=job.locked_until).update(
+            status='failed', error=str(e), finished_at=timezone.now(), locked_until=None
+        )
+        return False
+
+
+def claim_next_job(now=None):
+    """
+    Lease the oldest queued job, or a running job whose worker stopped
+    renewing its lease, and return it; ``None`` when there is none.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        job = (
+            AllocationJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='queued') | Q(status='running', locked_until__lt=now))
+            .order_by('job_id')
+            .first()
+        )
+        if job is not None:
+            if job.status == 'running':
+                logger.warning(f"Reclaiming allocation job {job.job_id} after its lease expired")
+            job.status = 'running'
+            job.locked_until = now + timedelta(seconds=LEASE_SECONDS)
+            job.save(update_fields=['status', 'locked_until'])
+        return job
@@ -0,0 +1,72 @@
+"""
+Conditional GET for read endpoints backed by table versions.
+
+``conditional_on(*models)`` gives a DRF function view an ETag derived from
+the request (path, query string, user, ``Accept``) and the current versions
+of the tables its response is built from (``dashboard.get_versions``). A
+poll that sends the ETag back in ``If-None-Match`` while none of those
+tables changed is answered ``304 Not Modified`` after one lookup in the
+small ``TableVersion`` table, without running the view or reading the tables.
+
+Versions are bumped when a transaction commits, after its rows are visible,
+so an ETag is never paired with data older than the versions it was built
+from.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .dashboard import get_versions
+
+
+def compute_etag(request, versions):
+    """Strong ETag for ``request`` against the given table ``versions``."""
+    key = [
+        request.path,
+        sorted(request.GET.lists()),
+        getattr(request.user, 'pk', None),
+        request.META.get('HTTP_ACCEPT', ''),
+        versions,
+    ]
+    return '"%s"' % hashlib.sha1(json.dumps(key, separators=(',', ':')).encode()).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of ``etag`` against an ``If-None-Match`` header value."""
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}
+
+
+def conditional_on(*models):
+    """
+    Answer ``If-None-Match`` polls of a view whose response only depends on
+    the rows of ``models`` with ``304 Not Modified``.
+
+    Apply it under ``@permission_classes`` so authentication and permissions
+    are checked before the ETag is.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Read before the view queries anything: a concurrent commit then only costs a refetch
+            etag = compute_etag(request, get_versions(*models))
+            if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            response['ETag'] = etag
+            # Clients may keep the body but must revalidate it on every use
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,209 @@
+"""
+Read-through cache for the manager dashboard aggregates.
+
+``get_dashboard_counts`` and ``get_category_stock`` answer from Django's
+cache and only hit the aggregate queries on a miss. Each entry is keyed by
+the versions of the tables it is computed from, so there is nothing to
+invalidate: the commit that changes one of those tables bumps its version
+and every process misses on its next read.
+
+The versions are counters per table (``bump_versions``), which the read
+endpoints also turn into ETags (see ``conditional.py``). Unlike the cached
+aggregates, they live in the database (``TableVersion``): every process,
+including the management command workers, bumps and reads the same
+counters. The model signals bump them when a transaction commits; writes
+that bypass the signals (``bulk_create``, queryset ``update``) call
+``bump_versions`` themselves, and stock updates bump the product version
+through ``stock.recompute_product_status``, which follows every one of them.
+
+Entries also expire after ``settings.DASHBOARD_CACHE_TIMEOUT`` seconds, so
+the keys of old versions do not pile up in the cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Category, Employee, Order, Product, Retailer, Shipment, TableVersion
+
+PRODUCT_STATUSES = ('on_demand', 'sufficient')
+COUNT_NAMES = ('orders_placed', 'pending_orders', 'employees_available', 'retailers_available')
+COUNTS_KEY = "dashboard:counts"
+CATEGORY_STOCK_KEY = "dashboard:category_stock"
+VERSIONED_MODELS = (Category, Employee, Order, Product, Retailer, Shipment)
+# Tables each cached aggregate is computed from, in the order their versions enter its key
+COUNT_MODELS = (Order, Employee, Retailer)
+CATEGORY_STOCK_MODELS = (Product, Category)
+
+
+def _timeout():
+    return getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 300)
+
+
+def compute_counts():
+    """Dashboard counters straight from the database (three queries)."""
+    counts = Order.objects.aggregate(
+        orders_placed=Count('pk'),
+        pending_orders=Count('pk', filter=Q(status='pending')),
+    )
+    counts['employees_available'] = Employee.objects.count()
+    counts['retailers_available'] = Retailer.objects.count()
+    return counts
+
+
+def versioned_key(key, models):
+    """
+    ``key`` suffixed with the current versions of ``models`` (one query).
+
+    The cache is local to the process, but the versions are shared: once any
+    process commits a change to one of ``models``, every process misses.
+    """
+    return "%s:%s" % (key, ".".join(str(version) for version in get_versions(*models)))
+
+
+def get_dashboard_counts():
+    """
+    Dashboard counters, from the cache entry for the current table versions.
+
+    :return: Dict with one entry per name in ``COUNT_NAMES``
+    """
+    key = versioned_key(COUNTS_KEY, COUNT_MODELS)
+    counts = cache.get(key)
+    if counts is None:
+        counts = compute_counts()
+        cache.set(key, counts, _timeout())
+    return counts
+
+
+def _version_key(model):
+    return model._meta.label_lower
+
+
+def get_versions(*models):
+    """
+    Current table version of each model, in one primary key lookup.
+
+    :return: List of versions, in the order of ``models``
+    """
+    keys = [_version_key(model) for model in models]
+    versions = dict(TableVersion.objects.filter(table__in=keys).values_list('table', 'version'))
+    return [versions.get(key, 0) for key in keys]
+
+
+def apply_version_bumps(keys):
+    """Bump table versions now, creating the counters that do not exist yet."""
+    keys = sorted(keys)
+    if not keys:
+        return
+    bumped = TableVersion.objects.filter(table__in=keys)
+    if bumped.update(version=F('version') + 1) < len(keys):
+        # A concurrent first bump may create the same rows; bumping twice is harmless
+        TableVersion.objects.bulk_create([TableVersion(table=key) for key in keys], ignore_conflicts=True)
+        bumped.update(version=F('version') + 1)
+
+
+class _VersionBatch:
+    """Version bumps queued in one transaction (or savepoint), applied on commit."""
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+        self.versions = set()
+
+    def flush(self):
+        if self.registry.get(self.key) is self:
+            del self.registry[self.key]
+        apply_version_bumps(self.versions)
+
+
+def _queue(versions, using=None):
+    """
+    Bump table versions once the transaction commits.
+
+    Like ``stock.queue_demand_change``, the bumps of one atomic block are
+    merged and applied by a single ``on_commit`` callback per savepoint, so a
+    rolled back block takes its bumps with it. Outside a transaction they
+    are applied immediately.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        apply_version_bumps(versions)
+        return
+
+    registry = connection.__dict__.setdefault('_version_batches', {})
+    key = tuple(connection.savepoint_ids)
+    batch = registry.get(key)
+    if batch is None or not any(callback == batch.flush for _, callback, _ in connection.run_on_commit):
+        batch = registry[key] = _VersionBatch(registry, key)
+        transaction.on_commit(batch.flush, using=using)
+    batch.versions.update(versions)
+
+
+def bump_versions(*models, using=None):
+    """Move the table version of each model on once the transaction commits."""
+    _queue([_version_key(model) for model in models], using=using)
+
+
+def invalidate_dashboard(using=None):
+    """Bump every table version, missing every dashboard entry and ETag, once the transaction commits."""
+    _queue([_version_key(model) for model in VERSIONED_MODELS], using=using)
+
+
+def category_stock_queryset(search=None, category_ids=None, product_status=None, include_empty=True):
+    """The aggregate query behind ``compute_category_stock``, which documents the parameters."""
+    from .stock import promisable_expression
+
+    products = Q(products__status=product_status) if product_status else None
+    categories = Category.objects.all()
+    if search:
+        categories = categories.filter(name__icontains=search)
+    if category_ids is not None:
+        categories = categories.filter(category_id__in=category_ids)
+
+    rows = categories.values('category_id', 'name').annotate(
+        product_count=Count('products', filter=products),
+        total_available=Coalesce(Sum('products__available_quantity', filter=products), 0),
+        total_promisable=Coalesce(Sum(promisable_expression('products__'), filter=products), 0),
+        total_required=Coalesce(Sum('products__total_required_quantity', filter=products), 0),
+        total_shipped=Coalesce(Sum('products__total_shipped', filter=products), 0),
+    )
+    if not include_empty:
+        rows = rows.filter(product_count__gt=0)
+    return rows.order_by('category_id')
+
+
+def compute_category_stock(search=None, category_ids=None, product_status=None, include_empty=True):
+    """
+    Per-category product counts and unit totals in a single GROUP BY query.
+
+    :param search: Only categories whose name contains this (case-insensitive)
+    :param category_ids: Only these categories
+    :param product_status: Only aggregate products with this status (see ``PRODUCT_STATUSES``)
+    :param include_empty: Also list categories without a matching product
+    :return: List of dicts with ``category_id``, ``name``, ``product_count``,
+             ``value`` (the product count, for the chart), ``total_available``,
+             ``total_promisable`` (available to promise, see
+             ``stock.available_to_promise``), ``total_required`` and
+             ``total_shipped``, ordered by category
+    """
+    data = list(category_stock_queryset(search, category_ids, product_status, include_empty))
+    for row in data:
+        row['value'] = row['product_count']
+    return data
+
+
+def get_category_stock(**filters):
+    """
+    Category breakdown (see ``compute_category_stock``). The unfiltered
+    breakdown the dashboard polls is cached; filtered ones are computed.
+    """
+    if any(value not in (None, True) for value in filters.values()):
+        return compute_category_stock(**filters)
+
+    key = versioned_key(CATEGORY_STOCK_KEY, CATEGORY_STOCK_MODELS)
+    data = cache.get(key)
+    if data is None:
+        data = compute_category_stock()
+        cache.set(key, data, _timeout())
+    return data
@@ -0,0 +1,220 @@
+"""
+Distance-aware dispatch batching.
+
+Pending orders are bucketed into distance bands by their retailer's
+``distance_from_warehouse`` and every band is packed onto as few trucks as
+possible, so a truck only drives to one part of the map per trip. Grouping is
+a sort plus bisect-based packing over indexes of the free trucks and of the
+orders still waiting, O(n log n) in the number of orders.
+"""
+from bisect import bisect_right
+
+from django.db import transaction
+
+from .allocation import apply_allocation_plan, busy_trucks, record_allocation_event
+from .allocation_engine import BestFitIndex
+from .models import Employee, Order, Trip
+from .stock import available_to_promise
+
+DEFAULT_BAND_WIDTH = 25.0
+
+
+class _FreeSlots:
+    """
+    Positions ``0..n-1`` of a sorted list, each taken at most once.
+
+    ``last(i)`` is the highest position ``<= i`` not taken yet (or -1); taken
+    positions are skipped through a union-find with path halving, so packing
+    a band costs amortized near-constant time per lookup instead of a list
+    deletion per packed order.
+    """
+
+    def __init__(self, n):
+        # Shifted by one: slot 0 is a sentinel standing for position -1
+        self.parent = list(range(n + 1))
+
+    def last(self, i):
+        parent = self.parent
+        x = i + 1
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x - 1
+
+    def take(self, i):
+        self.parent[i + 1] = i
+
+
+def plan_trips(orders, trucks, stock, band_width=DEFAULT_BAND_WIDTH):
+    """
+    Group orders into truck trips by distance band without touching the database.
+
+    Stock is taken as orders are packed, nearest band first, so an order that
+    finds no truck leaves its stock to the others.
+
+    :param orders: Iterable of ``(order_id, product_id, qty, distance)``
+    :param trucks: List of ``(truck_id, capacity)``
+    :param stock: Dict ``product_id -> available quantity``
+    :param band_width: Width of a distance band in the unit of ``distance_from_warehouse``
+    :return: Tuple ``(trips, skipped)``; each trip is a dict with ``truck_id``,
+             ``min_distance``, ``max_distance``, ``load`` and ``orders`` (a list of
+             ``(order_id, qty, distance)`` sorted by distance)
+    """
+    if band_width <= 0:
+        raise ValueError("band_width must be positive")
+
+    remaining_stock = dict(stock)
+    bands = {}
+    skipped = []
+    for order_id, product_id, qty, distance in orders:
+        if remaining_stock.get(product_id, 0) < qty:
+            skipped.append((order_id, "Insufficient stock"))
+            continue
+        bands.setdefault(int(distance // band_width), []).append((qty, order_id, distance, product_id))
+
+    trucks = sorted(trucks)
+    free_trucks = BestFitIndex([capacity for _, capacity in trucks])
+    trips = []
+
+    # Nearest bands are served first
+    for band in sorted(bands):
+        waiting = sorted(bands[band])
+        quantities = [qty for qty, _, _, _ in waiting]
+        slots = _FreeSlots(len(waiting))
+        band_load = sum(quantities)
+        left = len(waiting)
+
+        while left and free_trucks.keys:
+            # Smallest truck that takes the rest of the band in one trip, else the largest one
+            position = free_trucks.find(band_load)
+            if position == -1:
+                position = free_trucks.keys[-1][1]
+            capacity = free_trucks.remaining[position]
+
+            room = capacity
+            loaded = []
+            taken = 0
+            # Largest waiting order that still fits, until none does
+            i = slots.last(bisect_right(quantities, room) - 1)
+            while i >= 0:
+                qty, order_id, distance, product_id = waiting[i]
+                slots.take(i)
+                taken += 1
+                band_load -= qty
+                if remaining_stock[product_id] < qty:
+                    # Orders packed before it took the stock
+                    skipped.append((order_id, "Insufficient stock"))
+                else:
+                    remaining_stock[product_id] -= qty
+                    room -= qty
+                    loaded.append((order_id, qty, distance))
+                i = slots.last(bisect_right(quantities, room) - 1)
+
+            left -= taken
+            if not loaded:
+                if not taken:
+                    # Not even the largest free truck fits the smallest remaining order
+                    break
+                continue
+
+            free_trucks.remove(position)
+            loaded.sort(key=lambda entry: entry[2])
+            trips.append({
+                "truck_id": trucks[position][0],
+                "min_distance": loaded[0][2],
+                "max_distance": loaded[-1][2],
+                "load": capacity - room,
+                "orders": loaded,
+            })
+
+        i = slots.last(len(waiting) - 1)
+        unloaded = []
+        while i >= 0:
+            unloaded.append((waiting[i][1], "No suitable truck available"))
+            i = slots.last(i - 1)
+        skipped.extend(reversed(unloaded))
+
+    return trips, skipped
+
+
+def run_dispatch(band_width=DEFAULT_BAND_WIDTH, dry_run=False):
+    """
+    Batch every pending order into distance-banded trips on the free trucks.
+
+    :return: Dict with ``trips`` (the trip plan), ``allocated_orders`` and ``skipped_orders``
+    :raises ValueError: If no employee has a free truck or ``band_width`` is invalid
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects.filter(status='pending')
+            .select_related('retailer')
+            .order_by('order_date')
+        )
+        employees = list(
+            Employee.objects.filter(truck__isnull=False).exclude(truck_id__in=busy_trucks()).select_related('truck')
+        )
+        if not employees:
+            raise ValueError("No available employees with trucks")
+
+        trips, skipped = plan_trips(
+            [
+                (order.order_id, order.product_id, order.required_qty, order.retailer.distance_from_warehouse)
+                for order in orders
+            ],
+            [(emp.truck_id, emp.truck.capacity) for emp in employees],
+            available_to_promise({order.product_id for order in orders}),
+            band_width,
+        )
+
+        employees_by_truck = {emp.truck_id: emp for emp in employees}
+        orders_by_id = {order.order_id: order for order in orders}
+        skipped_orders = [{"order_id": order_id, "reason": reason} for order_id, reason in skipped]
+
+        if dry_run:
+            trip_ids = [None] * len(trips)
+            shipment_ids = {}
+        else:
+            trip_objs = Trip.objects.bulk_create([
+                Trip(
+                    employee=employees_by_truck[trip["truck_id"]],
+                    min_distance=trip["min_distance"],
+                    max_distance=trip["max_distance"],
+                    load=trip["load"],
+                )
+                for trip in trips
+            ])
+            trip_ids = [trip.trip_id for trip in trip_objs]
+            shipments = apply_allocation_plan(
+                [
+                    (orders_by_id[order_id], employees_by_truck[trip["truck_id"]], trip_obj)
+                    for trip, trip_obj in zip(trips, trip_objs)
+                    for order_id, _, _ in trip["orders"]
+                ],
+                touched_product_ids={orders_by_id[order_id].product_id for order_id, _ in skipped},
+            )
+            shipment_ids = {shipment.order_id: shipment.shipment_id for shipment in shipments}
+            if shipments:
+                transaction.on_commit(lambda: record_allocation_event('resync'))
+
+    trip_plan = [
+        {
+            "trip_id": trip_id,
+            "truck_id": trip["truck_id"],
+            "employee_id": employees_by_truck[trip["truck_id"]].employee_id,
+            "min_distance": trip["min_distance"],
+            "max_distance": trip["max_distance"],
+            "load": trip["load"],
+            "order_ids": [order_id for order_id, _, _ in trip["orders"]],
+        }
+        for trip, trip_id in zip(trips, trip_ids)
+    ]
+    allocated_orders = [
+        {
+            "order_id": order_id,
+            "shipment_id": shipment_ids.get(order_id),
+            "status": "planned" if dry_run else "allocated",
+        }
+        for trip in trips
+        for order_id, _, _ in trip["orders"]
+    ]
+    return {"trips": trip_plan, "allocated_orders": allocated_orders, "skipped_orders": skipped_orders}
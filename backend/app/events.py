@@ -0,0 +1,333 @@
+"""
+Live change events for the dashboards.
+
+Order, product and shipment changes are turned into compact events, e.g.
+``{"type": "shipment", "action": "updated", "ids": [12, 13]}``, by the model
+signals and by the bulk paths that skip them (``emit``). They are published
+when the transaction commits, merged per type and action, so a client never
+hears about rows it cannot read yet and a batch of 500 orders is one event.
+
+Events go through a broker on channels:
+
+- ``managers``: every event,
+- ``employee:<employee_id>``: the shipments of that employee.
+
+``PostgresBroker`` relays the events of every process (web workers and the
+management command workers alike) with LISTEN/NOTIFY. ``LocalBroker`` only
+reaches the subscribers of the publishing process; it stands in for the
+shared broker in tests and single-process setups. The broker is picked with
+``settings.EVENT_BROKER``. ``event_stream`` serves a subscription as
+Server-Sent Events on the ASGI app.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.module_loading import import_string
+
+from .models import Employee
+
+logger = logging.getLogger(__name__)
+
+MANAGERS_CHANNEL = "managers"
+# Events a slow client may fall behind by before it is told to reload everything
+SUBSCRIPTION_QUEUE_SIZE = 100
+NOTIFY_CHANNEL = "ignyte_events"
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+_broker = None
+_broker_path = None
+_broker_lock = threading.Lock()
+
+
+def employee_channel(employee_id):
+    return f"employee:{employee_id}"
+
+
+class Subscription:
+    """
+    Events of some channels, buffered for one consumer on the event loop that subscribed.
+
+    A consumer that falls ``SUBSCRIPTION_QUEUE_SIZE`` events behind loses
+    them and gets a single ``{"type": "resync"}`` event instead.
+    """
+
+    def __init__(self, broker, channels, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        """Hand ``event`` to the consumer; safe to call from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The consumer's loop is closed, it will not read anymore
+            self.close()
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """
+        :param timeout: Seconds to wait for an event
+        :return: The next event, or ``None`` when none came within ``timeout``
+        """
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return {"type": "resync"}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process publish/subscribe between the request threads and the event loop."""
+    # Whether subscribers also receive the events published by other processes
+    shared = False
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def publish(self, channel, event):
+        """:return: Number of subscriptions the event was delivered to"""
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+        return len(subscriptions)
+
+    def subscribe(self, *channels):
+        """Subscribe the running event loop to ``channels``; close the subscription when done."""
+        subscription = Subscription(self, channels)
+        with self.lock:
+            for channel in channels:
+                self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscriptions[channel]
+
+    def resync(self):
+        """Tell every subscriber that events may have been missed."""
+        with self.lock:
+            subscriptions = set().union(*self.subscriptions.values())
+        for subscription in subscriptions:
+            subscription.deliver({"type": "resync"})
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Publish/subscribe across processes over PostgreSQL LISTEN/NOTIFY.
+
+    ``publish`` sends a NOTIFY on the caller's database connection. Each
+    process runs one listener thread, on its own connection, that hands the
+    notifications of every process to its local subscribers. Notifications
+    sent while the listener (re)connects are lost, so the subscribers get a
+    ``resync`` event each time it connects.
+    """
+    shared = True
+    reconnect_delay = 5
+    # Seconds the listener waits for a notification before checking whether it was closed
+    poll_timeout = 1
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        super().__init__()
+        self.using = using
+        self.listener = None
+        self.closed = threading.Event()
+
+    def publish(self, channel, event):
+        payload = json.dumps({"channel": channel, "event": event}, separators=(',', ':'))
+        if len(payload) > NOTIFY_PAYLOAD_LIMIT:
+            # Too many ids for one notification: any row may have changed
+            payload = json.dumps({"channel": channel, "event": {**event, "ids": None}}, separators=(',', ':'))
+        with connections[self.using].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [NOTIFY_CHANNEL, payload])
+
+    def subscribe(self, *channels):
+        subscription = super().subscribe(*channels)
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.closed.clear()
+                self.listener = threading.Thread(target=self.listen, name="live-event-listener", daemon=True)
+                self.listener.start()
+        return subscription
+
+    def close(self):
+        """Stop the listener thread."""
+        self.closed.set()
+        if self.listener is not None:
+            self.listener.join()
+
+    def connect(self):
+        """A new autocommit driver connection (psycopg or psycopg2) to the broker's database."""
+        wrapper = connections[self.using]
+        connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        connection.autocommit = True
+        return connection
+
+    def notifications(self, connection):
+        """Payloads received by ``connection``, until the broker is closed."""
+        while not self.closed.is_set():
+            if hasattr(connection, 'poll'):
+                # psycopg2
+                if select.select([connection], [], [], self.poll_timeout) != ([], [], []):
+                    connection.poll()
+                    while connection.notifies:
+                        yield connection.notifies.pop(0).payload
+            else:
+                for notify in connection.notifies(timeout=self.poll_timeout):
+                    yield notify.payload
+
+    def listen(self):
+        while not self.closed.is_set():
+            try:
+                connection = self.connect()
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    self.resync()
+                    for payload in self.notifications(connection):
+                        message = json.loads(payload)
+                        LocalBroker.publish(self, message["channel"], message["event"])
+                finally:
+                    connection.close()
+            except Exception as e:
+                logger.warning(f"Live event listener lost its database connection: {e}")
+                self.closed.wait(self.reconnect_delay)
+
+
+def get_broker():
+    """
+    The process-wide broker, an instance of ``settings.EVENT_BROKER``; when
+    unset, ``PostgresBroker`` on PostgreSQL and ``LocalBroker`` otherwise.
+    """
+    global _broker, _broker_path
+    path = getattr(settings, "EVENT_BROKER", None)
+    if path is None:
+        vendor = connections[DEFAULT_DB_ALIAS].vendor
+        path = "app.events.PostgresBroker" if vendor == "postgresql" else "app.events.LocalBroker"
+    with _broker_lock:
+        if _broker_path != path:
+            _broker, _broker_path = import_string(path)(), path
+    return _broker
+
+
+def publish_events(events):
+    """Publish ``(channel, type, action) -> ids`` events; ``ids`` of ``None`` means any row."""
+    broker = get_broker()
+    for (channel, kind, action), ids in events.items():
+        broker.publish(channel, {"type": kind, "action": action, "ids": None if ids is None else sorted(ids)})
+
+
+class _EventBatch:
+    """Events emitted in one transaction (or savepoint), published on commit."""
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+        self.events = {}
+
+    def flush(self):
+        if self.registry.get(self.key) is self:
+            del self.registry[self.key]
+        publish_events(self.events)
+
+
+def emit(kind, action, ids, channels=(MANAGERS_CHANNEL,), using=None):
+    """
+    Publish that rows changed once the transaction commits.
+
+    Events of one atomic block are merged per channel, type and action and
+    published by a single ``on_commit`` callback per savepoint, like
+    ``stock.queue_demand_change``. Outside a transaction they are published
+    immediately.
+
+    :param kind: ``order``, ``product`` or ``shipment``
+    :param action: ``created``, ``updated`` or ``deleted``
+    :param ids: Primary keys of the changed rows, ``None`` for any row
+    :param channels: Channels to publish on
+    """
+    ids = None if ids is None else set(ids)
+    if ids is not None and not ids:
+        return
+    events = {(channel, kind, action): ids for channel in channels}
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        publish_events(events)
+        return
+
+    registry = connection.__dict__.setdefault('_event_batches', {})
+    key = tuple(connection.savepoint_ids)
+    batch = registry.get(key)
+    if batch is None or not any(callback == batch.flush for _, callback, _ in connection.run_on_commit):
+        batch = registry[key] = _EventBatch(registry, key)
+        transaction.on_commit(batch.flush, using=using)
+
+    for event_key, event_ids in events.items():
+        if event_ids is None or batch.events.get(event_key, ()) is None:
+            batch.events[event_key] = None
+        else:
+            batch.events.setdefault(event_key, set()).update(event_ids)
+
+
+def emit_shipments(action, shipments, using=None):
+    """Emit a shipment event to the managers and to the employee of each shipment."""
+    by_employee = {}
+    for shipment in shipments:
+        by_employee.setdefault(shipment.employee_id, []).append(shipment.pk)
+    for employee_id, ids in by_employee.items():
+        emit('shipment', action, ids, channels=(MANAGERS_CHANNEL, employee_channel(employee_id)), using=using)
+
+
+def channels_for(user):
+    """Channels ``user`` may listen to: everything for managers, their own shipments for employees."""
+    if user.is_staff:
+        return [MANAGERS_CHANNEL]
+    employee_id = Employee.objects.filter(user=user).values_list('employee_id', flat=True).first()
+    return [employee_channel(employee_id)] if employee_id is not None else []
+
+
+async def sse_stream(subscription, heartbeat=None):
+    """
+    Server-Sent Events of a subscription, with a comment line every
+    ``heartbeat`` seconds so proxies keep the connection open.
+    """
+    heartbeat = heartbeat or getattr(settings, "EVENT_HEARTBEAT_SECONDS", 15)
+    try:
+        # Clients reconnect after 5s and then reload, having missed events meanwhile
+        yield "retry: 5000\n\n"
+        # Whether the stream carries the changes made by every process, so clients may stop polling
+        yield f"event: ready\ndata: {json.dumps({'shared': subscription.broker.shared})}\n\n"
+        while True:
+            event = await subscription.get(timeout=heartbeat)
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+    finally:
+        subscription.close()
@@ -0,0 +1,137 @@
+"""
+Streaming exports of stock, orders and shipments.
+
+Rows are read with a ``values()`` projection and ``.iterator(chunk_size=...)``
+(a server-side cursor on PostgreSQL), rendered as NDJSON or CSV and
+optionally gzip-compressed on the fly. Nothing holds more than one chunk of
+rows and one output buffer, so memory stays flat however many rows are
+exported; the view hands the generator to a ``StreamingHttpResponse``.
+"""
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Order, Product, Shipment
+
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Export name -> (model, date field filtered by since/until, exported columns as output name -> lookup)
+EXPORTS = {
+    'stock': (Product, 'updated_at', {
+        'product_id': 'product_id',
+        'name': 'name',
+        'category': 'category__name',
+        'available_quantity': 'available_quantity',
+        'total_required_quantity': 'total_required_quantity',
+        'total_shipped': 'total_shipped',
+        'price': 'price',
+        'status': 'status',
+        'updated_at': 'updated_at',
+    }),
+    'orders': (Order, 'order_date', {
+        'order_id': 'order_id',
+        'order_date': 'order_date',
+        'status': 'status',
+        'required_qty': 'required_qty',
+        'product_id': 'product_id',
+        'product': 'product__name',
+        'retailer_id': 'retailer_id',
+        'retailer': 'retailer__name',
+    }),
+    'shipments': (Shipment, 'shipment_date', {
+        'shipment_id': 'shipment_id',
+        'shipment_date': 'shipment_date',
+        'status': 'status',
+        'order_id': 'order_id',
+        'employee_id': 'employee_id',
+        'trip_id': 'trip_id',
+        'retailer': 'order__retailer__name',
+    }),
+}
+
+
+def export_rows(name, since=None, until=None, status=None, chunk_size=CHUNK_SIZE):
+    """
+    Stream the rows of export ``name`` in primary key order.
+
+    :param since: Only rows whose date field is at or after this datetime
+    :param until: Only rows whose date field is before this datetime
+    :param status: Only rows with this status (stock: product status)
+    :return: Iterator of dicts keyed by the export's column names
+    """
+    model, date_field, columns = EXPORTS[name]
+    rows = model.objects.all()
+    if since is not None:
+        rows = rows.filter(**{f"{date_field}__gte": since})
+    if until is not None:
+        rows = rows.filter(**{f"{date_field}__lt": until})
+    if status:
+        rows = rows.filter(status=status)
+    rows = rows.order_by('pk').values_list(*columns.values())
+
+    names = list(columns)
+    for values in rows.iterator(chunk_size=chunk_size):
+        yield dict(zip(names, values))
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+
+class _LineBuffer:
+    """File-like target that hands back what ``csv.writer`` writes."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, columns):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def buffered(lines, flush_bytes=FLUSH_BYTES):
+    """Join text lines into encoded chunks of about ``flush_bytes``, so each write to the client is sizeable."""
+    parts, size = [], 0
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= flush_bytes:
+            yield "".join(parts).encode()
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts).encode()
+
+
+def gzipped(chunks, level=6):
+    """Compress a stream of byte chunks into one gzip member as it goes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(name, fmt='ndjson', compress=False, **filters):
+    """
+    Encoded output of an export, ready for ``StreamingHttpResponse``.
+
+    :param fmt: ``ndjson`` or ``csv``
+    :param compress: Gzip the output
+    :param filters: See ``export_rows``
+    """
+    rows = export_rows(name, **filters)
+    lines = csv_lines(rows, list(EXPORTS[name][2])) if fmt == 'csv' else ndjson_lines(rows)
+    chunks = buffered(lines)
+    return gzipped(chunks) if compress else chunks
@@ -0,0 +1,208 @@
+"""
+In-process fake of the Odoo XML-RPC API.
+
+Serves ``/xmlrpc/2/common`` (``authenticate``, ``version``) and
+``/xmlrpc/2/object`` (``execute_kw``) from memory, with enough of the ORM
+(``create``, ``write``, ``read``, ``search``, ``search_read``,
+``search_count`` with prefix-notation domains) for tests and benchmarks of the Odoo
+integration without a real server. It speaks HTTP/1.1 keep-alive like Odoo
+and counts connections, authentications and calls.
+
+    with FakeOdooServer() as odoo:
+        odoo.add_user("db", "admin", "secret")
+        client = get_odoo_client("db", "admin", "secret", url=odoo.url)
+"""
+import operator
+import threading
+import time
+from socketserver import ThreadingMixIn
+from xmlrpc.client import Fault
+from xmlrpc.server import MultiPathXMLRPCServer, SimpleXMLRPCDispatcher, SimpleXMLRPCRequestHandler
+
+ACCESS_DENIED = 3
+
+DOMAIN_OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    'in': lambda value, options: value in options,
+    'not in': lambda value, options: value not in options,
+}
+
+
+class _Handler(SimpleXMLRPCRequestHandler):
+    protocol_version = "HTTP/1.1"
+    rpc_paths = ("/xmlrpc/2/common", "/xmlrpc/2/object")
+
+    def setup(self):
+        super().setup()
+        self.server.fake.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, MultiPathXMLRPCServer):
+    daemon_threads = True
+
+
+class FakeOdooServer:
+    """
+    Fake Odoo bound to ``127.0.0.1``.
+
+    :param latency: Seconds every call sleeps, to emulate network and ORM time
+    """
+
+    def __init__(self, port=0, latency=0.0):
+        self.latency = latency
+        self.records = {}
+        self.users = {}
+        self.stats = {"connections": 0, "authenticate": 0, "execute_kw": 0}
+        self._next_uid = 2
+        self._next_ids = {}
+        self._lock = threading.Lock()
+
+        self._server = _Server(("127.0.0.1", port), requestHandler=_Handler, logRequests=False, allow_none=True)
+        self._server.fake = self
+
+        common = SimpleXMLRPCDispatcher(allow_none=True)
+        common.register_function(self.authenticate, "authenticate")
+        common.register_function(lambda: {"server_version": "fake"}, "version")
+        obj = SimpleXMLRPCDispatcher(allow_none=True)
+        obj.register_function(self.execute_kw, "execute_kw")
+        self._server.add_dispatcher("/xmlrpc/2/common", common)
+        self._server.add_dispatcher("/xmlrpc/2/object", obj)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- bookkeeping ----------
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def add_user(self, db, login, password):
+        with self._lock:
+            uid = self._next_uid
+            self._next_uid += 1
+            self.users[(db, login)] = (password, uid)
+            return uid
+
+    def rotate_uids(self):
+        """Give every user a new uid, as after a database restore; cached uids become invalid."""
+        with self._lock:
+            for key, (password, _) in list(self.users.items()):
+                self.users[key] = (password, self._next_uid)
+                self._next_uid += 1
+
+    def _check(self, db, uid, password):
+        for (user_db, _), (user_password, user_uid) in self.users.items():
+            if user_db == db and user_uid == uid and user_password == password:
+                return
+        raise Fault(ACCESS_DENIED, "Access Denied")
+
+    # ---------- XML-RPC ----------
+
+    def authenticate(self, db, login, password, user_agent_env):
+        self.count("authenticate")
+        if self.latency:
+            time.sleep(self.latency)
+        user = self.users.get((db, login))
+        if user is None or user[0] != password:
+            return False
+        return user[1]
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        self.count("execute_kw")
+        if self.latency:
+            time.sleep(self.latency)
+        self._check(db, uid, password)
+        handler = getattr(self, f"_orm_{method}", None)
+        if handler is None:
+            raise Fault(1, f"Method {method} is not supported by the fake Odoo")
+        with self._lock:
+            return handler(self.records.setdefault(model, {}), model, *args, **(kwargs or {}))
+
+    # ---------- ORM ----------
+
+    @staticmethod
+    def _now():
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+    def _orm_create(self, table, model, vals):
+        ids = []
+        for record in vals if isinstance(vals, list) else [vals]:
+            record_id = self._next_ids.get(model, 1)
+            self._next_ids[model] = record_id + 1
+            table[record_id] = dict(record, id=record_id, write_date=self._now())
+            ids.append(record_id)
+        return ids if isinstance(vals, list) else ids[0]
+
+    def _orm_write(self, table, model, ids, vals):
+        now = self._now()
+        for record_id in ids:
+            if record_id not in table:
+                raise Fault(2, f"Record {model}({record_id}) does not exist")
+            table[record_id].update(vals, write_date=now)
+        return True
+
+    @staticmethod
+    def _project(record, fields):
+        return dict(record) if not fields else {field: record.get(field, False) for field in ['id', *fields]}
+
+    def _orm_read(self, table, model, ids, fields=None):
+        return [self._project(table[record_id], fields) for record_id in ids if record_id in table]
+
+    @classmethod
+    def _matches(cls, record, domain):
+        """Evaluate a domain in Odoo's prefix notation; terms are implicitly AND-ed."""
+        stack = []
+        for term in reversed(domain):
+            if term == '!':
+                stack.append(not stack.pop())
+            elif term in ('&', '|'):
+                first, second = stack.pop(), stack.pop()
+                stack.append(first and second if term == '&' else first or second)
+            else:
+                field, op, value = term
+                stack.append(DOMAIN_OPERATORS[op](record.get(field), value))
+        return all(stack)
+
+    def _search(self, table, domain, offset=0, limit=None, order=None):
+        records = [record for record in table.values() if self._matches(record, domain or [])]
+        for term in reversed((order or "id").split(",")):
+            field, *direction = term.split()
+            records.sort(key=lambda record: record.get(field) or 0, reverse=direction == ["desc"])
+        end = None if not limit else offset + limit
+        return records[offset:end]
+
+    def _orm_search(self, table, model, domain, offset=0, limit=None, order=None):
+        return [record["id"] for record in self._search(table, domain, offset, limit, order)]
+
+    def _orm_search_read(self, table, model, domain=None, fields=None, offset=0, limit=None, order=None):
+        return [self._project(record, fields) for record in self._search(table, domain, offset, limit, order)]
+
+    def _orm_search_count(self, table, model, domain):
+        return len(self._search(table, domain))
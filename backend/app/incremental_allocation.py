@@ -0,0 +1,194 @@
+"""
+Event-driven allocation.
+
+Instead of re-reading every pending order on each ``/api/allocate-orders/``
+call, ``IncrementalAllocator`` keeps the allocation state in memory and only
+looks at what an event changed:
+
+- a new order is placed against its product's stock and the truck index,
+- a stock increase retries the orders waiting on that product,
+- a freed truck retries the orders waiting for truck capacity.
+
+Events are written to ``AllocationEvent`` by ``record_allocation_event`` (when
+``settings.INCREMENTAL_ALLOCATION`` is on) and consumed by the single
+``run_allocator`` worker, which owns the in-memory indexes.
+"""
+import logging
+
+from django.db.models import Sum
+
+from .allocation import apply_allocation_plan
+from .allocation_engine import BestFitIndex
+from .models import Employee, Order, Shipment
+from .stock import available_to_promise
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalAllocator:
+    """
+    In-memory allocation state.
+
+    ``trucks`` holds the remaining capacity of each truck on its current trip,
+    ``waiting_stock`` the pending orders per product that its stock cannot
+    cover yet, and ``waiting_truck`` the pending orders that have stock but
+    no truck with enough room. Assignments accumulate in ``planned`` until
+    ``flush`` writes them.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.trucks = BestFitIndex([])
+        self.truck_capacity = {}
+        self.truck_employee = {}
+        self.stock = {}
+        self.waiting_stock = {}
+        self.waiting_truck = {}
+        self.planned = []
+
+    # ---------- state loading ----------
+
+    def rebuild(self):
+        """Reload the whole state from the database, e.g. after a restart."""
+        self.reset()
+
+        loads = dict(
+            Shipment.objects.filter(status='in_transit')
+            .values_list('employee__truck_id')
+            .annotate(load=Sum('order__required_qty'))
+        )
+        for employee_id, truck_id, capacity in Employee.objects.filter(truck__isnull=False).values_list(
+            'employee_id', 'truck_id', 'truck__capacity'
+        ):
+            self.truck_capacity[truck_id] = capacity
+            self.truck_employee[truck_id] = employee_id
+            self.trucks.add(truck_id, max(0, capacity - (loads.get(truck_id) or 0)))
+
+        self.stock = available_to_promise(
+            Order.objects.filter(status='pending').values_list('product_id', flat=True).distinct()
+        )
+
+        pending = Order.objects.filter(status='pending').order_by('order_date').values_list(
+            'order_id', 'product_id', 'required_qty'
+        )
+        for order_id, product_id, qty in pending.iterator(chunk_size=2000):
+            self._place(order_id, product_id, qty)
+
+        logger.info(
+            f"Allocator rebuilt: {len(self.truck_capacity)} trucks, {len(self.waiting_truck)} orders waiting for a truck, "
+            f"{sum(map(len, self.waiting_stock.values()))} waiting for stock, {len(self.planned)} placed"
+        )
+
+    def _ensure_stock(self, product_id):
+        if product_id not in self.stock:
+            self.stock[product_id] = available_to_promise([product_id]).get(product_id, 0)
+
+    def _ensure_truck(self, truck_id):
+        if truck_id not in self.truck_capacity:
+            employee_id, capacity = Employee.objects.filter(truck_id=truck_id).values_list(
+                'employee_id', 'truck__capacity'
+            ).first() or (None, None)
+            if employee_id is None:
+                return False
+            self.truck_capacity[truck_id] = capacity
+            self.truck_employee[truck_id] = employee_id
+        return True
+
+    # ---------- placement ----------
+
+    def _place(self, order_id, product_id, qty):
+        if self.stock.get(product_id, 0) < qty:
+            self.waiting_stock.setdefault(product_id, {})[order_id] = qty
+            return False
+
+        truck_id = self.trucks.find(qty)
+        if truck_id < 0:
+            self.waiting_truck[order_id] = (product_id, qty)
+            return False
+
+        self.trucks.consume(truck_id, qty)
+        self.stock[product_id] -= qty
+        self.planned.append((order_id, truck_id, product_id, qty))
+        return True
+
+    def _retry_waiting(self, product_ids=()):
+        """Place again the orders waiting for a truck, and those waiting for the stock of ``product_ids``."""
+        waiting, self.waiting_truck = self.waiting_truck, {}
+        for order_id, (product_id, qty) in waiting.items():
+            self._place(order_id, product_id, qty)
+        for product_id in product_ids:
+            for order_id, qty in self.waiting_stock.pop(product_id, {}).items():
+                self._place(order_id, product_id, qty)
+
+    # ---------- events ----------
+
+    def order_created(self, order_id, product_id, qty):
+        self._ensure_stock(product_id)
+        self._place(order_id, product_id, qty)
+
+    def stock_increased(self, product_id, qty):
+        if product_id in self.stock:
+            self.stock[product_id] += qty
+        else:
+            # Freshly loaded stock already includes the increase
+            self._ensure_stock(product_id)
+
+        for order_id, order_qty in self.waiting_stock.pop(product_id, {}).items():
+            self._place(order_id, product_id, order_qty)
+
+    def truck_freed(self, truck_id):
+        if not self._ensure_truck(truck_id):
+            return
+        if truck_id in self.trucks:
+            self.trucks.remove(truck_id)
+        self.trucks.add(truck_id, self.truck_capacity[truck_id])
+        self._retry_waiting()
+
+    def handle(self, event):
+        if event.kind == 'order_created':
+            self.order_created(event.order_id, event.product_id, event.quantity)
+        elif event.kind == 'stock_increased':
+            self.stock_increased(event.product_id, event.quantity)
+        elif event.kind == 'truck_freed':
+            self.truck_freed(event.truck_id)
+        elif event.kind == 'resync':
+            self.rebuild()
+
+    # ---------- persistence ----------
+
+    def flush(self):
+        """
+        Write the planned assignments with ``apply_allocation_plan``.
+
+        Orders that stopped being pending since they were indexed (cancelled,
+        deleted, allocated elsewhere) or that were queued twice are dropped and their stock and truck
+        capacity given back; waiting orders that now fit are planned for the next flush, as a
+        ``rebuild`` would place them.
+        """
+        planned, self.planned = self.planned, []
+        if not planned:
+            return []
+
+        orders = Order.objects.filter(
+            order_id__in=[order_id for order_id, _, _, _ in planned], status='pending'
+        ).in_bulk()
+        employees = Employee.objects.in_bulk([self.truck_employee[truck_id] for _, truck_id, _, _ in planned])
+
+        plan = []
+        seen = set()
+        released = set()
+        for order_id, truck_id, product_id, qty in planned:
+            if order_id not in orders or order_id in seen:
+                self.trucks.consume(truck_id, -qty)
+                self.stock[product_id] += qty
+                released.add(product_id)
+                continue
+            seen.add(order_id)
+            plan.append((orders[order_id], employees[self.truck_employee[truck_id]]))
+
+        shipments = apply_allocation_plan(plan)
+        if released:
+            self._retry_waiting(released)
+        return shipments
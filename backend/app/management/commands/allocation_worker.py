@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.allocation import PARTITION_FIELDS, allocate_partition
+from app.allocation_engine import STRATEGIES
+
+
+class Command(BaseCommand):
+    help = "Allocate one partition of the pending orders; run several with different --partition values in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--partition", type=int, default=0)
+        parser.add_argument("--partitions", type=int, default=1)
+        parser.add_argument("--by", choices=list(PARTITION_FIELDS), default="product")
+        parser.add_argument("--strategy", choices=list(STRATEGIES), default=None)
+        parser.add_argument("--order-limit", type=int, default=1000, help="Orders claimed per transaction")
+        parser.add_argument("--truck-limit", type=int, default=50, help="Trucks claimed per transaction")
+        parser.add_argument("--loop", action="store_true", help="Keep polling for new pending orders")
+        parser.add_argument("--poll-interval", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        if not 0 <= options["partition"] < options["partitions"]:
+            raise CommandError("--partition must be between 0 and --partitions - 1")
+
+        cursor = None
+        allocated = skipped = 0
+        while True:
+            result = allocate_partition(
+                partition=options["partition"],
+                partitions=options["partitions"],
+                partition_by=options["by"],
+                strategy=options["strategy"],
+                order_limit=options["order_limit"],
+                truck_limit=options["truck_limit"],
+                after=cursor,
+            )
+            allocated += len(result["allocated_orders"])
+            skipped += len(result["skipped_orders"])
+            cursor = result["cursor"]
+            if cursor is not None:
+                continue
+
+            # Reached the end of the partition
+            self.stdout.write(f"Allocated {allocated}, skipped {skipped}")
+            if not options["loop"]:
+                break
+            if not allocated:
+                time.sleep(options["poll_interval"])
+            allocated = skipped = 0
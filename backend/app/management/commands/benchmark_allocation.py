@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.allocation_engine import STRATEGIES, plan_allocation
+
+
+def legacy_linear_scan(orders, trucks, stock):
+    """The pre-engine loop: one pass over every truck for every order."""
+    remaining_stock = dict(stock)
+    capacity = {truck_id: cap for truck_id, cap in trucks}
+    assignments = []
+    skipped = []
+    for order_id, product_id, qty in orders:
+        if remaining_stock.get(product_id, 0) < qty:
+            skipped.append((order_id, "Insufficient stock"))
+            continue
+        truck_id = next((t for t, _ in trucks if capacity[t] >= qty), None)
+        if truck_id is None:
+            skipped.append((order_id, "No suitable truck available"))
+            continue
+        capacity[truck_id] -= qty
+        remaining_stock[product_id] -= qty
+        assignments.append((order_id, truck_id))
+    return assignments, skipped
+
+
+class Command(BaseCommand):
+    help = "Benchmark the in-memory allocation strategies against the legacy per-order truck scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, nargs="+", default=[1000, 5000, 20000])
+        parser.add_argument("--trucks", type=int, nargs="+", default=[50, 200, 800])
+        parser.add_argument("--products", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--skip-legacy", action="store_true", help="Do not time the legacy loop")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        runners = [] if options["skip_legacy"] else [("legacy", legacy_linear_scan)]
+        runners += [
+            (name, lambda o, t, s, name=name: plan_allocation(o, t, s, name))
+            for name in STRATEGIES
+        ]
+
+        self.stdout.write(f"{'orders':>8} {'trucks':>7} {'runner':<22} {'seconds':>9} {'allocated':>10} {'skipped':>8}")
+        for n_orders in options["orders"]:
+            for n_trucks in options["trucks"]:
+                orders = [
+                    (i, rng.randrange(options["products"]), rng.randint(1, 50))
+                    for i in range(n_orders)
+                ]
+                trucks = [(i, rng.randint(100, 2000)) for i in range(n_trucks)]
+                stock = {p: rng.randint(0, 5000) for p in range(options["products"])}
+
+                for name, runner in runners:
+                    start = time.perf_counter()
+                    assignments, skipped = runner(orders, trucks, stock)
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"{n_orders:>8} {n_trucks:>7} {name:<22} {elapsed:>9.4f} {len(assignments):>10} {len(skipped):>8}"
+                    )
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from app.dashboard import compute_category_stock
+from app.models import Category
+from app.serializers import CategorySerializer
+from app.synthetic import clear_synthetic_data, seed_synthetic_data
+
+
+def legacy_category_stock():
+    """The pre-aggregate view body: one aggregate query and a linear scan per category."""
+    categories = Category.objects.annotate(product_count=Count('products'))
+    serialized_data = CategorySerializer(categories, many=True).data
+    for category in serialized_data:
+        category["value"] = next(
+            (cat["product_count"] for cat in categories.values("name", "product_count") if cat["name"] == category["name"]),
+            0
+        )
+    return serialized_data
+
+
+class Command(BaseCommand):
+    help = "Benchmark the category stock aggregate against the legacy per-category lookup on a synthetic catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--orders", type=int, default=20000, help="Orders spread over the products, for demand totals")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs of the aggregate per variant")
+        parser.add_argument("--skip-legacy", action="store_true", help="Do not time the legacy lookup")
+        parser.add_argument("--keep", action="store_true", help="Leave the synthetic dataset in the database")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Seeding {options['categories']} categories, {options['products']} products and {options['orders']} orders..."
+        )
+        seed_synthetic_data(orders=options["orders"], products=options["products"], categories=options["categories"], trucks=0)
+
+        runners = [
+            ("aggregate", compute_category_stock, options["repeat"]),
+            ("aggregate on_demand", lambda: compute_category_stock(product_status='on_demand'), options["repeat"]),
+            ("aggregate search", lambda: compute_category_stock(search='category-1'), options["repeat"]),
+        ]
+        if not options["skip_legacy"]:
+            # A single run: it issues one aggregate over the whole catalog per category
+            runners.append(("legacy", legacy_category_stock, 1))
+
+        self.stdout.write(f"{'runner':<22} {'seconds':>9} {'queries':>8} {'rows':>6}")
+        try:
+            for name, runner, repeat in runners:
+                timings = []
+                for _ in range(repeat):
+                    reset_queries()
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        rows = runner()
+                        timings.append(time.perf_counter() - start)
+                self.stdout.write(f"{name:<22} {min(timings):>9.4f} {len(queries):>8} {len(rows):>6}")
+        finally:
+            if not options["keep"]:
+                clear_synthetic_data()
@@ -0,0 +1,125 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app.dashboard import category_stock_queryset
+from app.models import Employee, Order, Product, Shipment
+from app.synthetic import SYNTHETIC_PREFIX, clear_synthetic_data, seed_synthetic_data
+
+# Indexes shaped after the hot query paths; the "before" column runs without them
+TUNED_INDEXES = (
+    'order_date_id',
+    'order_status_date',
+    'shipment_date_id',
+    'shipment_in_transit_employee',
+)
+
+
+def view_queries(driver):
+    """``(view, description, queryset)`` for the queries the views in ``app/views.py`` run."""
+    orders = Order.objects.select_related('product', 'retailer')
+    return [
+        ("get_orders", "first page", orders.order_by('-order_date', '-order_id')[:11]),
+        ("get_orders", "?status=pending", orders.filter(status='pending').order_by('-order_date', '-order_id')[:11]),
+        ("get_orders", "?status=cancelled", orders.filter(status='cancelled').order_by('-order_date', '-order_id')[:11]),
+        ("get_shipments", "first page", Shipment.objects.order_by('-shipment_date', '-shipment_id')[:11]),
+        ("allocate_orders", "pending orders, oldest first", Order.objects.filter(status='pending').order_by('order_date', 'order_id')),
+        ("allocate_orders", "busy trucks", Shipment.objects.filter(status='in_transit').values('employee__truck_id')),
+        ("update_shipment_status", "truck still busy", Shipment.objects.filter(employee=driver, status='in_transit')[:1]),
+        ("get_employee_shipments", "own shipments", Shipment.objects.filter(employee__user=driver.user).select_related('order__retailer')),
+        ("get_employee_route", "in-transit stops",
+         Shipment.objects.filter(employee__user=driver.user, status='in_transit').select_related('order__retailer')),
+        ("category_stock_data", "?status=on_demand&include_empty=false",
+         category_stock_queryset(product_status='on_demand', include_empty=False)),
+        ("export_data", "stock ?status=on_demand", Product.objects.filter(status='on_demand').order_by('pk')),
+    ]
+
+
+def explain(queryset, runs):
+    """Fastest ``EXPLAIN ANALYZE`` execution time in ms and the indexes the plan used."""
+    best, indexes = None, set()
+    for _ in range(runs):
+        plan = json.loads(queryset.explain(analyze=True, format='json'))[0]
+        best = plan['Execution Time'] if best is None else min(best, plan['Execution Time'])
+        nodes = [plan['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if 'Index Name' in node:
+                indexes.add(node['Index Name'])
+            nodes.extend(node.get('Plans', []))
+    return best, indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed large synthetic tables and print EXPLAIN ANALYZE timings of each view's hot query "
+        "without and with the query-pattern indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=300000)
+        parser.add_argument("--products", type=int, default=20000)
+        parser.add_argument("--trucks", type=int, default=200)
+        parser.add_argument("--pending", type=float, default=0.03, help="Fraction of orders still pending")
+        parser.add_argument("--in-transit", type=float, default=0.02, help="Fraction of orders out for delivery")
+        parser.add_argument("--runs", type=int, default=3, help="EXPLAIN ANALYZE runs per query, the fastest counts")
+        parser.add_argument("--keep", action="store_true", help="Leave the synthetic dataset in the database")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("EXPLAIN ANALYZE timings need PostgreSQL")
+
+        self.stdout.write(f"Seeding {options['orders']} orders and {options['products']} products...")
+        seed_synthetic_data(
+            orders=options["orders"], products=options["products"], categories=200, retailers=1000,
+            trucks=options["trucks"],
+        )
+        try:
+            driver = self.build_history(options)
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            queries = view_queries(driver)
+            after = [explain(queryset, options["runs"]) for _, _, queryset in queries]
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for name in TUNED_INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+                before = [explain(queryset, options["runs"]) for _, _, queryset in queries]
+                # Put the indexes back
+                transaction.set_rollback(True)
+
+            self.stdout.write(f"{'view':<24} {'query':<38} {'before ms':>10} {'after ms':>9}  index used")
+            for (view, description, _), (before_ms, _), (after_ms, indexes) in zip(queries, before, after):
+                tuned = ", ".join(sorted(indexes & set(TUNED_INDEXES))) or "-"
+                self.stdout.write(f"{view:<24} {description:<38} {before_ms:>10.2f} {after_ms:>9.2f}  {tuned}")
+        finally:
+            if not options["keep"]:
+                clear_synthetic_data()
+
+    def build_history(self, options):
+        """Turn the pending synthetic orders into a mostly delivered history with shipments."""
+        order_ids = list(
+            Order.objects.filter(product__name__startswith=SYNTHETIC_PREFIX).order_by('order_id').values_list('order_id', flat=True)
+        )
+        employees = list(Employee.objects.filter(user__username__startswith=SYNTHETIC_PREFIX).select_related('user'))
+        pending = int(len(order_ids) * options["pending"])
+        delivered_ids = order_ids[:len(order_ids) - pending - int(len(order_ids) * options["in_transit"])]
+        in_transit_ids = order_ids[len(delivered_ids):len(order_ids) - pending]
+        in_transit = set(in_transit_ids)
+
+        with transaction.atomic():
+            Order.objects.filter(order_id__in=delivered_ids).update(status='delivered')
+            Order.objects.filter(order_id__in=in_transit_ids).update(status='allocated')
+            # A sliver of cancellations, to have a rare status
+            Order.objects.filter(order_id__in=delivered_ids[::200]).update(status='cancelled')
+            Shipment.objects.bulk_create(
+                [
+                    Shipment(order_id=order_id, employee=employees[i % len(employees)],
+                             status='in_transit' if order_id in in_transit else 'delivered')
+                    for i, order_id in enumerate(delivered_ids + in_transit_ids)
+                ],
+                batch_size=5000,
+            )
+        return employees[0]
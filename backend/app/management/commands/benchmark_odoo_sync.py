@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from app.fake_odoo import FakeOdooServer
+from app.odoo_connector import (
+    add_product_to_odoo, authenticate_with_odoo, create_odoo_product, get_odoo_client, reset_odoo_clients,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure products synced to Odoo per second, authenticating per product (the old path) "
+        "versus the pooled client with a cached uid. Runs against an in-process fake Odoo unless --url is given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=500)
+        parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+        parser.add_argument("--latency", type=float, default=0.002, help="Per-call latency of the fake Odoo, in seconds")
+        parser.add_argument("--url", help="Benchmark a real Odoo instead (creates real products)")
+        parser.add_argument("--db", default="fake")
+        parser.add_argument("--username", default="admin")
+        parser.add_argument("--password", default="admin")
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            self.run(options["url"], options, None)
+            return
+        with FakeOdooServer(latency=options["latency"]) as odoo:
+            odoo.add_user(options["db"], options["username"], options["password"])
+            self.run(odoo.url, options, odoo)
+
+    def run(self, url, options, odoo):
+        db, username, password = options["db"], options["username"], options["password"]
+
+        def legacy(i):
+            uid, models = authenticate_with_odoo(db, username, password)
+            return add_product_to_odoo(uid, models, db, password, f"bench-{i}", 1.0, i)
+
+        def pooled(i):
+            return create_odoo_product(get_odoo_client(db, username, password, url=url), f"bench-{i}", 1.0, i)
+
+        self.stdout.write(f"{'path':>8} {'threads':>8} {'seconds':>9} {'products/s':>11} {'connections':>12} {'auths':>6}")
+        with override_settings(ODOO_URL=url):
+            for name, sync in (("legacy", legacy), ("pooled", pooled)):
+                for threads in options["threads"]:
+                    reset_odoo_clients()
+                    before = dict(odoo.stats) if odoo else None
+                    start = time.perf_counter()
+                    try:
+                        with ThreadPoolExecutor(threads) as executor:
+                            list(executor.map(sync, range(options["products"])))
+                    except Exception as e:
+                        raise CommandError(f"{name} sync failed: {e}")
+                    seconds = time.perf_counter() - start
+
+                    connections = auths = "-"
+                    if odoo:
+                        connections = odoo.stats["connections"] - before["connections"]
+                        auths = odoo.stats["authenticate"] - before["authenticate"]
+                    self.stdout.write(
+                        f"{name:>8} {threads:>8} {seconds:>9.3f} {options['products'] / seconds:>11.0f} "
+                        f"{connections:>12} {auths:>6}"
+                    )
+        reset_odoo_clients()
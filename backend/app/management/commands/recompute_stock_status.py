@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.stock import recompute_product_status
+
+
+class Command(BaseCommand):
+    help = "Recompute every product's stock status from its available and required quantities"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, nargs="+", dest="product_ids", help="Only recheck these product ids")
+
+    def handle(self, *args, **options):
+        changed = recompute_product_status(options["product_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Updated status of {changed} product(s)"))
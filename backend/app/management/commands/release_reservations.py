@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.stock import release_reservations
+
+
+class Command(BaseCommand):
+    help = "Release stock reservations whose shipment failed or order was cancelled"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Reservations released per transaction")
+        parser.add_argument("--interval", type=float, default=60.0, help="Seconds between sweeps")
+        parser.add_argument("--once", action="store_true", help="Run a single sweep and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_reservations(batch_size=options["batch_size"])
+            if released:
+                self.stdout.write(
+                    f"Released {sum(released.values())} unit(s) across {len(released)} product(s)"
+                )
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
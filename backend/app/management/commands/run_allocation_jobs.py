@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.allocation_jobs import claim_next_job, run_allocation_job
+
+
+class Command(BaseCommand):
+    help = "Execute queued allocation jobs submitted through /api/allocation-jobs/"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Pending orders allocated per transaction")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to sleep when no job is queued")
+        parser.add_argument("--once", action="store_true", help="Run the queued jobs and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(f"Running allocation job {job.job_id}")
+            ok = run_allocation_job(job, chunk_size=options["chunk_size"])
+            job.refresh_from_db()
+            self.stdout.write(
+                f"Job {job.job_id} {job.status}: {job.allocated_count} allocated, {job.skipped_count} skipped"
+                + ("" if ok else f" ({job.error})")
+            )
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from app.incremental_allocation import IncrementalAllocator
+from app.models import AllocationEvent
+
+
+class Command(BaseCommand):
+    help = "Run the incremental allocator, consuming AllocationEvent rows as they are queued"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Events handled per transaction")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+
+    def rebuild(self, allocator):
+        """Reload state from the database and drop the events it already covers."""
+        last_event_id = AllocationEvent.objects.aggregate(last=Max("event_id"))["last"]
+        allocator.rebuild()
+        with transaction.atomic():
+            shipments = allocator.flush()
+            if last_event_id is not None:
+                AllocationEvent.objects.filter(event_id__lte=last_event_id).delete()
+        self.stdout.write(f"Allocator state rebuilt, {len(shipments)} order(s) allocated")
+
+    def handle(self, *args, **options):
+        allocator = IncrementalAllocator()
+        self.rebuild(allocator)
+
+        while True:
+            try:
+                with transaction.atomic():
+                    events = list(
+                        AllocationEvent.objects.select_for_update(skip_locked=True).order_by("event_id")[:options["batch_size"]]
+                    )
+                    for event in events:
+                        allocator.handle(event)
+                    shipments = allocator.flush()
+                    AllocationEvent.objects.filter(event_id__in=[event.event_id for event in events]).delete()
+            except Exception as e:
+                # The in-memory state may no longer match the database
+                self.stderr.write(f"Allocator error: {e}")
+                self.rebuild(allocator)
+                continue
+
+            if shipments:
+                self.stdout.write(f"Handled {len(events)} event(s), allocated {len(shipments)} order(s)")
+
+            if not events:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
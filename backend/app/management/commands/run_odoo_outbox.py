@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.odoo_outbox import deliver_outbox, requeue_dead_messages
+
+
+class Command(BaseCommand):
+    help = "Deliver queued Odoo outbox messages, retrying failures with backoff and dead-lettering the rest"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Messages claimed per batch")
+        parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds to sleep when nothing is due")
+        parser.add_argument("--max-attempts", type=int, default=None, help="Overrides ODOO_OUTBOX_MAX_ATTEMPTS")
+        parser.add_argument("--requeue-dead", action="store_true", help="Move dead-lettered messages back to the queue first")
+        parser.add_argument("--once", action="store_true", help="Deliver the due messages and exit")
+
+    def handle(self, *args, **options):
+        if options["requeue_dead"]:
+            self.stdout.write(f"Requeued {requeue_dead_messages()} dead message(s)")
+
+        while True:
+            counts = deliver_outbox(batch_size=options["batch_size"], max_attempts=options["max_attempts"])
+            handled = sum(counts.values())
+            if handled:
+                self.stdout.write(f"Sent {counts['sent']}, retrying {counts['retried']}, dead-lettered {counts['dead']}")
+            if handled < options["batch_size"]:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
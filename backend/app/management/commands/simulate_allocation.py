@@ -0,0 +1,97 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app.allocation import run_allocation
+from app.allocation_engine import STRATEGIES
+from app.models import Order
+from app.synthetic import SYNTHETIC_PREFIX, clear_synthetic_data, seed_synthetic_data
+
+
+class QueryCounter:
+    """``execute_wrapper`` that counts statements without keeping them in memory."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic retailers, products, trucks, employees and orders at several scales "
+        "and time allocation end to end (queries, wall time, peak memory, allocated/skipped ratio)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000], help="Pending orders per run")
+        parser.add_argument("--orders-per-truck", type=int, default=25)
+        parser.add_argument("--orders-per-product", type=int, default=10)
+        parser.add_argument("--strategy", choices=list(STRATEGIES), default=None)
+        parser.add_argument("--dry-run", action="store_true", help="Only plan the allocation, do not time the writes")
+        parser.add_argument("--keep", action="store_true", help="Leave the last synthetic dataset in the database")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        other_pending = Order.objects.filter(status="pending").exclude(product__name__startswith=SYNTHETIC_PREFIX).count()
+        if other_pending:
+            self.stdout.write(self.style.WARNING(
+                f"{other_pending} non-synthetic pending order(s) will be included in the runs (all writes are rolled back)"
+            ))
+
+        self.stdout.write(
+            f"{'orders':>8} {'trucks':>7} {'products':>9} {'seed s':>8} {'alloc s':>8} "
+            f"{'queries':>8} {'peak MiB':>9} {'allocated':>10} {'skipped':>8} {'ratio':>6}"
+        )
+        try:
+            for scale in options["scales"]:
+                trucks = max(1, scale // options["orders_per_truck"])
+                products = max(1, scale // options["orders_per_product"])
+
+                start = time.perf_counter()
+                seed_synthetic_data(
+                    orders=scale, products=products, categories=max(1, products // 50),
+                    retailers=max(1, scale // 20), trucks=trucks, seed=options["seed"],
+                )
+                seed_seconds = time.perf_counter() - start
+
+                result, seconds, queries, peak = self.measure(options["strategy"], options["dry_run"])
+
+                allocated = len(result["allocated_orders"])
+                skipped = len(result["skipped_orders"])
+                ratio = allocated / (allocated + skipped) if allocated + skipped else 0
+                self.stdout.write(
+                    f"{scale:>8} {trucks:>7} {products:>9} {seed_seconds:>8.2f} {seconds:>8.3f} "
+                    f"{queries:>8} {peak / 2 ** 20:>9.1f} {allocated:>10} {skipped:>8} {ratio:>6.2f}"
+                )
+        finally:
+            if not options["keep"]:
+                clear_synthetic_data()
+
+    def measure(self, strategy, dry_run):
+        """
+        Run the allocation twice inside transactions that are always rolled back.
+
+        The first run gives wall time and query count, the second peak Python
+        memory; tracemalloc slows the interpreter down too much to share a run.
+        """
+        counter = QueryCounter()
+        with transaction.atomic(), connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            result = run_allocation(strategy, dry_run=dry_run)
+            seconds = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        tracemalloc.start()
+        try:
+            with transaction.atomic():
+                run_allocation(strategy, dry_run=dry_run)
+                transaction.set_rollback(True)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return result, seconds, counter.count, peak
@@ -0,0 +1,135 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import F, Sum
+
+from app.allocation import PARTITION_FIELDS, allocate_partition
+from app.models import Order, Product, Shipment
+from app.stock import available_to_promise
+from app.synthetic import SYNTHETIC_PREFIX, clear_synthetic_data, seed_synthetic_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Run N concurrent partitioned allocators against a synthetic dataset, "
+        "check for oversold stock and double-booked trucks and report throughput per worker count"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+        parser.add_argument("--orders", type=int, default=5000)
+        parser.add_argument("--products", type=int, default=200)
+        parser.add_argument("--trucks", type=int, default=400)
+        parser.add_argument("--by", choices=list(PARTITION_FIELDS), default="product")
+        parser.add_argument("--order-limit", type=int, default=500)
+        parser.add_argument("--truck-limit", type=int, default=20)
+        parser.add_argument("--keep", action="store_true", help="Leave the last synthetic dataset in the database")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql" and max(options["workers"]) > 1:
+            raise CommandError("Concurrent allocation relies on SELECT ... FOR UPDATE SKIP LOCKED; run this against PostgreSQL")
+
+        self.stdout.write(f"{'workers':>8} {'allocated':>10} {'seconds':>9} {'orders/s':>10}")
+        try:
+            for workers in options["workers"]:
+                seed_synthetic_data(orders=options["orders"], products=options["products"], trucks=options["trucks"])
+                initial_stock = dict(
+                    Product.objects.filter(name__startswith=SYNTHETIC_PREFIX).values_list("product_id", "available_quantity")
+                )
+
+                elapsed, batches = self.run_workers(workers, options)
+                self.check_invariants(initial_stock, batches)
+
+                allocated = sum(map(len, batches))
+                rate = allocated / elapsed if elapsed else 0
+                self.stdout.write(f"{workers:>8} {allocated:>10} {elapsed:>9.3f} {rate:>10.0f}")
+        finally:
+            if not options["keep"]:
+                clear_synthetic_data()
+
+    def run_workers(self, workers, options):
+        batches = []
+        errors = []
+        lock = threading.Lock()
+
+        def work(partition):
+            try:
+                # Sweep the partition until a full pass allocates nothing
+                cursor = None
+                allocated_in_pass = 0
+                while True:
+                    result = allocate_partition(
+                        partition=partition,
+                        partitions=workers,
+                        partition_by=options["by"],
+                        order_limit=options["order_limit"],
+                        truck_limit=options["truck_limit"],
+                        after=cursor,
+                    )
+                    if result["allocated_orders"]:
+                        allocated_in_pass += len(result["allocated_orders"])
+                        with lock:
+                            batches.append(result["allocated_orders"])
+                    cursor = result["cursor"]
+                    if cursor is None:
+                        if not allocated_in_pass:
+                            break
+                        allocated_in_pass = 0
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        if errors:
+            raise CommandError(f"{len(errors)} worker(s) failed: {errors[0]}")
+        return elapsed, batches
+
+    def check_invariants(self, initial_stock, batches):
+        order_ids = [entry["order_id"] for entries in batches for entry in entries]
+        if len(order_ids) != len(set(order_ids)):
+            raise CommandError("An order was allocated more than once")
+
+        if Order.objects.filter(order_id__in=order_ids).exclude(status="allocated").exists():
+            raise CommandError("An allocated order is not marked as allocated")
+
+        shipped = dict(
+            Shipment.objects.filter(order__product_id__in=initial_stock)
+            .values_list("order__product_id")
+            .annotate(qty=Sum("order__required_qty"))
+        )
+        promisable = available_to_promise(initial_stock)
+        for product_id, stock in initial_stock.items():
+            if shipped.get(product_id, 0) > stock or promisable[product_id] != stock - shipped.get(product_id, 0):
+                raise CommandError(f"Product {product_id} oversold: stock {stock}, shipped {shipped.get(product_id, 0)}")
+
+        overloaded = (
+            Shipment.objects.filter(order__product_id__in=initial_stock)
+            .values("employee__truck_id")
+            .annotate(load=Sum("order__required_qty"))
+            .filter(load__gt=F("employee__truck__capacity"))
+        )
+        if overloaded.exists():
+            raise CommandError(f"Truck loaded beyond capacity: {overloaded.first()}")
+
+        # Every truck must have been filled by exactly one allocation transaction
+        batch_of_shipment = {
+            entry["shipment_id"]: batch for batch, entries in enumerate(batches) for entry in entries
+        }
+        batches_per_truck = {}
+        for shipment_id, truck_id in Shipment.objects.filter(shipment_id__in=batch_of_shipment).values_list(
+            "shipment_id", "employee__truck_id"
+        ):
+            batches_per_truck.setdefault(truck_id, set()).add(batch_of_shipment[shipment_id])
+        double_booked = [truck_id for truck_id, used_by in batches_per_truck.items() if len(used_by) > 1]
+        if double_booked:
+            raise CommandError(f"Trucks booked by more than one worker transaction: {double_booked[:10]}")
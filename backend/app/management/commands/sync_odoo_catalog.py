@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import OdooCredentials
+from app.odoo_connector import get_odoo_client
+from app.odoo_sync import DEFAULT_CHUNK_SIZE, plan_push, push_products, reconcile_mapping, syncable_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the products mapped in or created by the user into Odoo with batched create/write calls; "
+        "only new or changed products are sent"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="Username whose saved Odoo credentials are used")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Products per create/write call")
+        parser.add_argument("--workers", type=int, default=4, help="Chunks sent concurrently")
+        parser.add_argument(
+            "--reconcile", action="store_true",
+            help="First unmap products deleted in Odoo and adopt Odoo products with matching names",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be sent")
+
+    def handle(self, *args, **options):
+        try:
+            credentials = OdooCredentials.objects.get(user__username=options["user"])
+        except OdooCredentials.DoesNotExist:
+            raise CommandError(f"No Odoo credentials saved for {options['user']}")
+        client = get_odoo_client(credentials.db, credentials.username, credentials.password)
+
+        def catalog():
+            return list(
+                syncable_products(credentials.user)
+                .only("product_id", "name", "price", "available_quantity", "odoo_id", "odoo_sync_hash")
+                .order_by("product_id")
+            )
+
+        start = time.perf_counter()
+        if options["reconcile"]:
+            result = reconcile_mapping(client, credentials.user, catalog(), options["chunk_size"])
+            self.stdout.write(f"Unmapped {result['unmapped']} product(s) missing in Odoo, adopted {result['adopted']}")
+
+        products = catalog()
+        if options["dry_run"]:
+            creates, writes, unchanged = plan_push(products)
+            self.stdout.write(f"Would create {len(creates)}, update {len(writes)}, skip {unchanged} unchanged")
+            return
+
+        summary = push_products(client, credentials.user, products, options["chunk_size"], options["workers"])
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            f"Created {summary['created']}, updated {summary['updated']}, unchanged {summary['unchanged']}, "
+            f"failed {summary['failed']} in {seconds:.2f}s"
+        )
+        if summary["failed"]:
+            raise CommandError(f"{summary['failed']} product(s) could not be pushed; re-run to retry them")
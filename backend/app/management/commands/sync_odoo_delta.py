@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import OdooCredentials
+from app.odoo_connector import get_odoo_client
+from app.odoo_sync import DEFAULT_CHUNK_SIZE, QUANTITY_POLICIES, sync_delta
+
+
+class Command(BaseCommand):
+    help = (
+        "Two-way delta sync with Odoo: pull products written in Odoo since the last write_date "
+        "watermark, then push local product changes made since the last push"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="Username whose saved Odoo credentials are used")
+        parser.add_argument("--page-size", type=int, default=500, help="Odoo records pulled per search_read")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Products per create/write call")
+        parser.add_argument("--workers", type=int, default=1, help="Push chunks sent concurrently")
+        parser.add_argument("--policy", choices=QUANTITY_POLICIES, default=None,
+                            help="Quantity conflict policy; defaults to ODOO_QUANTITY_CONFLICT_POLICY")
+        parser.add_argument("--interval", type=float, default=60.0, help="Seconds between cycles")
+        parser.add_argument("--once", action="store_true", help="Run a single cycle and exit")
+
+    def handle(self, *args, **options):
+        try:
+            credentials = OdooCredentials.objects.select_related("user").get(user__username=options["user"])
+        except OdooCredentials.DoesNotExist:
+            raise CommandError(f"No Odoo credentials saved for {options['user']}")
+        client = get_odoo_client(credentials.db, credentials.username, credentials.password)
+
+        while True:
+            start = time.perf_counter()
+            try:
+                summary = sync_delta(
+                    client, credentials.user, page_size=options["page_size"], chunk_size=options["chunk_size"],
+                    workers=options["workers"], policy=options["policy"],
+                )
+            except Exception as e:
+                if options["once"]:
+                    raise CommandError(f"Delta sync failed: {e}")
+                self.stderr.write(f"Delta sync failed: {e}")
+            else:
+                self.stdout.write(
+                    f"Pulled {summary['pulled']} ({summary['applied']} applied), pushed {summary['created']} new "
+                    f"and {summary['updated']} changed, {summary['failed']} failed in {time.perf_counter() - start:.2f}s"
+                )
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_product_created_by_odoocredentials'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AllocationEvent',
+            fields=[
+                ('event_id', models.AutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('order_created', 'Order Created'), ('truck_freed', 'Truck Freed'), ('stock_increased', 'Stock Increased'), ('resync', 'Resync')], max_length=20)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='allocation_events', to='app.order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='allocation_events', to='app.product')),
+                ('truck', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='allocation_events', to='app.truck')),
+            ],
+        ),
+    ]
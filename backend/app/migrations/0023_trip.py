@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0022_allocationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trip',
+            fields=[
+                ('trip_id', models.AutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('min_distance', models.FloatField()),
+                ('max_distance', models.FloatField()),
+                ('load', models.PositiveIntegerField(default=0)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trips', to='app.employee')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='trip',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shipments', to='app.trip'),
+        ),
+    ]
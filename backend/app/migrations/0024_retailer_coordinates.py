@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0023_trip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='retailer',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='retailer',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
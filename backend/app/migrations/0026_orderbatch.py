@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0025_stock_reservations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderBatch',
+            fields=[
+                ('batch_id', models.AutoField(primary_key=True, serialize=False)),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, null=True)),
+                ('request_hash', models.CharField(max_length=64)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('response', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('created_by', 'idempotency_key'), name='unique_order_batch_key')],
+            },
+        ),
+    ]
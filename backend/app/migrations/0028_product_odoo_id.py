@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0027_odoo_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='odoo_id',
+            field=models.IntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='odoo_sync_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0029_odoo_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date', 'order_id'], name='order_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['shipment_date', 'shipment_id'], name='shipment_date_id'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def assign_odoo_owners(apps, schema_editor):
+    """
+    Attribute the existing mappings: to the only user with Odoo credentials
+    when there is one, otherwise to the product's creator.
+    """
+    Product = apps.get_model('app', 'Product')
+    OdooCredentials = apps.get_model('app', 'OdooCredentials')
+    mapped = Product.objects.filter(odoo_id__isnull=False)
+    owners = list(OdooCredentials.objects.values_list('user_id', flat=True)[:2])
+    if len(owners) == 1:
+        mapped.update(odoo_owner_id=owners[0])
+    else:
+        mapped.update(odoo_owner_id=models.F('created_by_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0032_table_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='odoo_owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='odoo_products', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(assign_odoo_owners, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='odoo_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('odoo_owner', 'odoo_id'), name='unique_product_odoo_id_per_owner'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0033_product_odoo_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationjob',
+            name='cursor_order_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='allocationjob',
+            name='cursor_order_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='allocationjob',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='allocationjob',
+            name='truck_ids',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
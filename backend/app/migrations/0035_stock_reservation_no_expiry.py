@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:14
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0034_allocation_job_lease'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockreservation',
+            name='reservation_status_expiry',
+        ),
+        migrations.RemoveField(
+            model_name='stockreservation',
+            name='expires_at',
+        ),
+    ]
@@ -1,9 +1,57 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models import Count
+from django.utils import timezone
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Greatest
 from decimal import Decimal
 
 
+class TrackedFieldsMixin:
+    """
+    Remembers the values of ``tracked_fields`` as they were loaded from the database.
+
+    Signal handlers can compare against ``get_original`` instead of
+    re-reading the row in ``pre_save``. The snapshot is refreshed after every
+    ``save()``, so ``post_save`` receivers still see the previous values.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+
+    def _snapshot_fields(self):
+        loaded = self.__dict__
+        self._original_values = {
+            name: loaded[self._meta.get_field(name).attname]
+            for name in self.tracked_fields
+            if self._meta.get_field(name).attname in loaded
+        }
+
+    @property
+    def has_original(self):
+        """``True`` if the instance was loaded from (or saved to) the database."""
+        return hasattr(self, '_original_values')
+
+    def get_original(self, name, default=None):
+        """Value of ``name`` when the instance was loaded, ``default`` if unknown."""
+        return getattr(self, '_original_values', {}).get(name, default)
+
+    def get_dirty_fields(self):
+        """Tracked fields whose current value differs from the loaded one."""
+        return {
+            name: value
+            for name, value in getattr(self, '_original_values', {}).items()
+            if getattr(self, self._meta.get_field(name).attname) != value
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_fields()
+
+
 class Category(models.Model):
     category_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255, unique=True)
@@ -48,7 +96,7 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 """
-class Product(models.Model):
+class Product(TrackedFieldsMixin, models.Model):
     product_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="products")
@@ -57,6 +105,12 @@ class Product(models.Model):
     total_required_quantity = models.PositiveIntegerField(default=0)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="products")  # New field
+    odoo_id = models.IntegerField(null=True, blank=True)  # product.product id in Odoo
+    # User whose Odoo (credentials) odoo_id belongs to; set together with odoo_id
+    odoo_owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="odoo_products")
+    odoo_sync_hash = models.CharField(max_length=40, blank=True, default='')  # Fingerprint of the values last synced with Odoo
+    odoo_synced_quantity = models.IntegerField(null=True, blank=True)  # Quantity both sides agreed on at the last sync
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Set explicitly by queryset updates of synced fields
 
     STATUS_CHOICES = [
         ('on_demand', 'On Demand'),
@@ -64,6 +118,12 @@ class Product(models.Model):
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='sufficient')
 
+    class Meta:
+        constraints = [
+            # Odoo ids are only unique within one Odoo database
+            models.UniqueConstraint(fields=['odoo_owner', 'odoo_id'], name='unique_product_odoo_id_per_owner'),
+        ]
+
     def update_status(self):
         """Update the status based on available and required quantity."""
         available = self.available_quantity if isinstance(self.available_quantity, int) else 0
@@ -83,12 +143,14 @@ class Retailer(models.Model):
     address = models.TextField()
     contact = models.CharField(max_length=20)
     distance_from_warehouse = models.FloatField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         return self.name
 
 
-class Order(models.Model):
+class Order(TrackedFieldsMixin, models.Model):
     order_id = models.AutoField(primary_key=True)
     retailer = models.ForeignKey(Retailer, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -103,10 +165,45 @@ class Order(models.Model):
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
 
+    tracked_fields = ('status', 'required_qty', 'product')
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the order history, newest first
+            models.Index(fields=['order_date', 'order_id'], name='order_date_id'),
+            # Order history filtered by status, and the allocators' oldest-first scan of
+            # pending orders (a small slice of the history)
+            models.Index(fields=['status', 'order_date', 'order_id'], name='order_status_date'),
+        ]
+
     def __str__(self):
         return f"Order {self.order_id} - {self.product.name} - {self.retailer.name}"
 
 
+class OrderBatch(models.Model):
+    """
+    Orders placed by one call of the bulk order API.
+
+    The client's idempotency key maps a retried request back to the batch
+    (and stored response) created by the first attempt.
+    """
+    batch_id = models.AutoField(primary_key=True)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name="order_batches")
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    request_hash = models.CharField(max_length=64)
+    order_count = models.PositiveIntegerField(default=0)
+    response = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['created_by', 'idempotency_key'], name='unique_order_batch_key'),
+        ]
+
+    def __str__(self):
+        return f"OrderBatch {self.batch_id} - {self.order_count} orders"
+
+
 class Truck(models.Model):
     truck_id = models.AutoField(primary_key=True)
     license_plate = models.CharField(max_length=20, unique=True)
@@ -127,10 +224,24 @@ class Employee(models.Model):
         return f"{self.user.username} (Truck: {self.truck.license_plate if self.truck else 'No Truck Assigned'})"
 
 
-class Shipment(models.Model):
+class Trip(models.Model):
+    """One truck run carrying the shipments of several orders within a distance band."""
+    trip_id = models.AutoField(primary_key=True)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name="trips")
+    created_at = models.DateTimeField(auto_now_add=True)
+    min_distance = models.FloatField()
+    max_distance = models.FloatField()
+    load = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Trip {self.trip_id} - {self.min_distance:g}-{self.max_distance:g} km"
+
+
+class Shipment(TrackedFieldsMixin, models.Model):
     shipment_id = models.AutoField(primary_key=True)
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="shipment")
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name="shipments")
+    trip = models.ForeignKey(Trip, on_delete=models.SET_NULL, null=True, blank=True, related_name="shipments")
     shipment_date = models.DateTimeField(auto_now_add=True)
 
     STATUS_CHOICES = [
@@ -140,25 +251,44 @@ class Shipment(models.Model):
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_transit')
 
+    tracked_fields = ('status',)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the shipment history, newest first
+            models.Index(fields=['shipment_date', 'shipment_id'], name='shipment_date_id'),
+            # Busy-truck checks look for in-transit shipments, overall and per employee
+            models.Index(fields=['employee'], name='shipment_in_transit_employee', condition=Q(status='in_transit')),
+        ]
+
     def save(self, *args, **kwargs):
         """
         If shipment is marked as 'delivered', update:
-        - The corresponding order's status to 'delivered'.
-        - Reduce the product's total_required_quantity.
+        - The corresponding order's status to 'delivered' (its post_save
+          handler releases the order's share of total_required_quantity).
         - Increase the product's total_shipped.
+        - Fulfil the order's stock reservation and take the stock off hand.
+        Saving an already delivered shipment again does not repeat this.
         """
-        if self.status == "delivered":
+        if self.status == "delivered" and self.get_original('status') != "delivered":
             order = self.order
-            product = order.product
 
             # Update order status
             order.status = "delivered"
             order.save(update_fields=["status"])
 
-            # Update product details
-            product.total_required_quantity = max(0, product.total_required_quantity - order.required_qty)
-            product.total_shipped += order.required_qty
-            product.save(update_fields=["total_required_quantity", "total_shipped"])
+            # Orders allocated before reservations existed had their stock decremented already
+            reservation = StockReservation.objects.filter(order=order).values_list('status', flat=True).first()
+            if reservation == 'active':
+                StockReservation.objects.filter(order=order, status='active').update(status='fulfilled')
+
+            # Update product details in place, the row may have pending changes from this transaction
+            changes = {"total_shipped": F("total_shipped") + order.required_qty}
+            # A released reservation no longer holds the stock, but the goods still leave
+            if reservation in ('active', 'released'):
+                changes["available_quantity"] = Greatest(F("available_quantity") - order.required_qty, Value(0))
+                changes["updated_at"] = timezone.now()
+            Product.objects.filter(product_id=order.product_id).update(**changes)
 
         super().save(*args, **kwargs)
 
@@ -167,6 +297,38 @@ class Shipment(models.Model):
         return f"Shipment {self.shipment_id} - {truck_license_plate}"
 
 
+class StockReservation(models.Model):
+    """
+    Quantity of a product held for an allocated order.
+
+    ``Product.available_quantity`` is the stock on hand; the quantity that can
+    still be promised is that minus the product's active reservations.
+    Delivering the order fulfils the reservation and takes the stock off hand;
+    a failed shipment or a cancelled order releases it (``release_reservations``).
+    """
+    reservation_id = models.AutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="reservation")
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('fulfilled', 'Fulfilled'),
+        ('released', 'Released')
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+
+    class Meta:
+        indexes = [
+            # Available-to-promise sums active reservations per product
+            models.Index(fields=['product', 'status'], name='reservation_product_status'),
+        ]
+
+    def __str__(self):
+        return f"Reservation {self.reservation_id} - {self.product_id} x {self.quantity} ({self.status})"
+
+
 class OdooCredentials(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="odoo_credentials")
     db = models.CharField(max_length=255)
@@ -174,4 +336,133 @@ class OdooCredentials(models.Model):
     password = models.CharField(max_length=255)
 
     def __str__(self):
-        return f"Odoo Credentials for {self.user.username}"
\ No newline at end of file
+        return f"Odoo Credentials for {self.user.username}"
+
+class OdooOutboxMessage(models.Model):
+    """
+    Pending change for Odoo, written in the same transaction as the change itself.
+
+    ``run_odoo_outbox`` delivers the messages outside any request, retrying
+    failures with exponential backoff until ``max_attempts``, after which the
+    message is dead-lettered.
+    """
+    message_id = models.AutoField(primary_key=True)
+
+    OPERATION_CHOICES = [
+        ('create_product', 'Create Product'),
+    ]
+    operation = models.CharField(max_length=50, choices=OPERATION_CHOICES)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name="odoo_outbox")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="odoo_outbox")
+    payload = models.JSONField(default=dict)
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead')
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    odoo_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker polls for due pending messages
+            models.Index(fields=['status', 'next_attempt_at'], name='odoo_outbox_due'),
+        ]
+
+    def __str__(self):
+        return f"OdooOutboxMessage {self.message_id} - {self.operation} ({self.status})"
+
+
+class OdooSyncState(models.Model):
+    """Watermarks of the delta sync between the catalog and one user's Odoo."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="odoo_sync_state")
+    # Odoo write_date ("YYYY-MM-DD HH:MM:SS", UTC) and id of the last record pulled
+    pulled_write_date = models.CharField(max_length=19, blank=True, default='')
+    pulled_id = models.IntegerField(default=0)
+    # Local Product.updated_at up to which changes have been pushed
+    pushed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Odoo sync state for {self.user.username}"
+
+
+class AllocationEvent(models.Model):
+    """Change that the incremental allocator (``run_allocator``) has not consumed yet."""
+    event_id = models.AutoField(primary_key=True)
+
+    KIND_CHOICES = [
+        ('order_created', 'Order Created'),
+        ('truck_freed', 'Truck Freed'),
+        ('stock_increased', 'Stock Increased'),
+        ('resync', 'Resync')
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name="allocation_events")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name="allocation_events")
+    truck = models.ForeignKey(Truck, on_delete=models.CASCADE, null=True, blank=True, related_name="allocation_events")
+    quantity = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"AllocationEvent {self.event_id} - {self.kind}"
+
+
+class AllocationJob(models.Model):
+    """Allocation run submitted through the API and executed by ``run_allocation_jobs``."""
+    job_id = models.AutoField(primary_key=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="allocation_jobs")
+    strategy = models.CharField(max_length=50, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+
+    orders_total = models.PositiveIntegerField(default=0)
+    orders_processed = models.PositiveIntegerField(default=0)
+    allocated_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    # Lease of the worker running the job, renewed by every chunk; another worker reclaims it once expired
+    locked_until = models.DateTimeField(null=True, blank=True)
+    # Where a reclaimed job resumes: the trucks it packs onto and the (order_date, order_id) cursor
+    truck_ids = models.JSONField(null=True, blank=True)
+    cursor_order_date = models.DateTimeField(null=True, blank=True)
+    cursor_order_id = models.PositiveIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"AllocationJob {self.job_id} - {self.status}"
+
+
+class AllocationJobResult(models.Model):
+    """One allocated or skipped order of an ``AllocationJob``."""
+    job = models.ForeignKey(AllocationJob, on_delete=models.CASCADE, related_name="results")
+    order_id = models.PositiveIntegerField()
+    allocated = models.BooleanField()
+    shipment_id = models.PositiveIntegerField(null=True, blank=True)
+    reason = models.CharField(max_length=255, blank=True, default='')
+
+    def __str__(self):
+        return f"Job {self.job_id} - Order {self.order_id}"
+
+
+class TableVersion(models.Model):
+    """Change counter of a table, bumped on commit; the read endpoints' ETags are built from it."""
+    table = models.CharField(max_length=100, primary_key=True)  # Model label, e.g. "app.order"
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
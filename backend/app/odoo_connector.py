@@ -1,4 +1,14 @@
+import queue
+import threading
 import xmlrpc.client
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+def odoo_url():
+    return getattr(settings, "ODOO_URL", "http://localhost:8069")
+
 
 def authenticate_with_odoo(db, username, password):
     """
@@ -9,7 +19,7 @@ def authenticate_with_odoo(db, username, password):
     :param password: Odoo password
     :return: Tuple (uid, models) if authentication is successful
     """
-    url = "http://localhost:8069"  # Update this if your Odoo instance URL changes
+    url = odoo_url()
     common = xmlrpc.client.ServerProxy(f"{url}/xmlrpc/2/common")
     uid = common.authenticate(db, username, password, {})
 
@@ -41,4 +51,171 @@ def add_product_to_odoo(uid, models, db, password, name, price, quantity):
             'qty_available': quantity,
         }]
     )
-    return product_id
\ No newline at end of file
+    return product_id
+
+
+class OdooAuthenticationError(Exception):
+    """The Odoo credentials were rejected."""
+
+
+class TransportPool:
+    """
+    Bounded pool of keep-alive XML-RPC transports for one Odoo server.
+
+    ``xmlrpc.client.Transport`` keeps its HTTP connection open between
+    requests but is not thread-safe, so every caller borrows one for the
+    duration of a call. At most ``size`` connections are open at once.
+    """
+
+    def __init__(self, url, size=4, timeout=30):
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _new_transport(self):
+        transport_class = xmlrpc.client.SafeTransport if self.url.startswith("https") else xmlrpc.client.Transport
+        transport = transport_class()
+        # The stdlib transport has no timeout of its own
+        make_connection = transport.make_connection
+
+        def make_connection_with_timeout(host):
+            connection = make_connection(host)
+            connection.timeout = self.timeout
+            return connection
+
+        transport.make_connection = make_connection_with_timeout
+        return transport
+
+    @contextmanager
+    def proxy(self, path):
+        """Borrow a transport and yield a ``ServerProxy`` for ``path`` bound to it."""
+        self._slots.acquire()
+        try:
+            try:
+                transport = self._idle.get_nowait()
+            except queue.Empty:
+                transport = self._new_transport()
+            try:
+                yield xmlrpc.client.ServerProxy(f"{self.url}{path}", transport=transport, allow_none=True)
+            except xmlrpc.client.Fault:
+                # A fault is a complete response, the connection is still usable
+                self._idle.put(transport)
+                raise
+            except BaseException:
+                # The connection may be half-read; do not hand it to the next caller
+                transport.close()
+                raise
+            else:
+                self._idle.put(transport)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _is_access_denied(fault):
+    return fault.faultCode == 3 or "AccessDenied" in fault.faultString or "Access Denied" in fault.faultString
+
+
+class OdooClient:
+    """
+    Authenticated Odoo session shared across calls and threads.
+
+    The uid is cached after the first ``authenticate`` and only fetched again
+    when Odoo rejects it; calls go through the pooled keep-alive transports.
+    Get instances with ``get_odoo_client``.
+    """
+
+    def __init__(self, db, username, password, pool):
+        self.db = db
+        self.username = username
+        self.password = password
+        self.pool = pool
+        self._uid = None
+        self._lock = threading.Lock()
+
+    def authenticate(self, force=False):
+        with self._lock:
+            if self._uid is None or force:
+                with self.pool.proxy("/xmlrpc/2/common") as common:
+                    uid = common.authenticate(self.db, self.username, self.password, {})
+                if not uid:
+                    self._uid = None
+                    raise OdooAuthenticationError("Failed to authenticate with Odoo. Check your credentials.")
+                self._uid = uid
+            return self._uid
+
+    @property
+    def uid(self):
+        return self.authenticate()
+
+    def execute_kw(self, model, method, args, kwargs=None):
+        """Call ``model.method`` in Odoo, re-authenticating once if the cached uid is rejected."""
+        uid = self.uid
+        try:
+            return self._execute(uid, model, method, args, kwargs)
+        except xmlrpc.client.Fault as fault:
+            if not _is_access_denied(fault):
+                raise
+        return self._execute(self.authenticate(force=True), model, method, args, kwargs)
+
+    def _execute(self, uid, model, method, args, kwargs):
+        with self.pool.proxy("/xmlrpc/2/object") as models:
+            return models.execute_kw(self.db, uid, self.password, model, method, args, kwargs or {})
+
+
+_pools = {}
+_clients = {}
+_registry_lock = threading.Lock()
+
+
+def get_odoo_client(db, username, password, url=None):
+    """Shared ``OdooClient`` for these credentials, with one transport pool per server."""
+    url = url or odoo_url()
+    key = (url, db, username, password)
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is None:
+            pool = _pools.get(url)
+            if pool is None:
+                pool = _pools[url] = TransportPool(
+                    url,
+                    size=getattr(settings, "ODOO_POOL_SIZE", 4),
+                    timeout=getattr(settings, "ODOO_TIMEOUT", 30),
+                )
+            client = _clients[key] = OdooClient(db, username, password, pool)
+        return client
+
+
+def reset_odoo_clients():
+    """Drop cached sessions and close pooled connections (tests, credential changes)."""
+    with _registry_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+        _clients.clear()
+
+
+def odoo_product_values(name, price, quantity):
+    """The ``product.product`` values Ignyte owns."""
+    return {
+        'name': name,
+        'list_price': float(price),
+        'qty_available': quantity,
+    }
+
+
+def create_odoo_product(client, name, price, quantity):
+    """
+    Create a product through a pooled ``OdooClient``.
+
+    :return: ID of the created product
+    """
+    return client.execute_kw('product.product', 'create', [odoo_product_values(name, price, quantity)])
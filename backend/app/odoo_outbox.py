@@ -0,0 +1,176 @@
+"""
+Transactional outbox for Odoo.
+
+Model changes that Odoo must learn about are recorded as ``OdooOutboxMessage``
+rows in the caller's transaction (``enqueue_product_sync``), so saving a
+product never waits on the ERP and a rolled back save sends nothing.
+``deliver_outbox`` is run by the ``run_odoo_outbox`` worker:
+
+- due messages are claimed with SKIP LOCKED and leased by pushing their
+  ``next_attempt_at`` forward, so the XML-RPC calls happen outside any
+  transaction and a crashed worker's messages become due again; the lease
+  is renewed right before each message is sent, so a slow batch cannot
+  outlive it,
+- a failed delivery is retried after ``base * 2 ** (attempts - 1)`` seconds
+  (capped, with jitter),
+- after ``ODOO_OUTBOX_MAX_ATTEMPTS`` failures, or on an error that a retry
+  cannot fix (missing or rejected credentials), the message is dead-lettered.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .dashboard import bump_versions
+from .models import OdooCredentials, OdooOutboxMessage, Product
+from .odoo_connector import OdooAuthenticationError, create_odoo_product, get_odoo_client, odoo_product_values
+from .odoo_sync import values_hash
+
+logger = logging.getLogger(__name__)
+
+# Covers one send (a few XML-RPC calls of at most ODOO_TIMEOUT each); renewed per message
+LEASE_SECONDS = 5 * 60
+
+
+class PermanentOdooError(Exception):
+    """Delivery failure that retrying cannot fix; the message is dead-lettered at once."""
+
+
+def enqueue_product_sync(product):
+    """Queue the creation of ``product`` in its creator's Odoo, in the current transaction."""
+    if not product.created_by_id:
+        return None
+    return OdooOutboxMessage.objects.create(
+        operation='create_product',
+        product=product,
+        user_id=product.created_by_id,
+        payload={
+            "name": product.name,
+            "price": str(product.price),
+            "quantity": product.available_quantity,
+        },
+    )
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before the next attempt after ``attempts`` failures."""
+    base = getattr(settings, "ODOO_OUTBOX_BACKOFF_BASE", 30)
+    cap = getattr(settings, "ODOO_OUTBOX_BACKOFF_MAX", 60 * 60)
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    # Jitter keeps messages that failed together from retrying in lockstep
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_messages(batch_size=100):
+    """Lease up to ``batch_size`` due messages and count the attempt."""
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OdooOutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'message_id')[:batch_size]
+        )
+        for message in messages:
+            message.attempts += 1
+            message.next_attempt_at = now + timedelta(seconds=LEASE_SECONDS)
+        OdooOutboxMessage.objects.bulk_update(messages, ['attempts', 'next_attempt_at'])
+    return messages
+
+
+def renew_lease(message):
+    """
+    Extend the lease of a claimed message right before it is sent.
+
+    Only succeeds while the message still carries the lease this worker set:
+    if the batch took so long that the lease ran out and another worker
+    reclaimed the message, it is left to that worker.
+
+    :return: Whether this worker still holds the message
+    """
+    leased_until = timezone.now() + timedelta(seconds=LEASE_SECONDS)
+    renewed = OdooOutboxMessage.objects.filter(
+        message_id=message.message_id, status='pending', next_attempt_at=message.next_attempt_at
+    ).update(next_attempt_at=leased_until)
+    message.next_attempt_at = leased_until
+    return bool(renewed)
+
+
+def send_message(message, credentials_by_user):
+    """
+    Deliver one message to Odoo through the user's pooled ``OdooClient``.
+
+    :param credentials_by_user: Dict ``user_id -> OdooCredentials`` reused across a batch
+    :return: The Odoo record id
+    """
+    if message.user_id not in credentials_by_user:
+        try:
+            credentials_by_user[message.user_id] = OdooCredentials.objects.get(user_id=message.user_id)
+        except OdooCredentials.DoesNotExist:
+            raise PermanentOdooError(f"No Odoo credentials for user {message.user_id}")
+    credentials = credentials_by_user[message.user_id]
+    client = get_odoo_client(credentials.db, credentials.username, credentials.password)
+
+    if message.operation == 'create_product':
+        payload = message.payload
+        return create_odoo_product(client, payload["name"], payload["price"], payload["quantity"])
+    raise PermanentOdooError(f"Unknown operation {message.operation}")
+
+
+def deliver_outbox(batch_size=100, max_attempts=None):
+    """
+    Claim and deliver one batch of due messages.
+
+    :return: Dict with the number of messages ``sent``, ``retried`` and ``dead``
+    """
+    if max_attempts is None:
+        max_attempts = getattr(settings, "ODOO_OUTBOX_MAX_ATTEMPTS", 8)
+
+    counts = {"sent": 0, "retried": 0, "dead": 0}
+    credentials_by_user = {}
+    for message in claim_messages(batch_size):
+        if not renew_lease(message):
+            logger.info(f"Odoo outbox message {message.message_id} was reclaimed by another worker")
+            continue
+        try:
+            odoo_id = send_message(message, credentials_by_user)
+        except Exception as e:
+            permanent = isinstance(e, (PermanentOdooError, OdooAuthenticationError))
+            if permanent or message.attempts >= max_attempts:
+                OdooOutboxMessage.objects.filter(message_id=message.message_id).update(status='dead', last_error=str(e))
+                counts["dead"] += 1
+                logger.error(f"Odoo outbox message {message.message_id} dead-lettered: {e}")
+            else:
+                OdooOutboxMessage.objects.filter(message_id=message.message_id).update(
+                    next_attempt_at=timezone.now() + timedelta(seconds=backoff_delay(message.attempts)),
+                    last_error=str(e),
+                )
+                counts["retried"] += 1
+                logger.warning(f"Odoo outbox message {message.message_id} failed (attempt {message.attempts}): {e}")
+            continue
+
+        OdooOutboxMessage.objects.filter(message_id=message.message_id).update(
+            status='sent', odoo_id=odoo_id, sent_at=timezone.now(), last_error=''
+        )
+        if message.operation == 'create_product' and message.product_id:
+            # Map the product so catalog pushes update it instead of creating it again
+            payload = message.payload
+            Product.objects.filter(product_id=message.product_id, odoo_id__isnull=True).update(
+                odoo_id=odoo_id,
+                odoo_owner_id=message.user_id,
+                odoo_sync_hash=values_hash(odoo_product_values(payload["name"], payload["price"], payload["quantity"])),
+                odoo_synced_quantity=payload["quantity"],
+            )
+            bump_versions(Product)
+        counts["sent"] += 1
+    return counts
+
+
+def requeue_dead_messages(message_ids=None):
+    """Give dead-lettered messages a fresh set of attempts."""
+    messages = OdooOutboxMessage.objects.filter(status='dead')
+    if message_ids is not None:
+        messages = messages.filter(message_id__in=message_ids)
+    return messages.update(status='pending', attempts=0, next_attempt_at=timezone.now())
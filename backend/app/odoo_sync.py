@@ -0,0 +1,349 @@
+"""
+Batched product push to Odoo.
+
+``push_products`` sends the catalog in chunks: products without an
+``odoo_id`` go out as one multi-record ``create`` per chunk, mapped products
+whose values changed since the last push (``odoo_sync_hash``) as ``write``
+calls grouped by identical values. Chunks run concurrently on a thread pool
+over the pooled ``OdooClient``; the database is only touched from the calling
+thread, which stores the returned ids and fingerprints as each chunk finishes,
+so an interrupted run resumes where it stopped.
+
+``sync_delta`` is the incremental two-way cycle: it pulls the Odoo products
+written since the stored ``write_date`` watermark, then pushes the local
+products updated since the last push. Both sides are found through indexed
+watermarks, so a cycle costs work proportional to what changed.
+
+Odoo ids are only unique within one Odoo database, so a mapping belongs to
+the user whose credentials created or adopted it (``Product.odoo_owner``)
+and each sync only touches the products of the user it runs for, or that
+user created (``syncable_products``).
+"""
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .dashboard import bump_versions
+from .models import OdooSyncState, Product
+from .odoo_connector import odoo_product_values
+from .stock import recompute_product_status
+
+logger = logging.getLogger(__name__)
+
+ODOO_PRODUCT_MODEL = 'product.product'
+DEFAULT_CHUNK_SIZE = 200
+
+
+def syncable_products(user):
+    """
+    Products ``user``'s Odoo may hold: those mapped in it and the unmapped
+    products ``user`` created.
+
+    Unmapped products with a pending ``create_product`` outbox message are
+    left to ``run_odoo_outbox``, which would otherwise create them a second
+    time; those whose message is dead are pushed again.
+    """
+    unmapped = Q(odoo_id__isnull=True, created_by=user) & ~Q(odoo_outbox__status='pending')
+    return Product.objects.filter(Q(odoo_owner=user) | unmapped)
+
+
+def values_hash(values):
+    return hashlib.sha1(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _create_chunk(client, chunk):
+    ids = client.execute_kw(ODOO_PRODUCT_MODEL, 'create', [[values for _, values in chunk]])
+    return [(product_id, odoo_id, values) for (product_id, values), odoo_id in zip(chunk, ids)]
+
+
+def _write_chunk(client, chunk):
+    # write() applies one set of values to many records, so identical changes share a call
+    groups = {}
+    for product_id, odoo_id, values in chunk:
+        groups.setdefault(json.dumps(values, sort_keys=True), []).append((product_id, odoo_id, values))
+    for rows in groups.values():
+        client.execute_kw(ODOO_PRODUCT_MODEL, 'write', [[odoo_id for _, odoo_id, _ in rows], rows[0][2]])
+    return chunk
+
+
+def plan_push(products):
+    """
+    Split products into the rows to create and the rows to update.
+
+    :param products: Products with ``name``, ``price``, ``available_quantity``,
+                     ``odoo_id`` and ``odoo_sync_hash`` loaded
+    :return: Tuple ``(creates, writes, unchanged)``; ``creates`` is a list of
+             ``(product_id, values)``, ``writes`` of ``(product_id, odoo_id, values)``
+    """
+    creates, writes, unchanged = [], [], 0
+    for product in products:
+        values = odoo_product_values(product.name, product.price, product.available_quantity)
+        if product.odoo_id is None:
+            creates.append((product.product_id, values))
+        elif product.odoo_sync_hash != values_hash(values):
+            writes.append((product.product_id, product.odoo_id, values))
+        else:
+            unchanged += 1
+    return creates, writes, unchanged
+
+
+def push_products(client, user, products, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+    """
+    Create or update ``products`` in ``user``'s Odoo with multi-record calls.
+
+    :param client: ``OdooClient`` of ``user``'s credentials
+    :param user: Owner of the mappings, see ``syncable_products``
+    :param products: Iterable of products (see ``plan_push``)
+    :param chunk_size: Records per ``create``/``write`` call
+    :param workers: Chunks sent concurrently
+    :return: Dict with ``created``, ``updated``, ``unchanged`` and ``failed`` counts
+    """
+    creates, writes, unchanged = plan_push(products)
+    summary = {"created": 0, "updated": 0, "unchanged": unchanged, "failed": 0}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {}
+        for chunk in _chunks(creates, chunk_size):
+            futures[executor.submit(_create_chunk, client, chunk)] = ("created", len(chunk))
+        for chunk in _chunks(writes, chunk_size):
+            futures[executor.submit(_write_chunk, client, chunk)] = ("updated", len(chunk))
+
+        for future in as_completed(futures):
+            kind, size = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                summary["failed"] += size
+                logger.error(f"Odoo push of {size} product(s) failed: {e}")
+                continue
+            _store_mapping(rows, user)
+            summary[kind] += len(rows)
+
+    return summary
+
+
+def _store_mapping(rows, user):
+    """Record the Odoo ids and pushed fingerprints of ``(product_id, odoo_id, values)`` rows."""
+    Product.objects.bulk_update(
+        [
+            Product(
+                product_id=product_id,
+                odoo_id=odoo_id,
+                odoo_owner=user,
+                odoo_sync_hash=values_hash(values),
+                odoo_synced_quantity=values['qty_available'],
+            )
+            for product_id, odoo_id, values in rows
+        ],
+        ['odoo_id', 'odoo_owner', 'odoo_sync_hash', 'odoo_synced_quantity'],
+    )
+    bump_versions(Product)
+
+
+def reconcile_mapping(client, user, products, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Repair the local ``odoo_id`` mapping against what exists in ``user``'s Odoo.
+
+    Mapped products whose Odoo record is gone are unmapped so the next push
+    recreates them; unmapped products adopt an Odoo product with the same
+    name instead of creating a duplicate. Fingerprints are cleared so the
+    next push rewrites every adopted row.
+
+    :param products: Products of ``syncable_products(user)``
+    :return: Dict with ``unmapped`` and ``adopted`` counts
+    """
+    mapped = [product for product in products if product.odoo_id is not None]
+    unmapped = [product for product in products if product.odoo_id is None]
+    result = {"unmapped": 0, "adopted": 0}
+
+    missing = []
+    for chunk in _chunks(mapped, chunk_size):
+        existing = set(client.execute_kw(ODOO_PRODUCT_MODEL, 'search', [[('id', 'in', [p.odoo_id for p in chunk])]]))
+        missing.extend(product.product_id for product in chunk if product.odoo_id not in existing)
+    if missing:
+        result["unmapped"] = Product.objects.filter(product_id__in=missing).update(
+            odoo_id=None, odoo_owner=None, odoo_sync_hash=''
+        )
+
+    taken = set(Product.objects.filter(odoo_owner=user, odoo_id__isnull=False).values_list('odoo_id', flat=True))
+    adopted = []
+    for chunk in _chunks(unmapped, chunk_size):
+        records = client.execute_kw(
+            ODOO_PRODUCT_MODEL, 'search_read', [[('name', 'in', [p.name for p in chunk])]], {'fields': ['name']}
+        )
+        by_name = {}
+        for record in records:
+            if record['id'] not in taken:
+                by_name.setdefault(record['name'], record['id'])
+        for product in chunk:
+            odoo_id = by_name.pop(product.name, None)
+            if odoo_id is not None:
+                taken.add(odoo_id)
+                adopted.append(Product(
+                    product_id=product.product_id, odoo_id=odoo_id, odoo_owner=user, odoo_sync_hash=''
+                ))
+    Product.objects.bulk_update(adopted, ['odoo_id', 'odoo_owner', 'odoo_sync_hash'], batch_size=1000)
+    if missing or adopted:
+        bump_versions(Product)
+    result["adopted"] = len(adopted)
+    return result
+
+
+QUANTITY_POLICIES = ('merge', 'local', 'remote')
+PULL_FIELDS = ['name', 'list_price', 'qty_available', 'write_date']
+ODOO_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+WATERMARK_SETTLE_SECONDS = 300
+
+
+def resolve_quantity(local, remote, base, policy):
+    """
+    Quantity to keep when it may have changed on both sides since ``base``.
+
+    ``merge`` applies both sides' changes (stock movements recorded in Ignyte
+    and adjustments made in Odoo), ``local`` keeps Ignyte's count and
+    ``remote`` takes Odoo's.
+    """
+    if base is None or local == base:
+        return remote
+    if remote == base or policy == 'local':
+        return local
+    if policy == 'remote':
+        return remote
+    return max(0, local + remote - base)
+
+
+def _is_recent(write_date, now):
+    """Whether Odoo can still be writing records stamped with ``write_date``, allowing for clock skew."""
+    stamped = datetime.strptime(write_date, ODOO_DATETIME_FORMAT).replace(tzinfo=dt_timezone.utc)
+    return now - stamped < timedelta(seconds=WATERMARK_SETTLE_SECONDS)
+
+
+def _pull_page(client, write_date, after_id, page_size):
+    """Next page of Odoo products written after the ``(write_date, id)`` cursor, oldest first."""
+    domain = []
+    if write_date:
+        domain = [
+            '|', ('write_date', '>', write_date),
+            '&', ('write_date', '=', write_date), ('id', '>', after_id),
+        ]
+    return client.execute_kw(
+        ODOO_PRODUCT_MODEL, 'search_read', [domain],
+        {'fields': PULL_FIELDS, 'order': 'write_date asc, id asc', 'limit': page_size},
+    )
+
+
+def _apply_pulled(records, user, policy):
+    """
+    Bring ``user``'s mapped products in line with pulled Odoo records.
+
+    Runs in the caller's transaction. The products are locked until it
+    commits, so stock movements recorded meanwhile (``F()`` updates of
+    ``available_quantity``) wait and apply on top of the merged quantity
+    instead of being overwritten by it.
+
+    Products whose merged quantity differs from Odoo's get their
+    ``updated_at`` bumped so the push half of the cycle sends it back.
+
+    :return: Number of local products changed
+    """
+    products = {
+        product.odoo_id: product
+        for product in Product.objects.select_for_update()
+        .filter(odoo_owner=user, odoo_id__in=[record['id'] for record in records])
+        .order_by('product_id')
+    }
+    changed = []
+    now = timezone.now()
+    for record in records:
+        product = products.get(record['id'])
+        if product is None:
+            continue
+        remote = odoo_product_values(record['name'], record['list_price'], record['qty_available'])
+        if values_hash(remote) == product.odoo_sync_hash:
+            # Our own push coming back, or nothing Ignyte tracks changed
+            continue
+
+        local = odoo_product_values(product.name, product.price, product.available_quantity)
+        locally_changed = values_hash(local) != product.odoo_sync_hash
+        quantity = resolve_quantity(
+            product.available_quantity, record['qty_available'],
+            product.odoo_synced_quantity if locally_changed else None, policy,
+        )
+
+        product.name = record['name']
+        product.price = record['list_price']
+        product.available_quantity = quantity
+        product.odoo_sync_hash = values_hash(remote)
+        product.odoo_synced_quantity = record['qty_available']
+        if quantity != record['qty_available']:
+            # Odoo still has to learn the merged quantity
+            product.updated_at = now
+        changed.append(product)
+
+    Product.objects.bulk_update(
+        changed,
+        ['name', 'price', 'available_quantity', 'odoo_sync_hash', 'odoo_synced_quantity', 'updated_at'],
+    )
+    recompute_product_status([product.product_id for product in changed])
+    return len(changed)
+
+
+def sync_delta(client, user, page_size=500, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, policy=None):
+    """
+    Run one pull-then-push delta cycle against ``user``'s Odoo.
+
+    :param policy: Quantity conflict policy (``merge``, ``local`` or ``remote``);
+                   defaults to ``settings.ODOO_QUANTITY_CONFLICT_POLICY``
+    :return: Dict with ``pulled``, ``applied`` and the ``push_products`` counts
+    """
+    policy = policy or getattr(settings, "ODOO_QUANTITY_CONFLICT_POLICY", 'merge')
+    if policy not in QUANTITY_POLICIES:
+        raise ValueError(f"Quantity conflict policy must be one of: {', '.join(QUANTITY_POLICIES)}")
+
+    state, _ = OdooSyncState.objects.get_or_create(user=user)
+    cycle_start = timezone.now()
+    summary = {"pulled": 0, "applied": 0}
+
+    write_date, after_id = state.pulled_write_date, state.pulled_id
+    if write_date and _is_recent(write_date, cycle_start):
+        # write_date only has second precision, so Odoo may still write records with a lower
+        # id in the watermark second; re-read it (re-pulled records are fingerprint no-ops)
+        after_id = 0
+    while True:
+        records = _pull_page(client, write_date, after_id, page_size)
+        if not records:
+            break
+        with transaction.atomic():
+            summary["applied"] += _apply_pulled(records, user, policy)
+            write_date, after_id = records[-1]['write_date'], records[-1]['id']
+            state.pulled_write_date, state.pulled_id = write_date, after_id
+            state.save(update_fields=['pulled_write_date', 'pulled_id'])
+        summary["pulled"] += len(records)
+        if len(records) < page_size:
+            break
+
+    changed = Product.objects.filter(odoo_owner=user, odoo_id__isnull=False).only(
+        'product_id', 'name', 'price', 'available_quantity', 'odoo_id', 'odoo_sync_hash'
+    )
+    if state.pushed_at is not None:
+        changed = changed.filter(updated_at__gt=state.pushed_at)
+    summary.update(push_products(client, user, changed, chunk_size, workers))
+
+    if not summary["failed"]:
+        # A transaction may stamp updated_at before the cycle starts and commit after the push
+        # read; re-read the settle window next cycle (unchanged fingerprints are not re-sent)
+        state.pushed_at = cycle_start - timedelta(seconds=WATERMARK_SETTLE_SECONDS)
+        state.save(update_fields=['pushed_at'])
+    return summary
@@ -0,0 +1,150 @@
+"""
+Bulk order placement.
+
+``place_orders`` validates a whole batch of order lines with one query per
+referenced table, inserts the orders with ``bulk_create`` and applies their
+demand to the products in one aggregated UPDATE. ``bulk_create`` skips the
+Order signals, so their side effects (demand, product status, allocator
+events, dashboard counters) are applied here explicitly.
+"""
+import hashlib
+import json
+
+from django.db import IntegrityError, transaction
+
+from .allocation import record_allocation_events
+from .dashboard import bump_versions
+from .events import emit
+from .models import Order, OrderBatch, Product, Retailer
+from .stock import apply_demand_changes
+
+MAX_ORDER_LINES = 10000
+INSERT_BATCH_SIZE = 2000
+
+
+class OrderBatchError(Exception):
+    """Raised when a batch cannot be placed; ``errors`` lists the offending lines."""
+
+    def __init__(self, message, errors=None, status_code=400):
+        super().__init__(message)
+        self.errors = errors or []
+        self.status_code = status_code
+
+
+def _request_hash(lines):
+    return hashlib.sha256(json.dumps(lines, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def validate_order_lines(lines):
+    """
+    Check the shape of every line and that its product and retailer exist.
+
+    :param lines: List of dicts with ``retailer_id``, ``product_id`` and ``required_qty``
+    :return: List of ``(retailer_id, product_id, required_qty)``
+    :raises OrderBatchError: Listing every invalid line by index
+    """
+    if not isinstance(lines, list) or not lines:
+        raise OrderBatchError("orders must be a non-empty list")
+    if len(lines) > MAX_ORDER_LINES:
+        raise OrderBatchError(f"At most {MAX_ORDER_LINES} orders can be placed per request")
+
+    errors = []
+    parsed = []
+    for index, line in enumerate(lines):
+        try:
+            retailer_id = int(line["retailer_id"])
+            product_id = int(line["product_id"])
+            required_qty = int(line["required_qty"])
+        except (KeyError, TypeError, ValueError):
+            errors.append({"index": index, "error": "retailer_id, product_id and required_qty must be integers"})
+            continue
+        if required_qty <= 0:
+            errors.append({"index": index, "error": "required_qty must be positive"})
+            continue
+        parsed.append((index, retailer_id, product_id, required_qty))
+
+    # One query per table for the whole batch
+    product_ids = set(Product.objects.filter(product_id__in={line[2] for line in parsed}).values_list('product_id', flat=True))
+    retailer_ids = set(Retailer.objects.filter(retailer_id__in={line[1] for line in parsed}).values_list('retailer_id', flat=True))
+    for index, retailer_id, product_id, _ in parsed:
+        if product_id not in product_ids:
+            errors.append({"index": index, "error": f"Product {product_id} does not exist"})
+        elif retailer_id not in retailer_ids:
+            errors.append({"index": index, "error": f"Retailer {retailer_id} does not exist"})
+
+    if errors:
+        raise OrderBatchError("Invalid order lines", sorted(errors, key=lambda error: error["index"]))
+    return [(retailer_id, product_id, required_qty) for _, retailer_id, product_id, required_qty in parsed]
+
+
+def place_orders(lines, user, idempotency_key=None):
+    """
+    Place a batch of pending orders atomically.
+
+    :param lines: Raw order lines from the request
+    :param user: User placing the batch; idempotency keys are scoped to them
+    :param idempotency_key: Optional client key. Repeating a request with the same
+                            key returns the first response instead of placing the
+                            orders again
+    :return: Tuple ``(response, replayed)``
+    :raises OrderBatchError: For invalid lines, or (409) a key reused with a different payload
+    """
+    request_hash = _request_hash(lines)
+    if idempotency_key:
+        replay = _replay(user, idempotency_key, request_hash)
+        if replay is not None:
+            return replay, True
+
+    valid_lines = validate_order_lines(lines)
+
+    try:
+        with transaction.atomic():
+            batch = OrderBatch.objects.create(
+                created_by=user, idempotency_key=idempotency_key or None, request_hash=request_hash
+            )
+            orders = Order.objects.bulk_create(
+                [
+                    Order(retailer_id=retailer_id, product_id=product_id, required_qty=required_qty, status='pending')
+                    for retailer_id, product_id, required_qty in valid_lines
+                ],
+                batch_size=INSERT_BATCH_SIZE,
+            )
+
+            demand = {}
+            for order in orders:
+                demand[order.product_id] = demand.get(order.product_id, 0) + order.required_qty
+            apply_demand_changes(demand)
+            bump_versions(Order)
+            emit('order', 'created', [order.order_id for order in orders])
+
+            record_allocation_events('order_created', [
+                {"order_id": order.order_id, "product_id": order.product_id, "quantity": order.required_qty}
+                for order in orders
+            ])
+
+            response = {
+                "batch_id": batch.batch_id,
+                "created": len(orders),
+                "order_ids": [order.order_id for order in orders],
+            }
+            batch.order_count = len(orders)
+            batch.response = response
+            batch.save(update_fields=['order_count', 'response'])
+    except IntegrityError:
+        # A concurrent retry with the same key committed first
+        if idempotency_key:
+            replay = _replay(user, idempotency_key, request_hash)
+            if replay is not None:
+                return replay, True
+        raise
+
+    return response, False
+
+
+def _replay(user, idempotency_key, request_hash):
+    batch = OrderBatch.objects.filter(created_by=user, idempotency_key=idempotency_key).first()
+    if batch is None:
+        return None
+    if batch.request_hash != request_hash:
+        raise OrderBatchError("Idempotency key was already used with a different request", status_code=409)
+    return batch.response
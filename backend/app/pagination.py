@@ -0,0 +1,125 @@
+"""
+Keyset (cursor) pagination for append-mostly histories.
+
+``KeysetPagination`` pages a queryset newest first on a ``(timestamp, id)``
+pair. A page is one indexed range scan that starts right after the cursor, so
+there is no ``COUNT(*)`` and no ``OFFSET``: page 10,000 costs what page 1
+costs. Cursors are opaque and carry the last row's key plus the direction, so
+``previous`` links work too. A total is only computed on request
+(``?with_total=true``) and is the planner's estimate on PostgreSQL.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimated_count(queryset):
+    """
+    Number of rows ``queryset`` would return, from the planner's estimate on
+    PostgreSQL (no scan) and an exact ``COUNT(*)`` on other databases.
+    """
+    queryset = queryset.order_by()
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+    return queryset.count()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first pages keyed on ``(date_field, id_field)``; back the pair
+    with a composite index.
+
+    :param date_field: Timestamp the history is ordered by
+    :param id_field: Unique tie-breaker for rows with the same timestamp
+    """
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    total_query_param = "with_total"
+
+    def __init__(self, date_field, id_field):
+        self.date_field = date_field
+        self.id_field = id_field
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, row, reverse):
+        key = [getattr(row, self.date_field).isoformat(), getattr(row, self.id_field)]
+        payload = json.dumps({"k": key, "r": int(reverse)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        """:return: ``((date, id), reverse)``, or ``None`` for the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+            date, row_id = payload["k"]
+            return (datetime.fromisoformat(date), int(row_id)), bool(payload["r"])
+        except (ValueError, TypeError, KeyError):
+            raise ValidationError("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[1]
+
+        self.total = None
+        if request.query_params.get(self.total_query_param, "").lower() in ("1", "true"):
+            self.total = estimated_count(queryset)
+
+        date, row_id = self.date_field, self.id_field
+        if cursor is not None:
+            (after_date, after_id), _ = cursor
+            if reverse:
+                # Towards newer rows; the redundant bound gives the index scan its start key
+                queryset = queryset.filter(**{f"{date}__gte": after_date}).filter(
+                    Q(**{f"{date}__gt": after_date}) | Q(**{date: after_date, f"{row_id}__gt": after_id})
+                )
+            else:
+                queryset = queryset.filter(**{f"{date}__lte": after_date}).filter(
+                    Q(**{f"{date}__lt": after_date}) | Q(**{date: after_date, f"{row_id}__lt": after_id})
+                )
+        ordering = (date, row_id) if reverse else (f"-{date}", f"-{row_id}")
+
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Coming back from a later page means there is a page after this one, and vice versa
+        has_next = cursor is not None if reverse else has_more
+        has_previous = has_more if reverse else cursor is not None
+        self.next_cursor = self.encode_cursor(rows[-1], False) if rows and has_next else None
+        self.previous_cursor = self.encode_cursor(rows[0], True) if rows and has_previous else None
+        return rows
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.total_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        body = {"next": self._link(self.next_cursor), "previous": self._link(self.previous_cursor)}
+        if self.total is not None:
+            body["estimated_count"] = self.total
+        body["results"] = data
+        return Response(body)
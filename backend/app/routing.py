@@ -0,0 +1,146 @@
+"""
+Multi-stop route planning for a truck trip.
+
+Stops are ordered with a nearest-neighbour tour improved by 2-opt over a
+haversine distance matrix. Both the matrix and the 2-opt move evaluation are
+vectorised with numpy, which keeps a few hundred stops well under a second.
+"""
+import time
+
+import numpy as np
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_matrix(latitudes, longitudes):
+    """Pairwise great-circle distances in km between the given points."""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def nearest_neighbour_route(matrix, start=0):
+    """Greedy open tour starting at ``start``."""
+    n = len(matrix)
+    visited = np.zeros(n, dtype=bool)
+    route = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        distances = np.where(visited, np.inf, matrix[route[-1]])
+        nxt = int(np.argmin(distances))
+        route.append(nxt)
+        visited[nxt] = True
+    return route
+
+
+def two_opt(route, matrix, time_limit=0.5):
+    """
+    Improve an open tour with 2-opt segment reversals until no move helps.
+    The first stop stays in place.
+
+    For every segment start ``i`` the gain of all possible segment ends is
+    computed at once with numpy; the best improving move is applied.
+    """
+    route = np.asarray(route)
+    n = len(route)
+    if n < 4:
+        return route.tolist()
+
+    deadline = time.perf_counter() + time_limit
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, n - 1):
+            a, b = route[i - 1], route[i]
+            js = np.arange(i + 1, n)
+            c = route[js]
+            # The last stop has no successor in an open tour
+            d = route[np.minimum(js + 1, n - 1)]
+            has_next = js + 1 < n
+            gain = (
+                matrix[a, b]
+                + np.where(has_next, matrix[c, d], 0.0)
+                - matrix[a, c]
+                - np.where(has_next, matrix[b, d], 0.0)
+            )
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                j = js[best]
+                route[i:j + 1] = route[i:j + 1][::-1].copy()
+                improved = True
+    return route.tolist()
+
+
+def plan_route(stops, origin=None, time_limit=0.5):
+    """
+    Order delivery stops for one truck.
+
+    :param stops: List of dicts with ``latitude``, ``longitude`` and
+                  ``distance_from_warehouse`` (plus any caller data)
+    :param origin: ``(latitude, longitude)`` of the warehouse; defaults to
+                   ``settings.WAREHOUSE_COORDINATES``
+    :return: The same dicts in visiting order, each with ``stop`` (1-based)
+             and ``leg_distance`` (km from the previous stop, ``None`` if unknown)
+    """
+    if origin is None:
+        origin = getattr(settings, "WAREHOUSE_COORDINATES", None)
+
+    located = [s for s in stops if s.get("latitude") is not None and s.get("longitude") is not None]
+    # Stops without coordinates can only be ordered by their distance from the warehouse
+    unlocated = sorted(
+        (s for s in stops if s.get("latitude") is None or s.get("longitude") is None),
+        key=lambda s: s["distance_from_warehouse"],
+    )
+
+    ordered = []
+    legs = []
+    if located:
+        latitudes = [s["latitude"] for s in located]
+        longitudes = [s["longitude"] for s in located]
+        if origin is not None:
+            matrix = distance_matrix([origin[0]] + latitudes, [origin[1]] + longitudes)
+            route = two_opt(nearest_neighbour_route(matrix, 0), matrix, time_limit=time_limit)
+            route = route[1:]
+            previous = 0
+        else:
+            matrix = distance_matrix(latitudes, longitudes)
+            start = min(range(len(located)), key=lambda k: located[k]["distance_from_warehouse"])
+            route = two_opt(nearest_neighbour_route(matrix, start), matrix, time_limit=time_limit)
+            previous = None
+
+        for node in route:
+            legs.append(float(matrix[previous, node]) if previous is not None else None)
+            previous = node
+        offset = 1 if origin is not None else 0
+        ordered = [located[node - offset] for node in route]
+
+    result = []
+    for number, (stop, leg) in enumerate(zip(ordered + unlocated, legs + [None] * len(unlocated)), start=1):
+        result.append(dict(stop, stop=number, leg_distance=None if leg is None else round(leg, 3)))
+    return result
+
+
+def route_for_shipments(shipments, origin=None):
+    """
+    Plan the delivery order of shipments (with ``order__retailer`` loaded).
+
+    :return: List of stop dicts with shipment, order and retailer details
+    """
+    stops = [
+        {
+            "shipment_id": shipment.shipment_id,
+            "order_id": shipment.order_id,
+            "retailer_id": shipment.order.retailer_id,
+            "retailer": shipment.order.retailer.name,
+            "address": shipment.order.retailer.address,
+            "latitude": shipment.order.retailer.latitude,
+            "longitude": shipment.order.retailer.longitude,
+            "distance_from_warehouse": shipment.order.retailer.distance_from_warehouse,
+        }
+        for shipment in shipments
+    ]
+    return plan_route(stops, origin=origin)
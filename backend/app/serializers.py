@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Product, Category, Retailer, Order,  Employee, Truck, Shipment
+from .models import Product, Category, Retailer, Order,  Employee, Truck, Shipment, AllocationJob, AllocationJobResult, Trip
 
 from django.contrib.auth.models import User, Group
 
@@ -10,6 +10,8 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class ProductSerializer(serializers.ModelSerializer):
     category = serializers.CharField(source='category.name')  # Fetching category name instead of ID
+    # Needs annotate(available_to_promise=stock.promisable_expression())
+    available_to_promise = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
@@ -22,6 +24,10 @@ class RetailerSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class OrderSerializer(serializers.ModelSerializer):
+    # Needs select_related('product', 'retailer')
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    retailer_name = serializers.CharField(source='retailer.name', read_only=True)
+
     class Meta:
         model = Order
         fields = '__all__'
@@ -34,6 +40,10 @@ class TruckSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class EmployeeSerializer(serializers.ModelSerializer):
+    # Needs select_related('user', 'truck')
+    username = serializers.CharField(source='user.username', read_only=True, default=None)
+    truck_license_plate = serializers.CharField(source='truck.license_plate', read_only=True, default=None)
+
     class Meta:
         model = Employee
         fields = '__all__'
@@ -63,7 +73,22 @@ class ShipmentSerializer(serializers.ModelSerializer):
             product.save(update_fields=["total_required_quantity", "total_shipped"])
 
         return super().update(instance, validated_data)
-    
+
+
+class EmployeeShipmentSerializer(ShipmentSerializer):
+    """Shipment with the delivery address an employee needs; needs select_related('order__retailer')."""
+    retailer = serializers.SerializerMethodField()
+
+    def get_retailer(self, obj):
+        retailer = obj.order.retailer
+        return {
+            "retailer_id": retailer.retailer_id,
+            "name": retailer.name,
+            "address": retailer.address,
+            "contact": retailer.contact,
+        }
+
+
 class CategorySerializer(serializers.ModelSerializer):
     product_count = serializers.IntegerField(read_only=True)
 
@@ -72,6 +97,38 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['category_id', 'name', 'product_count']
 
 
+class TripSerializer(serializers.ModelSerializer):
+    order_ids = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Trip
+        fields = ['trip_id', 'employee', 'created_at', 'min_distance', 'max_distance', 'load', 'order_ids']
+
+    def get_order_ids(self, obj):
+        # Uses the prefetched shipments, ordered nearest first
+        shipments = sorted(obj.shipments.all(), key=lambda s: s.order.retailer.distance_from_warehouse)
+        return [shipment.order_id for shipment in shipments]
+
+
+class AllocationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AllocationJob
+        exclude = ['truck_ids', 'cursor_order_date', 'cursor_order_id']
+
+
+class AllocationJobResultSerializer(serializers.ModelSerializer):
+    """Renders a job result in the same shape as the synchronous allocation response."""
+
+    class Meta:
+        model = AllocationJobResult
+        fields = ['order_id', 'shipment_id', 'reason']
+
+    def to_representation(self, instance):
+        if instance.allocated:
+            return {"order_id": instance.order_id, "shipment_id": instance.shipment_id, "status": "allocated"}
+        return {"order_id": instance.order_id, "reason": instance.reason}
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     group_name = serializers.CharField(write_only=True)  # Accept group name during registration
 
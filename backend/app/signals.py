@@ -1,10 +1,13 @@
 from django.db.models.signals import post_save, post_delete, pre_save
-from django.db.models import F
 from django.dispatch import receiver
 from django.contrib.auth.models import User, Group
-from .models import Order, Product, Shipment, Truck, Employee,OdooCredentials
+from .models import Category, Order, Product, Retailer, Shipment, Truck, Employee
 
-from .odoo_connector import add_product_to_odoo, authenticate_with_odoo
+from .odoo_outbox import enqueue_product_sync
+from .allocation import record_allocation_event
+from .dashboard import bump_versions
+from .events import emit, emit_shipments
+from .stock import queue_demand_change, recompute_product_status
 
 # ===================== EMPLOYEE SIGNAL =====================
 
@@ -45,49 +48,46 @@ def make_truck_available(sender, instance, **kwargs):
 
 @receiver(pre_save, sender=Order)
 def store_old_order_status(sender, instance, **kwargs):
-    """Stores the old order status and quantity before saving."""
-    try:
-        old_order = Order.objects.get(pk=instance.pk)
-        instance._old_status = old_order.status
-        instance._old_required_qty = old_order.required_qty
-    except Order.DoesNotExist:
-        instance._old_status = None
-        instance._old_required_qty = None
+    """
+    Snapshot the stored values the order was not loaded with.
+
+    Orders fetched through the ORM already carry their original values
+    (``TrackedFieldsMixin``), so this only queries for hand-built instances
+    saved over an existing primary key and for orders loaded with
+    ``only()``/``defer()`` that left a tracked field out.
+    """
+    if instance.pk is None:
+        return
+    original = getattr(instance, '_original_values', {})
+    missing = [name for name in Order.tracked_fields if name not in original]
+    if not missing:
+        return
+    attnames = {name: Order._meta.get_field(name).attname for name in missing}
+    old_order = Order.objects.filter(pk=instance.pk).values(*attnames.values()).first()
+    if old_order is not None:
+        instance._original_values = {
+            **original, **{name: old_order[attname] for name, attname in attnames.items()}
+        }
 
 
 @receiver(post_save, sender=Order)
 def update_product_required_quantity_on_save(sender, instance, created, **kwargs):
     """Updates total_required_quantity and product status when an Order is created or updated."""
+    open_statuses = ['pending', 'allocated']
 
-    product_qs = Product.objects.filter(product_id=instance.product.product_id)
+    # Demand moves from the order's original state to its current one
+    deltas = {}
+    if not created and instance.get_original('status') in open_statuses:
+        old_product_id = instance.get_original('product')
+        deltas[old_product_id] = -instance.get_original('required_qty')
+    if instance.status in open_statuses:
+        deltas[instance.product_id] = deltas.get(instance.product_id, 0) + instance.required_qty
 
-    if created:
-        # Order is created, update total_required_quantity and refresh product
-        if instance.status in ['pending', 'allocated']:
-            product_qs.update(total_required_quantity=F('total_required_quantity') + instance.required_qty)
-        
-        # Refresh product instance only on creation
-        product = Product.objects.get(product_id=instance.product.product_id)
-    else:
-        # Order is updated, work with existing product data
-        product = instance.product
-        old_status = instance._old_status
-        old_required_qty = instance._old_required_qty
-
-        if old_status in ['pending', 'allocated'] and instance.status in ['delivered', 'cancelled']:
-            product_qs.update(total_required_quantity=F('total_required_quantity') - old_required_qty)
-
-        elif old_status in ['delivered', 'cancelled'] and instance.status in ['pending', 'allocated']:
-            product_qs.update(total_required_quantity=F('total_required_quantity') + instance.required_qty)
+    # Written once per product when the transaction commits, together with the status
+    queue_demand_change(deltas)
 
-        elif old_status in ['pending', 'allocated'] and instance.status in ['pending', 'allocated']:
-            quantity_difference = instance.required_qty - old_required_qty
-            product_qs.update(total_required_quantity=F('total_required_quantity') + quantity_difference)
-
-    # Update product status
-    product_qs.update(
-        status="on_demand" if product.total_required_quantity > product.available_quantity else "sufficient"
-    )
+    if created and instance.status == 'pending':
+        record_allocation_event('order_created', order=instance, product_id=instance.product_id, quantity=instance.required_qty)
 
 
 
@@ -106,44 +106,60 @@ def update_truck_availability_on_shipment(sender, instance, created, **kwargs):
                 truck.is_available = True
         truck.save()
 
-    # ✅ Ensure product's total_required_quantity never goes negative
+    # ✅ Delivery took stock off hand; demand changes refresh the status when they are flushed
     if instance.status == "delivered":
-        product = instance.order.product
-        product.update_status()
-        product.save(update_fields=["total_required_quantity", "total_shipped", "status"])
+        recompute_product_status([instance.order.product_id])
 
 
+@receiver(post_save, sender=Shipment)
+def queue_truck_freed_event(sender, instance, created, **kwargs):
+    """Tell the incremental allocator when a truck has no shipment in transit anymore."""
+    if created or instance.status not in ['delivered', 'failed'] or instance.get_original('status') == instance.status:
+        return
+    truck_id = instance.employee.truck_id
+    if truck_id and not Shipment.objects.filter(employee=instance.employee, status='in_transit').exists():
+        record_allocation_event('truck_freed', truck_id=truck_id)
 
 
 @receiver(post_save, sender=Product)
 def sync_product_to_odoo(sender, instance, created, **kwargs):
-    """Sync product to Odoo when a new product is created."""
+    """Queue new products for Odoo; `run_odoo_outbox` delivers them outside the request."""
     if created:
-        try:
-            # Get the Odoo credentials for the user who created the product
-            user = instance.created_by
-            if not user:
-                print("No user associated with the product. Skipping Odoo sync.")
-                return
-
-            credentials = OdooCredentials.objects.get(user=user)
-
-            # Authenticate with Odoo
-            uid, models = authenticate_with_odoo(credentials.db, credentials.username, credentials.password)
-
-            # Add product to Odoo
-            product_id = add_product_to_odoo(
-                uid=uid,
-                models=models,
-                db=credentials.db,
-                password=credentials.password,
-                name=instance.name,
-                price=instance.price,
-                quantity=instance.available_quantity
-            )
-
-            print(f"Product synced to Odoo with ID: {product_id}")
-        except OdooCredentials.DoesNotExist:
-            print(f"No Odoo credentials found for user {user.username}.")
-        except Exception as e:
-            print(f"Failed to sync product to Odoo: {e}")
\ No newline at end of file
+        enqueue_product_sync(instance)
+
+
+# ===================== DASHBOARD SIGNALS =====================
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Employee)
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Retailer)
+@receiver([post_save, post_delete], sender=Shipment)
+def bump_version_on_change(sender, **kwargs):
+    """Move the table version behind the read endpoints' ETags and the dashboard cache on."""
+    bump_versions(sender)
+
+
+# ===================== LIVE EVENT SIGNALS =====================
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Product)
+def emit_change_on_save(sender, instance, created, **kwargs):
+    emit(sender._meta.model_name, 'created' if created else 'updated', [instance.pk])
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Product)
+def emit_change_on_delete(sender, instance, **kwargs):
+    emit(sender._meta.model_name, 'deleted', [instance.pk])
+
+
+@receiver(post_save, sender=Shipment)
+def emit_shipment_on_save(sender, instance, created, **kwargs):
+    emit_shipments('created' if created else 'updated', [instance])
+
+
+@receiver(post_delete, sender=Shipment)
+def emit_shipment_on_delete(sender, instance, **kwargs):
+    emit_shipments('deleted', [instance])
@@ -0,0 +1,215 @@
+"""
+Set-based stock bookkeeping for products.
+
+``Product.update_status`` works on one instance at a time and needs a
+``save()`` per row. The helpers here express the same rule in SQL so a whole
+batch of products can be brought up to date in one statement.
+
+Allocations do not decrement ``Product.available_quantity``; they reserve
+stock in ``StockReservation`` and the quantity that can still be promised is
+computed with ``available_to_promise``.
+"""
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, PositiveIntegerField, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .dashboard import bump_versions
+from .events import emit
+from .models import Product, StockReservation
+
+
+def status_expression():
+    """SQL equivalent of ``Product.update_status``."""
+    return Case(
+        When(available_quantity__gt=F('total_required_quantity'), then=Value('sufficient')),
+        default=Value('on_demand'),
+    )
+
+
+def stale_status_filter():
+    """Matches only the products whose stored status disagrees with their quantities."""
+    return (
+        Q(available_quantity__gt=F('total_required_quantity')) & ~Q(status='sufficient')
+    ) | (
+        Q(available_quantity__lte=F('total_required_quantity')) & ~Q(status='on_demand')
+    )
+
+
+def recompute_product_status(product_ids=None):
+    """
+    Recompute ``Product.status`` in a single UPDATE.
+
+    Every stock change ends here, so this also bumps the product table
+    version (moving the dashboard's per-category totals on) and emits a
+    live ``product`` event.
+
+    :param product_ids: Products whose quantities changed; ``None`` rechecks the whole catalog
+    :return: Number of products whose status actually changed
+    """
+    products = Product.objects.all()
+    if product_ids is not None:
+        product_ids = set(product_ids)
+        if not product_ids:
+            return 0
+        products = products.filter(product_id__in=product_ids)
+    bump_versions(Product)
+    emit('product', 'updated', product_ids)
+    return products.filter(stale_status_filter()).update(status=status_expression())
+
+
+def apply_demand_changes(deltas):
+    """
+    Apply ``product_id -> delta`` changes to ``total_required_quantity`` in one
+    UPDATE ... CASE, then recompute the status of those products.
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Product.objects.filter(product_id__in=deltas).update(
+        total_required_quantity=Case(
+            # Demand never goes negative
+            *[
+                When(product_id=product_id, then=Greatest(F('total_required_quantity') + delta, Value(0)))
+                for product_id, delta in deltas.items()
+            ],
+            default=F('total_required_quantity'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+    recompute_product_status(deltas)
+
+
+class _DemandBatch:
+    """Demand deltas queued in one transaction (or savepoint), flushed on commit."""
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+        self.deltas = {}
+
+    def flush(self):
+        if self.registry.get(self.key) is self:
+            del self.registry[self.key]
+        apply_demand_changes(self.deltas)
+
+
+def queue_demand_change(deltas, using=None):
+    """
+    Accumulate ``product_id -> delta`` demand changes until the transaction commits.
+
+    Inside ``transaction.atomic`` every change made in the same block is summed
+    per product and written by a single ``apply_demand_changes`` from
+    ``on_commit``, so saving many orders of one product touches its row once.
+    Batches are kept per savepoint: rolling one back drops its ``on_commit``
+    callback together with its deltas. Outside a transaction the change is
+    applied immediately.
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        apply_demand_changes(deltas)
+        return
+
+    registry = connection.__dict__.setdefault('_demand_batches', {})
+    key = tuple(connection.savepoint_ids)
+    batch = registry.get(key)
+    # A batch whose callback is gone belonged to a rolled back block
+    if batch is None or not any(callback == batch.flush for _, callback, _ in connection.run_on_commit):
+        batch = registry[key] = _DemandBatch(registry, key)
+        transaction.on_commit(batch.flush, using=using)
+
+    for product_id, delta in deltas.items():
+        batch.deltas[product_id] = batch.deltas.get(product_id, 0) + delta
+
+
+def promisable_expression(prefix=''):
+    """
+    SQL for the stock on hand of a product minus its active reservations, never negative.
+
+    The reservations are summed in a correlated subquery, so the expression
+    can be aggregated over joined products without multiplying their rows.
+
+    :param prefix: Lookup path from the query's model to the product (e.g. ``'products__'``)
+    """
+    reserved = (
+        StockReservation.objects.filter(product=OuterRef(prefix + 'pk'), status='active')
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    reserved = Coalesce(Subquery(reserved, output_field=PositiveIntegerField()), 0)
+    return Greatest(F(prefix + 'available_quantity') - reserved, Value(0))
+
+
+def available_to_promise(product_ids=None):
+    """
+    Stock on hand minus active reservations, in one aggregate query.
+
+    :param product_ids: Products to compute; ``None`` computes the whole catalog
+    :return: Dict ``product_id -> quantity`` (never negative)
+    """
+    products = Product.objects.all()
+    if product_ids is not None:
+        product_ids = set(product_ids)
+        if not product_ids:
+            return {}
+        products = products.filter(product_id__in=product_ids)
+    return dict(products.annotate(promisable=promisable_expression()).values_list('product_id', 'promisable'))
+
+
+def reserve_stock(orders):
+    """
+    Hold the stock of freshly allocated orders with a single INSERT.
+
+    :param orders: Allocated orders
+    :return: The created reservations
+    """
+    return StockReservation.objects.bulk_create(
+        [StockReservation(product_id=order.product_id, order=order, quantity=order.required_qty) for order in orders]
+    )
+
+
+def release_reservations(batch_size=1000):
+    """
+    Release the reservations of failed shipments and cancelled orders.
+
+    Reservations are taken when the order is put on a truck, so there is no
+    expiry: a reservation stays active until its order is delivered or the
+    shipment fails or the order is cancelled.
+
+    Works in batches of ``batch_size`` rows, each claimed with SKIP LOCKED
+    and released with one UPDATE, so a sweep never holds many locks at once.
+
+    :return: Dict ``product_id -> released quantity``
+    """
+    from .allocation import record_allocation_event
+
+    releasable = StockReservation.objects.filter(status='active').filter(
+        Q(order__shipment__status='failed') | Q(order__status='cancelled')
+    )
+
+    released = {}
+    while True:
+        with transaction.atomic():
+            batch = list(
+                releasable.select_for_update(skip_locked=True, of=('self',))
+                .order_by('reservation_id')
+                .values_list('reservation_id', 'product_id', 'quantity')[:batch_size]
+            )
+            if not batch:
+                break
+            StockReservation.objects.filter(reservation_id__in=[row[0] for row in batch]).update(status='released')
+
+            batch_released = {}
+            for _, product_id, quantity in batch:
+                batch_released[product_id] = batch_released.get(product_id, 0) + quantity
+            for product_id, quantity in batch_released.items():
+                record_allocation_event('stock_increased', product_id=product_id, quantity=quantity)
+                released[product_id] = released.get(product_id, 0) + quantity
+            # The released stock can be promised again
+            recompute_product_status(batch_released)
+        if len(batch) < batch_size:
+            break
+    return released
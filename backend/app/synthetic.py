@@ -0,0 +1,110 @@
+"""
+Synthetic data for allocation benchmarks and stress tests.
+
+Everything is inserted with ``bulk_create`` (so no signals fire) and tagged
+with ``SYNTHETIC_PREFIX`` so it can be wiped without touching real data.
+"""
+import random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Sum
+
+from .dashboard import invalidate_dashboard
+from .models import Category, Employee, Order, Product, Retailer, Truck
+
+SYNTHETIC_PREFIX = "synthetic-"
+
+
+def clear_synthetic_data():
+    """Delete everything a previous ``seed_synthetic_data`` call created."""
+    with transaction.atomic():
+        # Categories cascade to products, orders and shipments; users to employees.
+        # Employees go before their trucks so the post_delete signal can still read them.
+        Category.objects.filter(name__startswith=SYNTHETIC_PREFIX).delete()
+        Retailer.objects.filter(name__startswith=SYNTHETIC_PREFIX).delete()
+        User.objects.filter(username__startswith=SYNTHETIC_PREFIX).delete()
+        Truck.objects.filter(license_plate__startswith=SYNTHETIC_PREFIX).delete()
+        invalidate_dashboard()
+
+
+def seed_synthetic_data(orders=1000, products=200, categories=20, retailers=100, trucks=50,
+                        max_order_qty=50, stock_ratio=0.8, truck_capacity=(200, 2000), seed=42):
+    """
+    Generate a consistent synthetic dataset, replacing any previous one.
+
+    :param stock_ratio: Fraction of each product's demand covered by stock
+    :return: Dict with the number of rows created per model
+    """
+    rng = random.Random(seed)
+    clear_synthetic_data()
+
+    with transaction.atomic():
+        category_objs = Category.objects.bulk_create(
+            [Category(name=f"{SYNTHETIC_PREFIX}category-{i}") for i in range(categories)]
+        )
+        product_objs = Product.objects.bulk_create([
+            Product(
+                name=f"{SYNTHETIC_PREFIX}product-{i}",
+                category=rng.choice(category_objs),
+                available_quantity=0,
+                price=rng.randint(1, 500),
+            )
+            for i in range(products)
+        ])
+        retailer_objs = Retailer.objects.bulk_create([
+            Retailer(
+                name=f"{SYNTHETIC_PREFIX}retailer-{i}",
+                address="Synthetic address",
+                contact="0000000000",
+                distance_from_warehouse=round(rng.uniform(1, 300), 2),
+            )
+            for i in range(retailers)
+        ])
+        truck_objs = Truck.objects.bulk_create([
+            Truck(
+                license_plate=f"{SYNTHETIC_PREFIX}{i}",
+                capacity=rng.randint(*truck_capacity),
+                is_available=False,
+            )
+            for i in range(trucks)
+        ])
+        user_objs = User.objects.bulk_create(
+            [User(username=f"{SYNTHETIC_PREFIX}driver-{i}") for i in range(trucks)]
+        )
+        Employee.objects.bulk_create(
+            [Employee(user=user, truck=truck) for user, truck in zip(user_objs, truck_objs)]
+        )
+
+        Order.objects.bulk_create([
+            Order(
+                retailer=rng.choice(retailer_objs),
+                product=rng.choice(product_objs),
+                required_qty=rng.randint(1, max_order_qty),
+            )
+            for _ in range(orders)
+        ], batch_size=5000)
+
+        # Keep the denormalised product counters consistent with the orders
+        demand = dict(
+            Order.objects.filter(product__in=product_objs)
+            .values_list('product_id')
+            .annotate(total=Sum('required_qty'))
+        )
+        for product in product_objs:
+            product.total_required_quantity = demand.get(product.product_id, 0)
+            product.available_quantity = int(product.total_required_quantity * stock_ratio * rng.uniform(0.5, 1.5))
+            product.update_status()
+        Product.objects.bulk_update(
+            product_objs, ['total_required_quantity', 'available_quantity', 'status'], batch_size=5000
+        )
+        invalidate_dashboard()
+
+    return {
+        "categories": categories,
+        "products": products,
+        "retailers": retailers,
+        "trucks": trucks,
+        "employees": trucks,
+        "orders": orders,
+    }
@@ -1,3 +1,1564 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import F, Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .allocation import allocate_partition, apply_allocation_plan, busy_trucks, run_allocation
+from .allocation_engine import BestFitIndex, FirstFitIndex, get_strategy, plan_allocation
+from .allocation_jobs import allocate_job_chunk, claim_next_job, run_allocation_job
+from .dashboard import apply_version_bumps, compute_counts, get_category_stock, get_dashboard_counts
+from .dispatch import plan_trips, run_dispatch
+from .events import MANAGERS_CHANNEL, PostgresBroker, employee_channel, get_broker
+from .fake_odoo import FakeOdooServer
+from .incremental_allocation import IncrementalAllocator
+from .models import (
+    AllocationEvent, AllocationJob, AllocationJobResult, Category, Employee, OdooCredentials, OdooOutboxMessage,
+    OdooSyncState, Order, Product, Retailer, Shipment, StockReservation, TableVersion, Trip, Truck,
+)
+from .odoo_connector import OdooAuthenticationError, create_odoo_product, get_odoo_client, reset_odoo_clients
+from .odoo_outbox import LEASE_SECONDS, deliver_outbox, send_message
+from .odoo_sync import push_products, reconcile_mapping, resolve_quantity, sync_delta, syncable_products
+from .orders import _replay, place_orders
+from .routing import distance_matrix, nearest_neighbour_route, plan_route, two_opt
+from .stock import available_to_promise, recompute_product_status, release_reservations, reserve_stock
+from .synthetic import SYNTHETIC_PREFIX, clear_synthetic_data, seed_synthetic_data
+
+
+class OrderDemandTrackingTests(TestCase):
+    """Order saves adjust product demand from the values the order was loaded with."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Tracking")
+        self.product = Product.objects.create(name="Tracked product", category=category, available_quantity=50)
+        self.other_product = Product.objects.create(name="Other product", category=category, available_quantity=50)
+        self.retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = Order.objects.create(retailer=self.retailer, product=self.product, required_qty=10)
+
+    def demand(self, product):
+        return Product.objects.values_list('total_required_quantity', flat=True).get(pk=product.pk)
+
+    def test_update_of_loaded_order_does_not_reread_it(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.required_qty = 30
+
+        # UPDATE order, then on commit the demand increment and status recompute
+        with self.assertNumQueries(3), self.captureOnCommitCallbacks(execute=True):
+            order.save()
+
+        self.assertEqual(self.demand(self.product), 30)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).status, 'sufficient')
+
+    def test_unchanged_demand_writes_only_the_order(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = 'allocated'
+
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            order.save()
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.demand(self.product), 10)
+
+    def test_snapshot_follows_successive_saves(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.required_qty = 60
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).status, 'on_demand')
+
+        order.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertEqual(self.demand(self.product), 0)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).status, 'sufficient')
+
+    def test_moving_order_to_another_product(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.product = self.other_product
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+
+        self.assertEqual(self.demand(self.product), 0)
+        self.assertEqual(self.demand(self.other_product), 10)
+
+    def test_instance_built_without_loading_falls_back_to_one_read(self):
+        order = Order(
+            order_id=self.order.pk, retailer=self.retailer, product=self.product, required_qty=4,
+            order_date=self.order.order_date, status='pending'
+        )
+
+        # SELECT original, UPDATE order, demand decrement, status recompute
+        with self.assertNumQueries(4), self.captureOnCommitCallbacks(execute=True):
+            order.save()
+
+        self.assertEqual(self.demand(self.product), 4)
+
+    def test_partially_loaded_order_reads_the_missing_originals(self):
+        order = Order.objects.only('status').get(pk=self.order.pk)
+        order.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertEqual(self.demand(self.product), 0)
+
+        order = Order.objects.defer('required_qty', 'product').get(pk=self.order.pk)
+        order.status = 'pending'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertEqual(self.demand(self.product), 10)
+
+
+class DemandFlushTests(TestCase):
+    """Demand changes of one transaction are written once per product on commit."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Flush")
+        self.product = Product.objects.create(name="Hot product", category=category, available_quantity=500)
+        self.other_product = Product.objects.create(name="Cold product", category=category, available_quantity=500)
+        self.retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+
+    def test_bulk_order_creation_writes_each_product_once(self):
+        # One INSERT per order, then a single demand UPDATE and status recompute
+        with self.assertNumQueries(100 + 2), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for i in range(100):
+                Order.objects.create(
+                    retailer=self.retailer, product=self.product if i % 2 else self.other_product, required_qty=3
+                )
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).total_required_quantity, 150)
+        self.assertEqual(Product.objects.get(pk=self.other_product.pk).total_required_quantity, 150)
+
+    def test_demand_is_not_written_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(retailer=self.retailer, product=self.product, required_qty=7)
+            self.assertEqual(Product.objects.get(pk=self.product.pk).total_required_quantity, 0)
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).total_required_quantity, 7)
+
+    def test_rolled_back_savepoint_discards_its_deltas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(retailer=self.retailer, product=self.product, required_qty=2)
+            try:
+                with transaction.atomic():
+                    Order.objects.create(retailer=self.retailer, product=self.product, required_qty=40)
+                    raise ValueError
+            except ValueError:
+                pass
+            Order.objects.create(retailer=self.retailer, product=self.product, required_qty=5)
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).total_required_quantity, 7)
+
+
+class StockStatusTests(TestCase):
+    """Stock statuses are recomputed set-based, by the QR intake and the management command."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Status")
+        self.product = Product.objects.create(name="Scanned", category=self.category, available_quantity=2)
+        Product.objects.filter(pk=self.product.pk).update(total_required_quantity=5, status='on_demand')
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create(username="scanner", is_staff=True))
+
+    def scan(self, qr_text):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.post("/api/store_qr/", {"qr_text": qr_text}, format="json")
+
+    def test_qr_intake_adds_stock_and_recomputes_status(self):
+        response = self.scan("name=Scanned|category=Status|quantity=10")
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.available_quantity, self.product.status), (12, 'sufficient'))
+
+    def test_qr_intake_creates_unknown_products(self):
+        self.assertEqual(self.scan("name=New|category=Scanned in|quantity=3").status_code, 201)
+        product = Product.objects.get(name="New")
+        self.assertEqual((product.category.name, product.available_quantity, product.status), ("Scanned in", 3, 'sufficient'))
+
+    def test_qr_intake_rejects_invalid_data(self):
+        for qr_text in ("name=Scanned|category=Status|quantity=0", "name=Scanned|category=Status", "garbage"):
+            with self.subTest(qr_text=qr_text):
+                self.assertEqual(self.scan(qr_text).status_code, 400)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).available_quantity, 2)
+
+    def test_command_fixes_only_stale_statuses(self):
+        other = Product.objects.create(name="Other", category=self.category, available_quantity=9)
+        Product.objects.filter(pk=other.pk).update(status='on_demand')
+        Product.objects.filter(pk=self.product.pk).update(available_quantity=50)
+
+        out = io.StringIO()
+        call_command("recompute_stock_status", "--product", str(other.pk), stdout=out)
+        self.assertIn("Updated status of 1 product(s)", out.getvalue())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).status, 'on_demand')
+
+        out = io.StringIO()
+        call_command("recompute_stock_status", stdout=out)
+        self.assertIn("Updated status of 1 product(s)", out.getvalue())
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('status', flat=True)), ['sufficient', 'sufficient']
+        )
+
+
+class StockReservationTests(TestCase):
+    """Reservations are released on failure or cancellation and fulfilled on delivery."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Reserved")
+        self.product = Product.objects.create(name="Reserved product", category=self.category, available_quantity=50)
+        retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        self.employee = Employee.objects.create(truck=Truck.objects.create(license_plate="RESERVE", capacity=100))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = Order.objects.create(retailer=retailer, product=self.product, required_qty=10, status='allocated')
+            self.reservation, = reserve_stock([self.order])
+
+    def ship(self, status='in_transit'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Shipment.objects.create(order=self.order, employee=self.employee, status=status)
+
+    def deliver(self, shipment):
+        shipment.status = 'delivered'
+        with self.captureOnCommitCallbacks(execute=True):
+            shipment.save()
+
+    def cancel(self):
+        self.order.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+
+    def release(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return release_reservations()
+
+    def state(self):
+        self.reservation.refresh_from_db()
+        self.product.refresh_from_db()
+        return self.reservation.status, self.product.available_quantity, available_to_promise()[self.product.pk]
+
+    def test_order_in_transit_keeps_reservation(self):
+        self.ship()
+        self.assertEqual(self.release(), {})
+        self.assertEqual(self.state(), ('active', 50, 40))
+
+    def test_failed_shipment_releases(self):
+        shipment = self.ship()
+        shipment.status = 'failed'
+        shipment.save()
+        self.assertEqual(self.release(), {self.product.pk: 10})
+        self.assertEqual(self.state(), ('released', 50, 50))
+
+    def test_cancelled_order_releases(self):
+        self.cancel()
+        self.assertEqual(self.release(), {self.product.pk: 10})
+        self.assertEqual(self.state(), ('released', 50, 50))
+
+    def test_delivery_fulfils(self):
+        self.deliver(self.ship())
+        self.assertEqual(self.state(), ('fulfilled', 40, 40))
+
+    def test_delivery_of_released_reservation_takes_stock_off_hand_once(self):
+        self.cancel()
+        self.release()
+        self.deliver(self.ship())
+        self.assertEqual(self.state(), ('released', 40, 40))
+
+    def test_stock_endpoints_serve_available_to_promise(self):
+        Product.objects.create(name="Unreserved", category=self.category, available_quantity=7)
+        api = APIClient()
+        api.force_authenticate(User.objects.create(username="stock-admin", is_staff=True))
+        cache.clear()
+
+        stock = api.get("/api/stock/").json()
+        self.assertEqual(
+            [(row["name"], row["available_quantity"], row["available_to_promise"]) for row in stock],
+            [("Reserved product", 50, 40), ("Unreserved", 7, 7)],
+        )
+        row, = api.get("/api/category-stock/").json()["data"]
+        self.assertEqual((row["total_available"], row["total_promisable"]), (57, 47))
+
+        # Releasing the reservation moves the ETags on, so pollers see the stock again
+        etag = api.get("/api/category-stock/")["ETag"]
+        self.cancel()
+        self.release()
+        response = api.get("/api/category-stock/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"][0]["total_promisable"], 57)
+
+
+class DispatchTests(TestCase):
+    """Distance-banded trip planning, in memory and against the database."""
+
+    def check_plan(self, orders, trucks, stock, trips, skipped):
+        """Every order is planned once, no truck is reused or overloaded, no stock is oversold."""
+        planned = [order_id for trip in trips for order_id, _, _ in trip["orders"]]
+        self.assertCountEqual(planned + [order_id for order_id, _ in skipped], [order[0] for order in orders])
+        capacities = dict(trucks)
+        self.assertEqual(len({trip["truck_id"] for trip in trips}), len(trips))
+        shipped = {}
+        by_id = {order[0]: order for order in orders}
+        for trip in trips:
+            self.assertEqual(trip["load"], sum(qty for _, qty, _ in trip["orders"]))
+            self.assertLessEqual(trip["load"], capacities[trip["truck_id"]])
+            for order_id, qty, _ in trip["orders"]:
+                product_id = by_id[order_id][1]
+                shipped[product_id] = shipped.get(product_id, 0) + qty
+        for product_id, qty in shipped.items():
+            self.assertLessEqual(qty, stock.get(product_id, 0))
+
+    def test_orders_are_grouped_by_distance_band(self):
+        orders = [(1, 1, 3, 5.0), (2, 1, 4, 20.0), (3, 1, 2, 60.0)]
+        trips, skipped = plan_trips(orders, [(10, 10), (11, 10)], {1: 100})
+        self.assertEqual(skipped, [])
+        self.assertEqual(
+            [(trip["min_distance"], trip["max_distance"], [order_id for order_id, _, _ in trip["orders"]]) for trip in trips],
+            [(5.0, 20.0, [1, 2]), (60.0, 60.0, [3])],
+        )
+
+    def test_order_without_truck_leaves_its_stock(self):
+        # The first order needs more room than any truck has; the second gets the stock
+        trips, skipped = plan_trips([(1, 1, 6, 5.0), (2, 1, 5, 5.0)], [(10, 5)], {1: 6})
+        self.assertEqual([order_id for order_id, _, _ in trips[0]["orders"]], [2])
+        self.assertEqual(skipped, [(1, "No suitable truck available")])
+
+    def test_stock_goes_to_packed_orders(self):
+        trips, skipped = plan_trips([(1, 1, 5, 5.0), (2, 1, 5, 60.0), (3, 2, 9, 5.0)], [(10, 20), (11, 20)], {1: 5, 2: 8})
+        self.assertEqual([order_id for order_id, _, _ in trips[0]["orders"]], [1])
+        self.assertCountEqual(skipped, [(2, "Insufficient stock"), (3, "Insufficient stock")])
+
+    def test_random_plans_are_consistent(self):
+        rng = random.Random(8)
+        for _ in range(50):
+            orders = [
+                (order_id, rng.randint(1, 5), rng.randint(1, 30), rng.uniform(0, 150))
+                for order_id in range(rng.randint(0, 300))
+            ]
+            trucks = [(truck_id, rng.randint(5, 200)) for truck_id in range(rng.randint(1, 15))]
+            stock = {product_id: rng.randint(0, 400) for product_id in range(1, 6)}
+            trips, skipped = plan_trips(orders, trucks, stock, band_width=rng.choice([10.0, 25.0, 200.0]))
+            self.check_plan(orders, trucks, stock, trips, skipped)
+
+    def test_run_dispatch(self):
+        category = Category.objects.create(name="Dispatch")
+        product = Product.objects.create(name="Dispatched", category=category, available_quantity=20)
+        near = Retailer.objects.create(name="Near", address="Road 1", contact="1", distance_from_warehouse=5)
+        far = Retailer.objects.create(name="Far", address="Road 2", contact="2", distance_from_warehouse=80)
+        for plate in ("DISPATCH-1", "DISPATCH-2"):
+            Employee.objects.create(truck=Truck.objects.create(license_plate=plate, capacity=10))
+        with self.captureOnCommitCallbacks(execute=True):
+            orders = [
+                Order.objects.create(retailer=near, product=product, required_qty=6),
+                Order.objects.create(retailer=far, product=product, required_qty=6),
+                Order.objects.create(retailer=near, product=product, required_qty=30),
+            ]
+
+        planned = run_dispatch(dry_run=True)
+        self.assertEqual(len(planned["trips"]), 2)
+        self.assertFalse(Trip.objects.exists() or Shipment.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = run_dispatch()
+        self.assertEqual([trip["order_ids"] for trip in result["trips"]], [trip["order_ids"] for trip in planned["trips"]])
+        self.assertEqual(result["skipped_orders"], [{"order_id": orders[2].pk, "reason": "Insufficient stock"}])
+        self.assertEqual(Trip.objects.count(), 2)
+        self.assertEqual(
+            set(Shipment.objects.values_list('order_id', 'trip__max_distance')),
+            {(orders[0].pk, 5.0), (orders[1].pk, 80.0)},
+        )
+        self.assertEqual(Order.objects.get(pk=orders[0].pk).status, 'allocated')
+
+
+class BusyTruckTests(TestCase):
+    """Trucks of in-transit shipments are busy; shipments of truckless employees do not hide the free ones."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Busy")
+        self.product = Product.objects.create(name="Busy product", category=category, available_quantity=50)
+        retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        self.free = Employee.objects.create(truck=Truck.objects.create(license_plate="FREE", capacity=20))
+        self.busy = Employee.objects.create(truck=Truck.objects.create(license_plate="BUSY", capacity=20))
+        truckless = Employee.objects.create()
+        with self.captureOnCommitCallbacks(execute=True):
+            for employee in (self.busy, truckless):
+                order = Order.objects.create(retailer=retailer, product=self.product, required_qty=1, status='allocated')
+                Shipment.objects.create(order=order, employee=employee)
+            self.order = Order.objects.create(retailer=retailer, product=self.product, required_qty=5)
+
+    def test_busy_trucks_subquery_has_no_null(self):
+        self.assertEqual(list(busy_trucks().values_list('employee__truck_id', flat=True)), [self.busy.truck_id])
+
+    def test_partition_allocates_to_free_truck(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = allocate_partition()
+        self.assertEqual(len(result["allocated_orders"]), 1)
+        self.assertEqual(Shipment.objects.get(order=self.order).employee, self.free)
+
+    def test_dispatch_uses_free_truck(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = run_dispatch()
+        self.assertEqual([trip["employee_id"] for trip in result["trips"]], [self.free.pk])
+
+
+@skipUnless(connection.vendor == 'postgresql', "SKIP LOCKED needs PostgreSQL")
+class ConcurrentAllocationTests(TransactionTestCase):
+    """API allocations skip the orders and trucks another transaction has claimed."""
+
+    def test_run_skips_rows_locked_by_another_worker(self):
+        category = Category.objects.create(name="Concurrent")
+        product = Product.objects.create(name="Contended", category=category, available_quantity=100)
+        retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        trucks = [Truck.objects.create(license_plate=plate, capacity=10) for plate in ("LOCK-1", "LOCK-2")]
+        employees = [Employee.objects.create(truck=truck) for truck in trucks]
+        orders = [Order.objects.create(retailer=retailer, product=product, required_qty=2) for _ in range(2)]
+
+        locked, release = threading.Event(), threading.Event()
+
+        def other_worker():
+            try:
+                with transaction.atomic():
+                    Order.objects.select_for_update().get(pk=orders[0].pk)
+                    Truck.objects.select_for_update().get(pk=trucks[0].pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=other_worker)
+        worker.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            result = run_allocation()
+        finally:
+            release.set()
+            worker.join()
+
+        self.assertEqual([entry["order_id"] for entry in result["allocated_orders"]], [orders[1].pk])
+        self.assertEqual(Shipment.objects.get().employee_id, employees[1].pk)
+        self.assertEqual(Order.objects.get(pk=orders[0].pk).status, 'pending')
+
+
+class WorkerCrash(BaseException):
+    """Stands for a worker process dying mid-job; not caught like an ordinary error."""
+
+
+class AllocationJobTests(TestCase):
+    """Jobs run in chunks under a renewable lease and resume after their worker dies."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Jobs")
+        product = Product.objects.create(name="Job product", category=category, available_quantity=100)
+        retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        for plate in ("JOB-1", "JOB-2"):
+            Employee.objects.create(truck=Truck.objects.create(license_plate=plate, capacity=10))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.orders = [
+                Order.objects.create(retailer=retailer, product=product, required_qty=qty) for qty in (3, 3, 3, 3, 3, 50)
+            ]
+        self.job = AllocationJob.objects.create()
+
+    def assert_completed(self):
+        job = AllocationJob.objects.get(pk=self.job.pk)
+        self.assertEqual(job.status, 'completed')
+        self.assertIsNone(job.locked_until)
+        self.assertEqual((job.orders_processed, job.allocated_count, job.skipped_count), (6, 5, 1))
+        self.assertCountEqual(
+            AllocationJobResult.objects.filter(job=job).values_list('order_id', flat=True),
+            [order.pk for order in self.orders],
+        )
+        self.assertEqual(Shipment.objects.count(), 5)
+
+    def test_chunked_run(self):
+        job = claim_next_job()
+        self.assertEqual(job.pk, self.job.pk)
+        self.assertTrue(run_allocation_job(job, chunk_size=2))
+        self.assert_completed()
+        self.assertIsNone(claim_next_job())
+
+    def test_reclaimed_job_resumes_after_last_chunk(self):
+        chunks = []
+
+        def crash_after_first_chunk(*args, **kwargs):
+            if chunks:
+                raise WorkerCrash()
+            chunks.append(args)
+            return allocate_job_chunk(*args, **kwargs)
+
+        job = claim_next_job()
+        with mock.patch('app.allocation_jobs.allocate_job_chunk', crash_after_first_chunk):
+            with self.assertRaises(WorkerCrash):
+                run_allocation_job(job, chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.orders_processed, job.cursor_order_id), ('running', 2, self.orders[1].pk))
+
+        # Not reclaimable while the lease holds
+        self.assertIsNone(claim_next_job())
+        job = claim_next_job(now=job.locked_until + timedelta(seconds=1))
+        self.assertEqual(job.pk, self.job.pk)
+        self.assertTrue(run_allocation_job(job, chunk_size=2))
+        self.assert_completed()
+
+    def test_worker_that_lost_its_lease_rolls_back(self):
+        stale = claim_next_job()
+        reclaimed = claim_next_job(now=stale.locked_until + timedelta(seconds=1))
+
+        self.assertFalse(run_allocation_job(stale, chunk_size=2))
+        self.assertFalse(Shipment.objects.exists())
+        self.assertTrue(run_allocation_job(reclaimed, chunk_size=2))
+        self.assert_completed()
+
+
+class BulkOrderTests(TestCase):
+    """Bulk placement validates every line and replays retries with the same idempotency key."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="bulk-user")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        category = Category.objects.create(name="Bulk")
+        self.product = Product.objects.create(name="Bulk product", category=category, available_quantity=100)
+        self.retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        self.lines = [
+            {"retailer_id": self.retailer.pk, "product_id": self.product.pk, "required_qty": 4},
+            {"retailer_id": self.retailer.pk, "product_id": self.product.pk, "required_qty": 6},
+        ]
+
+    def post(self, lines, key=None):
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.post("/api/orders/bulk/", {"orders": lines}, format="json", **headers)
+
+    def test_places_orders_and_demand(self):
+        response = self.post(self.lines)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(
+            sorted(Order.objects.filter(pk__in=response.json()["order_ids"]).values_list('required_qty', flat=True)), [4, 6]
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_required_quantity, 10)
+
+    def test_replay_returns_original_response(self):
+        first = self.post(self.lines, key="retry-1")
+        second = self.post(self.lines, key="retry-1")
+        self.assertEqual((first.status_code, second.status_code), (201, 200))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_same_key_with_different_payload_conflicts(self):
+        self.post(self.lines, key="retry-2")
+        response = self.post(self.lines[:1], key="retry-2")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.post(self.lines, key="shared")
+        self.api.force_authenticate(User.objects.create(username="other-bulk-user"))
+        self.assertEqual(self.post(self.lines[:1], key="shared").status_code, 201)
+
+    def test_invalid_lines_are_reported_by_index(self):
+        response = self.post([
+            self.lines[0],
+            {"retailer_id": self.retailer.pk, "product_id": "x", "required_qty": 1},
+            {"retailer_id": self.retailer.pk, "product_id": self.product.pk, "required_qty": 0},
+            {"retailer_id": self.retailer.pk, "product_id": 10 ** 6, "required_qty": 1},
+            {"retailer_id": 10 ** 6, "product_id": self.product.pk, "required_qty": 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [1, 2, 3, 4])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.post([]).status_code, 400)
+
+    def test_concurrent_retry_replays_the_committed_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            original, _ = place_orders(self.lines, self.user, "race")
+        calls = []
+
+        def replay_after_other_commit(*args):
+            # The first lookup ran before the concurrent request committed its batch
+            calls.append(args)
+            return None if len(calls) == 1 else _replay(*args)
+
+        with mock.patch('app.orders._replay', replay_after_other_commit):
+            with self.captureOnCommitCallbacks(execute=True):
+                response, replayed = place_orders(self.lines, self.user, "race")
+        self.assertEqual((response, replayed, len(calls)), (original, True, 2))
+        self.assertEqual(Order.objects.count(), 2)
+
+
+def legacy_first_fit(orders, trucks, stock):
+    """The per-order linear scan the allocation engine replaced."""
+    remaining_stock = dict(stock)
+    capacity = dict(trucks)
+    assignments, skipped = [], []
+    for order_id, product_id, qty in orders:
+        if remaining_stock.get(product_id, 0) < qty:
+            skipped.append((order_id, "Insufficient stock"))
+            continue
+        truck_id = next((truck_id for truck_id, _ in trucks if capacity[truck_id] >= qty), None)
+        if truck_id is None:
+            skipped.append((order_id, "No suitable truck available"))
+            continue
+        capacity[truck_id] -= qty
+        remaining_stock[product_id] -= qty
+        assignments.append((order_id, truck_id))
+    return assignments, skipped
+
+
+class AllocationEngineTests(SimpleTestCase):
+    """Capacity indexes and strategies of the in-memory allocation planner."""
+
+    def test_first_fit_matches_legacy_loop(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            orders = [(order_id, rng.randint(1, 4), rng.randint(1, 40)) for order_id in range(rng.randint(0, 120))]
+            trucks = [(truck_id, rng.randint(0, 120)) for truck_id in rng.sample(range(1000), rng.randint(0, 17))]
+            stock = {product_id: rng.randint(0, 600) for product_id in range(1, 4)}
+            self.assertEqual(plan_allocation(orders, trucks, stock, 'first_fit'), legacy_first_fit(orders, trucks, stock))
+
+    def test_first_fit_index_until_exhausted(self):
+        self.assertEqual(FirstFitIndex([]).find(1), -1)
+        index = FirstFitIndex([4, 7, 2])
+        self.assertEqual(index.find(5), 1)
+        index.consume(1, 7)
+        self.assertEqual(index.find(5), -1)
+        self.assertEqual(index.find(4), 0)
+        index.consume(0, 4)
+        index.consume(2, 2)
+        self.assertEqual(index.find(1), -1)
+        self.assertEqual(index.find(0), 0)
+
+    def test_best_fit_index_picks_tightest_truck(self):
+        index = BestFitIndex([10, 6, 6, 8])
+        self.assertEqual(index.find(5), 1)
+        index.consume(1, 5)
+        self.assertEqual(index.find(5), 2)
+        self.assertEqual(index.find(1), 1)
+        self.assertEqual(index.find(11), -1)
+        index.consume(1, -4)
+        self.assertEqual(index.remaining[1], 5)
+        index.remove(0)
+        self.assertNotIn(0, index)
+        self.assertEqual(index.find(9), -1)
+        index.add(0, 9)
+        self.assertEqual(index.find(9), 0)
+
+    def test_best_fit_decreasing_packs_largest_first(self):
+        orders = [(1, 1, 2), (2, 1, 5), (3, 1, 4), (4, 1, 5)]
+        assignments, skipped = plan_allocation(orders, [(10, 6), (11, 9)], {1: 100}, 'best_fit_decreasing')
+        # Equal quantities keep their priority order; each goes to the tightest truck it fits
+        self.assertEqual(assignments, [(2, 10), (4, 11), (3, 11)])
+        self.assertEqual(skipped, [(1, "No suitable truck available")])
+
+    def test_unplaced_order_keeps_its_stock(self):
+        assignments, skipped = plan_allocation([(1, 1, 8), (2, 1, 3), (3, 1, 3)], [(10, 5)], {1: 8})
+        self.assertEqual(assignments, [(2, 10)])
+        self.assertEqual(skipped, [(1, "No suitable truck available"), (3, "No suitable truck available")])
+        assignments, skipped = plan_allocation([(1, 1, 3), (2, 1, 3)], [(10, 50)], {1: 5})
+        self.assertEqual(skipped, [(2, "Insufficient stock")])
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            get_strategy("worst_fit")
+
+
+class AllocationWriteTests(TestCase):
+    """Allocation results are written with set-based statements, and not at all on a dry run."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Writes")
+        self.product = Product.objects.create(name="Written product", category=category, available_quantity=100)
+        self.retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        self.employee = Employee.objects.create(truck=Truck.objects.create(license_plate="WRITE", capacity=1000))
+
+    def place(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [Order.objects.create(retailer=self.retailer, product=self.product, required_qty=2) for _ in range(count)]
+
+    def snapshot(self):
+        return (
+            list(Order.objects.order_by('pk').values_list('status', flat=True)),
+            Shipment.objects.count(),
+            StockReservation.objects.count(),
+            list(Product.objects.values_list('available_quantity', 'total_required_quantity', 'status')),
+            Truck.objects.get(pk=self.employee.truck_id).is_available,
+            dict(TableVersion.objects.values_list('table', 'version')),
+        )
+
+    def test_dry_run_writes_nothing(self):
+        orders = self.place(3)
+        before = self.snapshot()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            result = run_allocation(dry_run=True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(
+            [(entry["order_id"], entry["status"], entry["truck_id"]) for entry in result["allocated_orders"]],
+            [(order.pk, "planned", self.employee.truck_id) for order in orders],
+        )
+
+    def test_run_applies_the_planned_result(self):
+        orders = self.place(3)
+        planned = run_allocation(dry_run=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = run_allocation()
+        self.assertEqual(
+            [entry["order_id"] for entry in result["allocated_orders"]],
+            [entry["order_id"] for entry in planned["allocated_orders"]],
+        )
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'allocated'})
+        self.assertEqual(
+            set(StockReservation.objects.values_list('order_id', 'quantity', 'status')),
+            {(order.pk, 2, 'active') for order in orders},
+        )
+        self.assertFalse(Truck.objects.get(pk=self.employee.truck_id).is_available)
+
+    def test_write_queries_do_not_grow_with_the_plan(self):
+        def queries(count):
+            plan = [(order, self.employee) for order in self.place(count)]
+            with CaptureQueriesContext(connection) as captured, self.captureOnCommitCallbacks(execute=True):
+                apply_allocation_plan(plan)
+            return len(captured)
+
+        self.assertEqual(queries(2), queries(20))
+
+    def table_sizes(self):
+        models = (Category, Product, Retailer, Truck, User, Employee, Order, Shipment, StockReservation, Trip)
+        return {model.__name__: model.objects.count() for model in models}
+
+    def test_synthetic_data_is_consistent_and_cleared(self):
+        before = self.table_sizes()
+        created = seed_synthetic_data(orders=60, products=6, categories=2, retailers=5, trucks=4, seed=7)
+        products = Product.objects.filter(name__startswith=SYNTHETIC_PREFIX)
+        self.assertEqual(products.count(), created["products"])
+        self.assertEqual(Order.objects.filter(status='pending', product__in=products).count(), 60)
+        for product in products:
+            self.assertEqual(
+                product.total_required_quantity,
+                sum(Order.objects.filter(product=product).values_list('required_qty', flat=True)),
+            )
+
+        clear_synthetic_data()
+        self.assertEqual(self.table_sizes(), before)
+
+    def test_simulation_plans_and_leaves_the_database_unchanged(self):
+        self.place(3)
+        for dry_run in ((), ("--dry-run",)):
+            with self.subTest(dry_run=dry_run):
+                before = (self.table_sizes(), self.snapshot())
+                out = io.StringIO()
+                call_command("simulate_allocation", "--scales", "40", *dry_run, stdout=out)
+
+                # Header, then one row per scale; the pending orders outside the synthetic data are reported too
+                row = out.getvalue().splitlines()[-1].split()
+                orders, allocated, skipped = int(row[0]), int(row[7]), int(row[8])
+                self.assertEqual(orders, 40)
+                self.assertGreater(allocated, 0)
+                self.assertEqual(allocated + skipped, 43)
+                self.assertEqual((self.table_sizes(), self.snapshot()), before)
+
+
+class IncrementalAllocatorTests(TestCase):
+    """The allocator's in-memory indexes match a rebuild from the database after every flush."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Incremental")
+        self.product = Product.objects.create(name="Indexed product", category=category, available_quantity=20)
+        self.retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        self.trucks = [
+            Employee.objects.create(truck=Truck.objects.create(license_plate=plate, capacity=10)).truck_id
+            for plate in ("INC-1", "INC-2")
+        ]
+        self.allocator = IncrementalAllocator()
+        self.allocator.rebuild()
+
+    def place(self, qty):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(retailer=self.retailer, product=self.product, required_qty=qty)
+        self.allocator.order_created(order.pk, self.product.pk, qty)
+        return order
+
+    @staticmethod
+    def state(allocator):
+        return (
+            allocator.trucks.remaining,
+            allocator.stock,
+            [(order_id, truck_id) for order_id, truck_id, _, _ in allocator.planned],
+            allocator.waiting_truck,
+            allocator.waiting_stock,
+        )
+
+    def assert_matches_rebuild(self):
+        rebuilt = IncrementalAllocator()
+        rebuilt.rebuild()
+        self.assertEqual(self.state(self.allocator), self.state(rebuilt))
+
+    def test_index_stays_consistent_across_flushes(self):
+        orders = [self.place(qty) for qty in (6, 6, 6, 9)]
+        self.assertEqual([order_id for order_id, _, _, _ in self.allocator.planned], [orders[0].pk, orders[1].pk])
+        self.assertEqual(list(self.allocator.waiting_truck), [orders[2].pk])
+        self.assertEqual(self.allocator.waiting_stock, {self.product.pk: {orders[3].pk: 9}})
+
+        # Cancelled before the flush: its truck room and stock go to the order waiting for a truck
+        orders[1].status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            orders[1].save()
+        with self.captureOnCommitCallbacks(execute=True):
+            shipments = self.allocator.flush()
+        self.assertEqual([shipment.order_id for shipment in shipments], [orders[0].pk])
+        self.assertEqual([order_id for order_id, _, _, _ in self.allocator.planned], [orders[2].pk])
+        self.assert_matches_rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.allocator.flush()
+        self.assertEqual(Shipment.objects.count(), 2)
+        self.assert_matches_rebuild()
+
+    def test_resync_event_rebuilds(self):
+        self.place(6)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.allocator.flush()
+        self.allocator.trucks.consume(self.trucks[1], 5)
+        self.allocator.handle(AllocationEvent(kind='resync'))
+        self.assertEqual(self.allocator.trucks.remaining, {self.trucks[0]: 4, self.trucks[1]: 10})
+        self.assert_matches_rebuild()
+
+
+class RoutingTests(SimpleTestCase):
+    """Nearest-neighbour tours improved by 2-opt stay valid and never get longer."""
+
+    @staticmethod
+    def length(route, matrix):
+        return sum(matrix[a, b] for a, b in zip(route, route[1:]))
+
+    def test_two_opt_returns_a_shorter_permutation(self):
+        rng = random.Random(9)
+        shortened = 0
+        for n in (1, 2, 3, 4, 7, 30, 120):
+            matrix = distance_matrix([rng.uniform(50, 51) for _ in range(n)], [rng.uniform(4, 5) for _ in range(n)])
+            start = rng.randrange(n)
+            greedy = nearest_neighbour_route(matrix, start)
+            improved = two_opt(greedy, matrix)
+            self.assertEqual(sorted(greedy), list(range(n)))
+            self.assertEqual(sorted(improved), list(range(n)))
+            self.assertEqual(improved[0], start)
+            self.assertLessEqual(self.length(improved, matrix), self.length(greedy, matrix) + 1e-9)
+            shortened += self.length(improved, matrix) < self.length(greedy, matrix) - 1e-9
+        # The larger greedy tours leave 2-opt something to shorten
+        self.assertGreater(shortened, 0)
+
+    def test_plan_route_numbers_every_stop(self):
+        stops = [
+            {"id": 1, "latitude": 0, "longitude": 3, "distance_from_warehouse": 330},
+            {"id": 2, "latitude": None, "longitude": None, "distance_from_warehouse": 50},
+            {"id": 3, "latitude": 0, "longitude": 1, "distance_from_warehouse": 110},
+            {"id": 4, "latitude": None, "longitude": None, "distance_from_warehouse": 20},
+        ]
+        route = plan_route(stops, origin=(0, 0))
+        self.assertEqual([stop["id"] for stop in route], [3, 1, 4, 2])
+        self.assertEqual([stop["stop"] for stop in route], [1, 2, 3, 4])
+        self.assertAlmostEqual(route[0]["leg_distance"], 111.195, places=2)
+        self.assertEqual([stop["leg_distance"] for stop in route[2:]], [None, None])
+
+
+class DashboardCacheTests(TestCase):
+    """Dashboard aggregates are served from the cache until a commit bumps their table versions."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name="Dashboard")
+            self.product = Product.objects.create(name="Counted", category=self.category, available_quantity=5)
+            self.retailer = Retailer.objects.create(
+                name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5
+            )
+
+    def test_warm_counters_only_read_the_table_versions(self):
+        expected = get_dashboard_counts()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_dashboard_counts(), expected)
+
+    def test_committed_orders_refresh_counters(self):
+        get_dashboard_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(retailer=self.retailer, product=self.product, required_qty=1)
+            Order.objects.create(retailer=self.retailer, product=self.product, required_qty=2)
+            order.status = 'cancelled'
+            order.save()
+            self.assertEqual(get_dashboard_counts()["orders_placed"], 0)
+
+        counts = get_dashboard_counts()
+        self.assertEqual(counts, compute_counts())
+        self.assertEqual((counts["orders_placed"], counts["pending_orders"]), (2, 1))
+
+    def test_commit_in_another_process_refreshes_cached_entries(self):
+        get_dashboard_counts()
+        get_category_stock()
+        # A worker process (run_allocator, sync_odoo_delta, ...) shares the database, not this cache
+        Order.objects.bulk_create([Order(retailer=self.retailer, product=self.product, required_qty=1)])
+        Product.objects.filter(pk=self.product.pk).update(available_quantity=50)
+        apply_version_bumps([Order._meta.label_lower, Product._meta.label_lower])
+
+        self.assertEqual(get_dashboard_counts()["orders_placed"], 1)
+        self.assertEqual(get_category_stock()[0]["total_available"], 50)
+
+    def test_category_breakdown_is_one_aggregate_query(self):
+        Product.objects.create(name="Short", category=self.category, available_quantity=0, total_required_quantity=3)
+        Category.objects.create(name="Empty")
+
+        # The table versions, then the aggregate
+        with self.assertNumQueries(2):
+            data = get_category_stock()
+        self.assertEqual(
+            [(row["name"], row["product_count"], row["total_available"], row["total_required"]) for row in data],
+            [("Dashboard", 2, 5, 3), ("Empty", 0, 0, 0)],
+        )
+        with self.assertNumQueries(1):
+            get_category_stock()
+
+        filtered = get_category_stock(product_status='on_demand', include_empty=False)
+        self.assertEqual([(row["name"], row["product_count"]) for row in filtered], [("Dashboard", 1)])
+
+    def test_stock_update_refreshes_category_totals(self):
+        get_category_stock()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(available_quantity=50)
+            recompute_product_status([self.product.pk])
+
+        self.assertEqual(get_category_stock()[0]["total_available"], 50)
+
+
+class QueryBudgetTests(TestCase):
+    """List endpoints run a fixed number of queries whatever the number of rows."""
+
+    # Endpoint, requesting user, query budget; page-number lists count the rows first,
+    # keyset-paginated ones do not, ETag-backed ones read the table versions first
+    ENDPOINTS = [
+        ("/api/employees/", "admin", 2),
+        ("/api/retailers/", "admin", 2),
+        ("/api/orders/", "admin", 2),
+        ("/api/trucks/", "admin", 2),
+        ("/api/shipments/", "admin", 2),
+        ("/api/trips/", "admin", 5),
+        ("/api/stock/", "admin", 2),
+        ("/api/users/", "admin", 1),
+        # The employee permission looks up the user's groups
+        ("/api/employee_orders/", "driver", 2),
+        ("/api/employee_shipments/", "driver", 2),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="budget-admin", is_staff=True)
+        cls.driver = User.objects.create(username="budget-driver")
+        cls.driver.groups.add(Group.objects.create(name="employee"))
+        cls.employee = Employee.objects.create(
+            user=cls.driver, truck=Truck.objects.create(license_plate="BUDGET", capacity=10 ** 6)
+        )
+        cls.category = Category.objects.create(name="Budget")
+
+    def grow(self, rows):
+        """Bring every listed table up to ``rows`` rows with bulk inserts (no signals)."""
+        missing = rows - Order.objects.count()
+        start = rows - missing
+        products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", category=self.category, available_quantity=i) for i in range(start, rows)
+        ])
+        retailers = Retailer.objects.bulk_create([
+            Retailer(name=f"Retailer {i}", address=f"Road {i}", contact="123", distance_from_warehouse=i % 50)
+            for i in range(start, rows)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(retailer=retailer, product=product, required_qty=1, status='allocated')
+            for product, retailer in zip(products, retailers)
+        ])
+        trips = Trip.objects.bulk_create([
+            Trip(employee=self.employee, min_distance=0, max_distance=50, load=10) for _ in range(missing // 10)
+        ])
+        Shipment.objects.bulk_create([
+            Shipment(order=order, employee=self.employee, trip=trips[i // 10] if trips else None)
+            for i, order in enumerate(orders)
+        ])
+        users = User.objects.bulk_create([User(username=f"budget-{i}") for i in range(start, rows)])
+        trucks = Truck.objects.bulk_create([Truck(license_plate=f"B-{i}", capacity=100) for i in range(start, rows)])
+        Employee.objects.bulk_create([Employee(user=user, truck=truck) for user, truck in zip(users, trucks)])
+
+    def test_list_endpoints_stay_within_budget(self):
+        api = APIClient()
+        for rows in (10, 100, 1000):
+            self.grow(rows)
+            for url, user, budget in self.ENDPOINTS:
+                with self.subTest(url=url, rows=rows):
+                    api.force_authenticate(user=getattr(self, user))
+                    with self.assertNumQueries(budget):
+                        response = api.get(url, {"page_size": 100})
+                    self.assertEqual(response.status_code, 200)
+
+
+class QueryIndexTests(TestCase):
+    """The query-pattern indexes exist in the migrations and the database, and the benchmark runs."""
+
+    INDEXES = {
+        Order: ('order_status_date', ['status', 'order_date', 'order_id']),
+        Shipment: ('shipment_in_transit_employee', ['employee_id']),
+    }
+
+    def database_indexes(self, model):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        return {name: constraint['columns'] for name, constraint in constraints.items() if constraint['index']}
+
+    def test_migrations_create_the_indexes(self):
+        state = MigrationLoader(connection).project_state(('app', '0031_query_pattern_indexes'))
+        for model, (name, columns) in self.INDEXES.items():
+            with self.subTest(index=name):
+                indexes = {index.name: index for index in state.models['app', model._meta.model_name].options['indexes']}
+                self.assertIn(name, indexes)
+                self.assertEqual(self.database_indexes(model)[name], columns)
+        self.assertEqual(indexes['shipment_in_transit_employee'].condition, Q(status='in_transit'))
+
+    @skipUnless(connection.vendor == 'postgresql', "EXPLAIN ANALYZE timings need PostgreSQL")
+    def test_benchmark_times_every_view_query_and_keeps_the_indexes(self):
+        out = io.StringIO()
+        call_command(
+            "benchmark_indexes", "--orders", "300", "--products", "30", "--trucks", "5", "--runs", "1", stdout=out
+        )
+        rows = out.getvalue().splitlines()
+        rows = rows[next(i for i, row in enumerate(rows) if row.startswith("view")) + 1:]
+        self.assertEqual({row.split()[0] for row in rows}, {
+            "get_orders", "get_shipments", "allocate_orders", "update_shipment_status", "get_employee_shipments",
+            "get_employee_route", "category_stock_data", "export_data",
+        })
+
+        # The indexes dropped for the "before" timings are back, the synthetic data is gone
+        for model, (name, columns) in self.INDEXES.items():
+            self.assertEqual(self.database_indexes(model).get(name), columns)
+        self.assertFalse(Product.objects.filter(name__startswith=SYNTHETIC_PREFIX).exists())
+
+
+class KeysetPaginationTests(TestCase):
+    """Order history pages follow (order_date, order_id) in both directions, one page query each."""
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(user=User.objects.create(username="pager", is_staff=True))
+        category = Category.objects.create(name="Pages")
+        product = Product.objects.create(name="Paged", category=category, available_quantity=1)
+        retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        orders = Order.objects.bulk_create([Order(retailer=retailer, product=product, required_qty=1) for _ in range(25)])
+        # Ties on the timestamp must be broken by the id
+        Order.objects.filter(pk__in=[order.pk for order in orders[5:15]]).update(order_date=orders[5].order_date)
+        self.expected = list(Order.objects.order_by('-order_date', '-order_id').values_list('order_id', flat=True))
+
+    def page(self, url):
+        # The table versions for the ETag, then the page
+        with self.assertNumQueries(2):
+            response = self.api.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_walks_forward_and_back(self):
+        pages = [self.page("/api/orders/?page_size=10")]
+        while pages[-1]["next"]:
+            pages.append(self.page(pages[-1]["next"]))
+
+        self.assertEqual([[row["order_id"] for row in page["results"]] for page in pages], [
+            self.expected[:10], self.expected[10:20], self.expected[20:],
+        ])
+        self.assertIsNone(pages[0]["previous"])
+
+        back = self.page(pages[2]["previous"])
+        self.assertEqual([row["order_id"] for row in back["results"]], self.expected[10:20])
+        first = self.page(back["previous"])
+        self.assertEqual([row["order_id"] for row in first["results"]], self.expected[:10])
+        self.assertIsNone(first["previous"])
+
+    def test_total_is_opt_in(self):
+        self.assertNotIn("estimated_count", self.page("/api/orders/"))
+        if connection.vendor == 'postgresql':
+            # The estimate comes from the table statistics
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Order._meta.db_table}")
+        self.assertEqual(self.api.get("/api/orders/?with_total=true").data["estimated_count"], 25)
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.api.get("/api/orders/?cursor=garbage").status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    """Read endpoints answer unchanged polls with 304 from the table versions alone."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.api = APIClient()
+        self.api.force_authenticate(user=User.objects.create(username="poller", is_staff=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name="Polled")
+            self.product = Product.objects.create(name="Polled", category=self.category, available_quantity=5)
+            self.retailer = Retailer.objects.create(
+                name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5
+            )
+
+    def poll(self, url, etag, queries=1):
+        # The one query of an unchanged poll reads the table versions
+        with self.assertNumQueries(queries):
+            return self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_poll_is_not_modified_without_queries(self):
+        for url in ("/api/stock/", "/api/category-stock/", "/api/count/", "/api/orders/", "/api/shipments/"):
+            first = self.api.get(url)
+            self.assertEqual(first.status_code, 200)
+            response = self.poll(url, first["ETag"])
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response["ETag"], first["ETag"])
+            self.assertEqual(response.content, b"")
+
+    def test_committed_change_invalidates_etag(self):
+        etag = self.api.get("/api/stock/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(available_quantity=50)
+            recompute_product_status([self.product.pk])
+            # Not visible to other transactions yet
+            self.assertEqual(self.poll("/api/stock/", etag).status_code, 304)
+
+        response = self.api.get("/api/stock/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data[0]["available_quantity"], 50)
+
+    def test_bump_from_another_process_invalidates_etag(self):
+        etag = self.api.get("/api/stock/")["ETag"]
+        # A worker process (run_allocator, sync_odoo_delta, ...) shares the database, not this cache
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {TableVersion._meta.db_table} SET version = version + 1 WHERE \"table\" = %s",
+                [Product._meta.label_lower],
+            )
+
+        response = self.api.get("/api/stock/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_bulk_order_placement_invalidates_order_etags(self):
+        orders_etag = self.api.get("/api/orders/")["ETag"]
+        counts_etag = self.api.get("/api/count/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(
+                "/api/orders/bulk/",
+                {"orders": [{"retailer_id": self.retailer.pk, "product_id": self.product.pk, "required_qty": 2}]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.api.get("/api/orders/", HTTP_IF_NONE_MATCH=orders_etag).status_code, 200)
+        self.assertEqual(self.api.get("/api/count/", HTTP_IF_NONE_MATCH=counts_etag).status_code, 200)
+
+    def test_etag_depends_on_query_string(self):
+        etag = self.api.get("/api/category-stock/")["ETag"]
+        response = self.api.get("/api/category-stock/?status=on_demand", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.poll("/api/category-stock/?status=on_demand", f'W/{response["ETag"]}').status_code, 304)
+
+
+class ExportTests(TestCase):
+    """Exports stream every matching row as NDJSON or CSV, optionally gzipped."""
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(user=User.objects.create(username="exporter", is_staff=True))
+        category = Category.objects.create(name="Exports")
+        product = Product.objects.create(name="Exported", category=category, available_quantity=1)
+        retailer = Retailer.objects.create(name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5)
+        self.orders = Order.objects.bulk_create([Order(retailer=retailer, product=product, required_qty=i + 1) for i in range(30)])
+        Order.objects.filter(pk__in=[order.pk for order in self.orders[:10]]).update(
+            order_date=timezone.now() - timedelta(days=30)
+        )
+
+    def export(self, url):
+        response = self.api.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def test_ndjson_streams_every_row(self):
+        rows = [json.loads(line) for line in self.export("/api/export/orders/").splitlines()]
+        self.assertEqual([row["order_id"] for row in rows], [order.pk for order in self.orders])
+        self.assertEqual(rows[0]["retailer"], "Retailer")
+
+    def test_gzipped_csv_with_date_range(self):
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        body = gzip.decompress(self.export(f"/api/export/orders/?output=csv&gzip=true&since={since}"))
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0]["product"], "Exported")
+
+    def test_invalid_parameters_are_rejected_before_streaming(self):
+        self.assertEqual(self.api.get("/api/export/orders/?output=xml").status_code, 400)
+        self.assertEqual(self.api.get("/api/export/orders/?since=yesterday").status_code, 400)
+        self.assertEqual(self.api.get("/api/export/trucks/").status_code, 404)
+
+
+@override_settings(EVENT_BROKER='app.events.LocalBroker')
+class LiveEventTests(TestCase):
+    """Committed changes reach the subscribed channels as merged events, employees only see their shipments."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(name="Live")
+            self.product = Product.objects.create(name="Live", category=category, available_quantity=100)
+            self.retailer = Retailer.objects.create(
+                name="Retailer", address="Road 1", contact="123", distance_from_warehouse=5
+            )
+            self.driver = User.objects.create(username="live-driver")
+            self.employee = Employee.objects.create(user=self.driver)
+            self.other_employee = Employee.objects.create(user=User.objects.create(username="other-driver"))
+
+    def place_and_ship(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            orders = [
+                Order.objects.create(retailer=self.retailer, product=self.product, required_qty=1) for _ in range(3)
+            ]
+            try:
+                with transaction.atomic():
+                    Order.objects.create(retailer=self.retailer, product=self.product, required_qty=1)
+                    raise ValueError
+            except ValueError:
+                pass
+            shipment = Shipment.objects.create(order=orders[0], employee=self.employee)
+        return orders, shipment
+
+    async def drain(self, subscription):
+        events = []
+        while (event := await subscription.get(timeout=0.2)) is not None:
+            events.append(event)
+        return events
+
+    async def test_events_are_merged_and_filtered_by_role(self):
+        broker = get_broker()
+        managers = broker.subscribe(MANAGERS_CHANNEL)
+        driver = broker.subscribe(employee_channel(self.employee.pk))
+        other = broker.subscribe(employee_channel(self.other_employee.pk))
+        try:
+            orders, shipment = await sync_to_async(self.place_and_ship)()
+            manager_events = await self.drain(managers)
+            driver_events = await self.drain(driver)
+            other_events = await self.drain(other)
+        finally:
+            for subscription in (managers, driver, other):
+                subscription.close()
+
+        self.assertIn(
+            {"type": "order", "action": "created", "ids": sorted(order.pk for order in orders)}, manager_events
+        )
+        self.assertIn({"type": "shipment", "action": "created", "ids": [shipment.pk]}, manager_events)
+        self.assertIn({"type": "product", "action": "updated", "ids": [self.product.pk]}, manager_events)
+        self.assertEqual(driver_events, [{"type": "shipment", "action": "created", "ids": [shipment.pk]}])
+        self.assertEqual(other_events, [])
+
+    async def test_stream_sends_employee_their_shipments(self):
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.driver)))()
+        response = await self.async_client.get(f"/api/events/?token={token}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        stream = response.streaming_content
+        try:
+            self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+            self.assertEqual(await anext(stream), b'event: ready\ndata: {"shared": false}\n\n')
+            _, shipment = await sync_to_async(self.place_and_ship)()
+            event = (await anext(stream)).decode()
+        finally:
+            await stream.aclose()
+        self.assertEqual(event, f'event: shipment\ndata: {{"type":"shipment","action":"created","ids":[{shipment.pk}]}}\n\n')
+
+    def test_stream_needs_a_known_user_and_the_asgi_app(self):
+        self.assertEqual(self.client.get("/api/events/").status_code, 401)
+        self.assertEqual(self.client.get("/api/events/?token=garbage").status_code, 401)
+
+        stranger = User.objects.create(username="stranger")
+        self.assertEqual(self.client.get(f"/api/events/?token={AccessToken.for_user(stranger)}").status_code, 403)
+        self.assertEqual(self.client.get(f"/api/events/?token={AccessToken.for_user(self.driver)}").status_code, 501)
+
+
+@skipUnless(connection.vendor == 'postgresql', "LISTEN/NOTIFY needs PostgreSQL")
+class PostgresBrokerTests(TransactionTestCase):
+    """Events published by any process reach the subscribers of every process."""
+
+    async def test_events_of_another_process_are_relayed(self):
+        broker = PostgresBroker()
+        # Publishes only through the database, like another worker would
+        other_process = PostgresBroker()
+        subscription = broker.subscribe(MANAGERS_CHANNEL)
+        try:
+            # Sent once the listener is connected
+            self.assertEqual(await subscription.get(timeout=10), {"type": "resync"})
+            await sync_to_async(other_process.publish)(
+                MANAGERS_CHANNEL, {"type": "order", "action": "created", "ids": [1, 2]}
+            )
+            await sync_to_async(other_process.publish)(
+                MANAGERS_CHANNEL, {"type": "order", "action": "updated", "ids": list(range(5000))}
+            )
+            await sync_to_async(other_process.publish)(
+                employee_channel(1), {"type": "shipment", "action": "created", "ids": [3]}
+            )
+            events = [await subscription.get(timeout=10), await subscription.get(timeout=10)]
+            self.assertIsNone(await subscription.get(timeout=0.5))
+        finally:
+            subscription.close()
+            await sync_to_async(broker.close, thread_sensitive=False)()
+
+        self.assertEqual(events, [
+            {"type": "order", "action": "created", "ids": [1, 2]},
+            # Over the NOTIFY payload limit the ids are dropped
+            {"type": "order", "action": "updated", "ids": None},
+        ])
+
+
+class OdooClientTests(SimpleTestCase):
+    """The pooled Odoo client against the in-process fake Odoo."""
+
+    def setUp(self):
+        self.odoo = FakeOdooServer().start()
+        self.odoo.add_user("db", "admin", "secret")
+        self.addCleanup(self.odoo.stop)
+        self.addCleanup(reset_odoo_clients)
+
+    def odoo_client(self, password="secret"):
+        return get_odoo_client("db", "admin", password, url=self.odoo.url)
+
+    def test_uid_and_connection_are_reused(self):
+        for i in range(20):
+            create_odoo_product(self.odoo_client(), f"Product {i}", 1.5, i)
+
+        self.assertEqual(self.odoo.stats["authenticate"], 1)
+        self.assertEqual(self.odoo.stats["connections"], 1)
+        self.assertEqual(len(self.odoo.records["product.product"]), 20)
+
+    def test_reauthenticates_when_uid_is_rejected(self):
+        create_odoo_product(self.odoo_client(), "Before", 1, 1)
+        self.odoo.rotate_uids()
+
+        create_odoo_product(self.odoo_client(), "After", 1, 1)
+
+        self.assertEqual(self.odoo.stats["authenticate"], 2)
+        self.assertEqual(len(self.odoo.records["product.product"]), 2)
+
+    @override_settings(ODOO_POOL_SIZE=2)
+    def test_concurrent_calls_stay_within_the_pool(self):
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda i: create_odoo_product(self.odoo_client(), "Concurrent", 1, i), range(40)))
+
+        self.assertLessEqual(self.odoo.stats["connections"], 2)
+        self.assertEqual(len(self.odoo.records["product.product"]), 40)
+
+    def test_wrong_password_is_rejected(self):
+        with self.assertRaises(OdooAuthenticationError):
+            create_odoo_product(self.odoo_client(password="wrong"), "Rejected", 1, 1)
+
+
+class OdooOutboxTests(TestCase):
+    """Product creation is delivered to Odoo by the outbox worker, not the save."""
+
+    def setUp(self):
+        self.odoo = FakeOdooServer().start()
+        self.odoo.add_user("db", "admin", "secret")
+        self.addCleanup(self.odoo.stop)
+        self.addCleanup(reset_odoo_clients)
+        settings_override = override_settings(ODOO_URL=self.odoo.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create(username="odoo-user")
+        OdooCredentials.objects.create(user=self.user, db="db", username="admin", password="secret")
+        self.category = Category.objects.create(name="Outbox")
+
+    def test_product_save_queues_and_worker_delivers(self):
+        product = Product.objects.create(
+            name="Synced", category=self.category, available_quantity=4, price=2, created_by=self.user
+        )
+        self.assertEqual(self.odoo.stats["execute_kw"], 0)
+
+        self.assertEqual(deliver_outbox(), {"sent": 1, "retried": 0, "dead": 0})
+        message = OdooOutboxMessage.objects.get(product=product)
+        self.assertEqual(message.status, "sent")
+        self.assertEqual(self.odoo.records["product.product"][message.odoo_id]["name"], "Synced")
+
+    def test_outage_is_retried_with_backoff(self):
+        Product.objects.create(name="Later", category=self.category, available_quantity=1, price=1, created_by=self.user)
+        self.odoo.stop()
+
+        self.assertEqual(deliver_outbox(), {"sent": 0, "retried": 1, "dead": 0})
+        message = OdooOutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), ("pending", 1))
+        # Not due again until the backoff has passed
+        self.assertEqual(deliver_outbox(), {"sent": 0, "retried": 0, "dead": 0})
+
+    def test_lease_is_renewed_per_message_and_reclaimed_messages_are_left(self):
+        for name in ("First", "Second"):
+            Product.objects.create(name=name, category=self.category, available_quantity=1, price=1, created_by=self.user)
+        first, second = OdooOutboxMessage.objects.order_by('message_id')
+        leases = []
+
+        def slow_send(message, credentials_by_user):
+            leases.append(OdooOutboxMessage.objects.values_list('next_attempt_at', flat=True).get(pk=message.pk))
+            # The batch outlived the second message's lease and another worker claimed it
+            OdooOutboxMessage.objects.filter(pk=second.pk).update(
+                attempts=F('attempts') + 1, next_attempt_at=timezone.now() + timedelta(hours=1)
+            )
+            return send_message(message, credentials_by_user)
+
+        started = timezone.now()
+        with mock.patch("app.odoo_outbox.send_message", side_effect=slow_send):
+            self.assertEqual(deliver_outbox(), {"sent": 1, "retried": 0, "dead": 0})
+
+        self.assertEqual(len(leases), 1)
+        self.assertGreaterEqual(leases[0], started + timedelta(seconds=LEASE_SECONDS))
+        self.assertEqual([record["name"] for record in self.odoo.records["product.product"].values()], ["First"])
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.attempts), ("pending", 2))
+
+
+class OdooDeltaSyncTests(TestCase):
+    """Delta cycles against a fake Odoo: watermark, quantity conflicts and per-user mappings."""
+
+    def setUp(self):
+        self.odoo = FakeOdooServer().start()
+        self.odoo.add_user("db", "admin", "secret")
+        self.addCleanup(self.odoo.stop)
+        self.addCleanup(reset_odoo_clients)
+        self.client = get_odoo_client("db", "admin", "secret", url=self.odoo.url)
+
+        self.user = User.objects.create(username="odoo-owner")
+        self.category = Category.objects.create(name="Delta")
+        self.product = Product.objects.create(name="Synced", category=self.category, available_quantity=10, price=2)
+        push_products(self.client, self.user, [self.product])
+        self.product.refresh_from_db()
+        self.records = self.odoo.records["product.product"]
+
+    def age_records(self):
+        """Date the Odoo records back so the watermark is past them."""
+        for record in self.records.values():
+            record["write_date"] = "2020-01-01 00:00:00"
+
+    def conflict(self, policy):
+        """Odoo and Ignyte both moved the quantity away from the synced 10; run a cycle with ``policy``."""
+        self.records[self.product.odoo_id]["qty_available"] = 15
+        Product.objects.filter(pk=self.product.pk).update(available_quantity=F('available_quantity') - 3)
+        sync_delta(self.client, self.user, policy=policy)
+        self.product.refresh_from_db()
+        return self.product.available_quantity, self.records[self.product.odoo_id]["qty_available"]
+
+    def test_resolve_quantity(self):
+        self.assertEqual(resolve_quantity(10, 15, None, 'merge'), 15)
+        self.assertEqual(resolve_quantity(7, 10, 10, 'merge'), 7)
+        self.assertEqual(resolve_quantity(7, 15, 10, 'merge'), 12)
+        self.assertEqual(resolve_quantity(2, 5, 10, 'merge'), 0)
+        self.assertEqual(resolve_quantity(7, 15, 10, 'local'), 7)
+        self.assertEqual(resolve_quantity(7, 15, 10, 'remote'), 15)
+
+    def test_merge_applies_both_changes_and_pushes_the_result(self):
+        self.assertEqual(self.conflict('merge'), (12, 12))
+
+    def test_local_policy_keeps_ignyte_quantity(self):
+        self.assertEqual(self.conflict('local'), (7, 7))
+
+    def test_remote_policy_takes_odoo_quantity(self):
+        self.assertEqual(self.conflict('remote'), (15, 15))
+
+    def test_watermark_advances_past_pulled_records(self):
+        self.age_records()
+        self.records[self.product.odoo_id]["name"] = "Renamed"
+
+        summary = sync_delta(self.client, self.user)
+        self.assertEqual((summary["pulled"], summary["applied"]), (1, 1))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, "Renamed")
+        state = OdooSyncState.objects.get(user=self.user)
+        self.assertEqual((state.pulled_write_date, state.pulled_id), ("2020-01-01 00:00:00", self.product.odoo_id))
+
+        # The next cycle starts after the watermark
+        self.assertEqual(sync_delta(self.client, self.user)["pulled"], 0)
+
+    def test_push_watermark_covers_commits_that_land_late(self):
+        started = timezone.now()
+        sync_delta(self.client, self.user)
+        # Stamped before that cycle started, but only committed after its push read
+        Product.objects.filter(pk=self.product.pk).update(name="Committed late", updated_at=started - timedelta(seconds=1))
+
+        summary = sync_delta(self.client, self.user)
+        self.assertEqual(summary["updated"], 1)
+        self.assertEqual(self.records[self.product.odoo_id]["name"], "Committed late")
+
+        # Re-read within the settle window, but not sent again
+        summary = sync_delta(self.client, self.user)
+        self.assertEqual((summary["updated"], summary["unchanged"]), (0, 1))
+
+    def test_pull_locks_the_products_it_merges(self):
+        self.records[self.product.odoo_id]["qty_available"] = 15
+        with CaptureQueriesContext(connection) as queries:
+            sync_delta(self.client, self.user)
+        if connection.features.has_select_for_update:
+            self.assertTrue(any(" FOR UPDATE" in query["sql"] for query in queries.captured_queries))
+
+    def test_mappings_are_per_owner(self):
+        other = User.objects.create(username="other-odoo-owner")
+        # Same id in another Odoo database
+        twin = Product.objects.create(
+            name="Twin", category=self.category, available_quantity=3, price=1,
+            odoo_id=self.product.odoo_id, odoo_owner=other,
+        )
+        self.records[self.product.odoo_id]["qty_available"] = 15
+
+        sync_delta(self.client, self.user)
+        twin.refresh_from_db()
+        self.assertEqual((twin.name, twin.available_quantity), ("Twin", 3))
+        self.assertNotIn(twin, syncable_products(self.user))
+
+    def test_unmapped_products_are_scoped_to_their_creator(self):
+        other = User.objects.create(username="other-odoo-creator")
+        queued = Product.objects.create(name="Queued", category=self.category, available_quantity=1, price=1, created_by=self.user)
+        given_up = Product.objects.create(name="Given up", category=self.category, available_quantity=1, price=1, created_by=self.user)
+        OdooOutboxMessage.objects.filter(product=given_up).update(status='dead')
+        foreign = Product.objects.create(name="Foreign", category=self.category, available_quantity=1, price=1, created_by=other)
+        OdooOutboxMessage.objects.filter(product=foreign).update(status='dead')
+
+        self.assertEqual(
+            sorted(product.name for product in syncable_products(self.user)), ["Given up", "Synced"]
+        )
+        # The outbox still owns the queued product, the catalog push must not create it too
+        push_products(self.client, self.user, syncable_products(self.user))
+        self.assertEqual(
+            sorted(record["name"] for record in self.records.values()), ["Given up", "Synced"]
+        )
+        self.assertIsNone(Product.objects.get(pk=queued.pk).odoo_id)
+
+    def test_reconcile_unmaps_deleted_and_adopts_by_name(self):
+        # Imported without the signals, so no outbox message queued it
+        orphan, = Product.objects.bulk_create([
+            Product(name="Orphan", category=self.category, available_quantity=1, price=1, created_by=self.user)
+        ])
+        odoo_id = create_odoo_product(self.client, "Orphan", 1, 1)
+        del self.records[self.product.odoo_id]
+
+        result = reconcile_mapping(self.client, self.user, list(syncable_products(self.user)))
+        self.assertEqual(result, {"unmapped": 1, "adopted": 1})
+        self.product.refresh_from_db()
+        orphan.refresh_from_db()
+        self.assertEqual((self.product.odoo_id, self.product.odoo_owner), (None, None))
+        self.assertEqual((orphan.odoo_id, orphan.odoo_owner, orphan.odoo_sync_hash), (odoo_id, self.user, ""))
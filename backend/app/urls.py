@@ -4,7 +4,9 @@ from rest_framework.urlpatterns import format_suffix_patterns  # ✅ For better
 from .views import (
     CustomAuthToken, get_employee_id,logout_view, get_employees, get_retailers,get_counts,
     get_orders,get_users,get_employee_orders,recent_actions,get_employee_shipments,update_shipment_status,get_logged_in_user,allocate_orders, get_trucks, get_shipments,get_stock_data,category_stock_data,store_qr_code,
-    save_odoo_credentials,register_user, get_available_groups
+    save_odoo_credentials,register_user, get_available_groups,
+    submit_allocation_job, get_allocation_job, get_allocation_job_results, dispatch_orders, get_trips,
+    get_employee_route, place_bulk_orders, export_data, event_stream
 )
 
 urlpatterns = [
@@ -17,11 +19,19 @@ urlpatterns = [
     path("employees/", get_employees, name="get_employees"),  # Admin Only
     path("retailers/", get_retailers, name="get_retailers"),  # Admin Only
     path("orders/", get_orders, name="get_orders"),  # Admin & Employees
+    path("orders/bulk/", place_bulk_orders, name="place_bulk_orders"),
     path("allocate-orders/", allocate_orders, name="allocate_orders"),  # Employees Only
+    path("allocation-jobs/", submit_allocation_job, name="submit_allocation_job"),
+    path("allocation-jobs/<int:job_id>/", get_allocation_job, name="get_allocation_job"),
+    path("allocation-jobs/<int:job_id>/results/", get_allocation_job_results, name="get_allocation_job_results"),
+    path("dispatch/", dispatch_orders, name="dispatch_orders"),
+    path("trips/", get_trips, name="get_trips"),
     path("trucks/", get_trucks, name="get_trucks"),  # Admin Only
     path("shipments/", get_shipments, name="get_shipments"),  # Admin & Employees.
     path('stock/', get_stock_data, name='stock-data'),
     path('category-stock/', category_stock_data, name='category-stock-data'),
+    path('export/<str:kind>/', export_data, name='export_data'),  # Admin Only
+    path('events/', event_stream, name='event_stream'),  # Managers & Employees, Server-Sent Events
     path('store_qr/', store_qr_code, name='store_qr'),
     
     #count
@@ -29,6 +39,7 @@ urlpatterns = [
     path('users/', get_users, name='get_users'), 
     path('user_detail/', get_logged_in_user, name='get_logged_in_user'),
     path('employee_shipments/', get_employee_shipments, name='employee_shipments'),
+    path('employee_route/', get_employee_route, name='employee_route'),
     path('update_shipment_status/', update_shipment_status, name='update-shipment-status'),
     path('employee_orders/', get_employee_orders, name='get_employee_orders'),
     path('recent_actions/', recent_actions, name='recent_actions'),
@@ -1,24 +1,43 @@
 import json
 import logging
-from django.db import transaction
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated,IsAdminUser,AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Count
-from .models import Employee, Retailer, Order, Truck, Shipment, Product, Category,OdooCredentials
+from rest_framework.exceptions import ValidationError
+from .models import Employee, Retailer, Order, Truck, Shipment, Product, Category,OdooCredentials, AllocationJob, AllocationJobResult, Trip
 from .serializers import (
     EmployeeSerializer, RetailerSerializer, 
-    OrderSerializer, ProductSerializer, TruckSerializer, ShipmentSerializer, CategorySerializer,UserRegistrationSerializer
+    OrderSerializer, ProductSerializer, TruckSerializer, ShipmentSerializer, EmployeeShipmentSerializer, CategorySerializer,UserRegistrationSerializer,
+    AllocationJobSerializer, AllocationJobResultSerializer, TripSerializer
 )
-from .allocation import allocate_shipments
+from .allocation import allocate_shipments, record_allocation_event
+from .allocation_engine import get_strategy
+from .dispatch import DEFAULT_BAND_WIDTH, run_dispatch
+from .routing import route_for_shipments
+from .orders import OrderBatchError, place_orders
+from .pagination import KeysetPagination
+from .exports import EXPORTS, FORMATS as EXPORT_FORMATS, stream_export
+from .stock import promisable_expression, recompute_product_status
+from .dashboard import PRODUCT_STATUSES, get_category_stock, get_dashboard_counts
+from .conditional import conditional_on
+from .events import channels_for, get_broker, sse_stream
 from django.db.models import F
+from django.utils import timezone
 from django.shortcuts import redirect
 from django.contrib.auth.models import User,Group
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.http import require_GET
+from asgiref.sync import sync_to_async
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time
 from .permissions import IsEmployeeUser
 from django.contrib.admin.models import LogEntry;
 from django.contrib.admin.models import LogEntry
@@ -69,7 +88,7 @@ def logout_view(request):
 @permission_classes([IsAuthenticated, IsAdminUser])
 def get_employees(request):
     try:
-        employees = Employee.objects.all()
+        employees = Employee.objects.select_related('user', 'truck').order_by('employee_id')
         paginator = StandardPagination()
         paginated_employees = paginator.paginate_queryset(employees, request)
         serializer = EmployeeSerializer(paginated_employees, many=True)
@@ -82,7 +101,7 @@ def get_employees(request):
 @permission_classes([IsAuthenticated, IsAdminUser])
 def get_retailers(request):
     try:
-        retailers = Retailer.objects.all()
+        retailers = Retailer.objects.order_by('retailer_id')
         paginator = StandardPagination()
         paginated_retailers = paginator.paginate_queryset(retailers, request)
         serializer = RetailerSerializer(paginated_retailers, many=True)
@@ -93,27 +112,60 @@ def get_retailers(request):
 # ✅ Get Orders (Anyone Logged In)
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_on(Order, Product, Retailer)
 def get_orders(request):
     try:
         status_filter = request.GET.get("status")
-        orders = Order.objects.all().order_by("-order_date")
+        orders = Order.objects.select_related('product', 'retailer')
 
         if status_filter:
             orders = orders.filter(status=status_filter)
 
-        paginator = StandardPagination()
+        # Newest first, one index range scan per page however deep
+        paginator = KeysetPagination('order_date', 'order_id')
         paginated_orders = paginator.paginate_queryset(orders, request)
         serializer = OrderSerializer(paginated_orders, many=True)
         return paginator.get_paginated_response(serializer.data)
+    except ValidationError as e:
+        return Response({"error": e.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# ✅ Bulk Order Placement (Anyone Logged In)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def place_bulk_orders(request):
+    """
+    Place many pending orders in one request.
+    Body: `{"orders": [{"retailer_id", "product_id", "required_qty"}, ...]}`.
+    An `Idempotency-Key` header (or `idempotency_key` field) makes retries return the first result.
+    """
+    data = request.data
+    lines = data if isinstance(data, list) else data.get("orders")
+    idempotency_key = request.headers.get("Idempotency-Key") or (
+        data.get("idempotency_key") if isinstance(data, dict) else None
+    )
+    try:
+        result, replayed = place_orders(lines, request.user, idempotency_key)
+    except OrderBatchError as e:
+        body = {"error": str(e)}
+        if e.errors:
+            body["errors"] = e.errors
+        return Response(body, status=e.status_code)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    response = Response(result, status=status.HTTP_200_OK if replayed else status.HTTP_201_CREATED)
+    if replayed:
+        response["Idempotent-Replayed"] = "true"
+    return response
+
 # ✅ Get Trucks (Admin Only)
 @api_view(["GET"])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def get_trucks(request):
     try:
-        trucks = Truck.objects.all()
+        trucks = Truck.objects.order_by('truck_id')
         paginator = StandardPagination()
         paginated_trucks = paginator.paginate_queryset(trucks, request)
         serializer = TruckSerializer(paginated_trucks, many=True)
@@ -124,13 +176,15 @@ def get_trucks(request):
 # ✅ Get Shipments (Anyone Logged In)
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_on(Shipment)
 def get_shipments(request):
     try:
-        shipments = Shipment.objects.all().order_by("-shipment_date")  # Fix applied here
-        paginator = StandardPagination()
-        paginated_shipments = paginator.paginate_queryset(shipments, request)
+        paginator = KeysetPagination('shipment_date', 'shipment_id')
+        paginated_shipments = paginator.paginate_queryset(Shipment.objects.all(), request)
         serializer = ShipmentSerializer(paginated_shipments, many=True)
         return paginator.get_paginated_response(serializer.data)
+    except ValidationError as e:
+        return Response({"error": e.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -138,55 +192,213 @@ def get_shipments(request):
 @permission_classes([IsAuthenticated])  
 def allocate_orders(request):
     try:
-        with transaction.atomic():
-            allocation_result = allocate_shipments(request)
+        # Product statuses are recomputed by the allocation itself, only for the products it touched
+        return allocate_shipments(request)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def submit_allocation_job(request):
+    """Queue an allocation run for the `run_allocation_jobs` worker and return its id immediately."""
+    strategy = request.data.get("strategy") or ""
+    try:
+        get_strategy(strategy)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            if isinstance(allocation_result, Response):
-                return allocation_result
+    job = AllocationJob.objects.create(created_by=request.user, strategy=strategy)
+    return Response({"job_id": job.job_id, "status": job.status}, status=status.HTTP_202_ACCEPTED)
 
-            # ✅ Ensure all product statuses are updated
-            products = Product.objects.all()
-            for product in products:
-                product.save()  # This will call update_status() before saving
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_allocation_job(request, job_id):
+    """Report the status and progress counters of an allocation job."""
+    try:
+        job = AllocationJob.objects.get(job_id=job_id)
+    except AllocationJob.DoesNotExist:
+        return Response({"error": "Allocation job not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(AllocationJobSerializer(job).data)
 
-        return Response(
-            {"message": "Orders allocated and stock status updated successfully"},
-            status=status.HTTP_200_OK,
-        )
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_allocation_job_results(request, job_id):
+    """
+    Page through an allocation job's results.
+    `?type=allocated` or `?type=skipped` restricts the list to one kind.
+    """
+    if not AllocationJob.objects.filter(job_id=job_id).exists():
+        return Response({"error": "Allocation job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    results = AllocationJobResult.objects.filter(job_id=job_id).order_by("id")
+    result_type = request.GET.get("type")
+    if result_type == "allocated":
+        results = results.filter(allocated=True)
+    elif result_type == "skipped":
+        results = results.filter(allocated=False)
+    elif result_type:
+        return Response({"error": "type must be 'allocated' or 'skipped'"}, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = StandardPagination()
+    page = paginator.paginate_queryset(results, request)
+    return paginator.get_paginated_response(AllocationJobResultSerializer(page, many=True).data)
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def dispatch_orders(request):
+    """
+    Batch pending orders into distance-banded truck trips and return the trip plan.
+    Accepts optional `band_width` (distance units per band) and `dry_run`.
+    """
+    dry_run = str(request.data.get("dry_run", "")).lower() in ("1", "true", "yes")
+    try:
+        band_width = float(request.data.get("band_width", DEFAULT_BAND_WIDTH))
+        result = run_dispatch(band_width, dry_run=dry_run)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    if dry_run:
+        result["dry_run"] = True
+    return Response(result, status=status.HTTP_200_OK)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_trips(request):
+    """List dispatched trips with the orders each one carries, newest first."""
+    trips = Trip.objects.prefetch_related("shipments__order__retailer").order_by("-created_at", "-trip_id")
+    employee_id = request.GET.get("employee")
+    if employee_id:
+        trips = trips.filter(employee_id=employee_id)
+
+    paginator = StandardPagination()
+    page = paginator.paginate_queryset(trips, request)
+    return paginator.get_paginated_response(TripSerializer(page, many=True).data)
+
 # ✅ Get Stock Data (Admin Only)
 @api_view(["GET"])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@conditional_on(Product, Category)
 def get_stock_data(request):
     if not request.user.is_staff:
         return Response({"detail": "Access denied. Admins only."}, status=status.HTTP_403_FORBIDDEN)
 
-    products = Product.objects.all()
+    products = (
+        Product.objects.select_related('category')
+        .annotate(available_to_promise=promisable_expression())
+        .order_by('product_id')
+    )
     serializer = ProductSerializer(products, many=True)
     return Response(serializer.data)
 
-# ✅ Get Category Stock Data (Accessible by Anyone)
+# ✅ Streaming Exports (Admin Only)
 @api_view(["GET"])
-def category_stock_data(request):
+@permission_classes([IsAuthenticated, IsAdminUser])
+def export_data(request, kind):
     """
-    Returns category names and product count for visualization.
+    Stream every row of `stock`, `orders` or `shipments` for reporting.
+
+    Query params: `output` (`ndjson` or `csv`), `gzip=true`, `since`/`until`
+    (ISO dates or datetimes on the export's date field) and `status`.
     """
+    if kind not in EXPORTS:
+        return Response({"error": f"Unknown export, use one of: {', '.join(EXPORTS)}"}, status=404)
+    output = request.GET.get("output", "ndjson")
+    if output not in EXPORT_FORMATS:
+        return Response({"error": f"output must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+
+    # Validated up front: once streaming has started the status code is sent
+    filters = {"status": request.GET.get("status") or None}
+    for param in ("since", "until"):
+        value = request.GET.get(param)
+        if not value:
+            continue
+        try:
+            moment = parse_datetime(value) or (parse_date(value) and datetime.combine(parse_date(value), time.min))
+        except ValueError:
+            moment = None
+        if not moment:
+            return Response({"error": f"{param} must be an ISO date or datetime"}, status=400)
+        filters[param] = timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+    compress = request.GET.get("gzip", "").lower() in ("1", "true")
+    filename = f"{kind}.{output}" + (".gz" if compress else "")
+    response = StreamingHttpResponse(
+        stream_export(kind, output, compress, **filters),
+        content_type="application/gzip" if compress else EXPORT_FORMATS[output],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+# ✅ Live Events (Managers: everything, Employees: their shipments)
+def _event_channels(request):
+    """Channels of the user authenticated by the JWT in the header or, for ``EventSource``, in ``?token=``."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get("token")
+    if not raw_token:
+        return None
     try:
-        categories = Category.objects.annotate(product_count=Count('products'))  # ✅ Count products per category
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+    return channels_for(user)
 
-        # Serialize the data
-        serialized_data = CategorySerializer(categories, many=True).data
 
-        # Attach product_count to each category in serialized data
-        for category in serialized_data:
-            category["value"] = next(
-                (cat["product_count"] for cat in categories.values("name", "product_count") if cat["name"] == category["name"]),
-                0
-            )
+@require_GET
+async def event_stream(request):
+    """
+    Stream order, product and shipment change events as Server-Sent Events.
+
+    Each event is `{"type", "action", "ids"}`; clients refetch what changed
+    instead of polling. Needs the ASGI app (`main.asgi:application`).
+    """
+    channels = await sync_to_async(_event_channels)(request)
+    if channels is None:
+        return JsonResponse({"error": "Authentication credentials were not provided or are invalid"}, status=401)
+    if not channels:
+        return JsonResponse({"error": "Only managers and employees receive live events"}, status=403)
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be held for the lifetime of the stream
+        return JsonResponse({"error": "Live events are only served by the ASGI app"}, status=501)
+
+    response = StreamingHttpResponse(sse_stream(get_broker().subscribe(*channels)), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Keep reverse proxies from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+# ✅ Get Category Stock Data (Accessible by Anyone)
+@api_view(["GET"])
+@conditional_on(Product, Category)
+def category_stock_data(request):
+    """
+    Returns category names, product count and available/promisable/required/shipped
+    units per category for visualization, from one aggregate query.
 
-        return Response({"success": True, "data": serialized_data})
+    Optional filters: ``search`` (category name), ``category`` (comma-separated
+    ids), ``status`` (only products with this status) and ``include_empty=false``.
+    The unfiltered breakdown is served from the dashboard cache, and polls
+    sending back the ETag get a 304 until a product or category changes.
+    """
+    filters = {}
+    if request.GET.get("search"):
+        filters["search"] = request.GET["search"]
+    if request.GET.get("category"):
+        try:
+            filters["category_ids"] = [int(value) for value in request.GET["category"].split(",")]
+        except ValueError:
+            return Response({"error": "category must be a comma-separated list of ids"}, status=400)
+    if request.GET.get("status"):
+        if request.GET["status"] not in PRODUCT_STATUSES:
+            return Response({"error": f"status must be one of: {', '.join(PRODUCT_STATUSES)}"}, status=400)
+        filters["product_status"] = request.GET["status"]
+    if request.GET.get("include_empty", "").lower() in ("false", "0"):
+        filters["include_empty"] = False
+
+    try:
+        return Response({"success": True, "data": get_category_stock(**filters)})
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
@@ -213,22 +425,20 @@ def store_qr_code(request):
         # Fetch or create the category
         category, _ = Category.objects.get_or_create(name=category_name)
 
-        # Fetch existing product or create a new one
+        # Fetch existing product or create a new one (save() sets the initial status)
         product, created = Product.objects.get_or_create(
             name=product_name, category=category,
-            defaults={"available_quantity": 0}  # Ensure no NULL values
+            defaults={"available_quantity": quantity}
         )
 
-        if created:
-            product.available_quantity = quantity  # Set quantity for new product
-        else:
+        if not created:
             # Update quantity safely using F() expression
             Product.objects.filter(product_id=product.product_id).update(
-                available_quantity=F('available_quantity') + quantity
+                available_quantity=F('available_quantity') + quantity, updated_at=timezone.now()
             )
-            product.refresh_from_db()  # Fetch updated values from DB
+            recompute_product_status([product.product_id])
 
-        product.save()  # Save to trigger signals
+        record_allocation_event('stock_increased', product=product, quantity=quantity)
 
         return Response({"message": "Product updated successfully"}, status=201)
 
@@ -238,22 +448,11 @@ def store_qr_code(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@conditional_on(Order, Employee, Retailer)
 def get_counts(request):
     try:
-        order_count = Order.objects.count()
-        pending_order_count = Order.objects.filter(status="pending").count()
-        employee_count = Employee.objects.count()
-        retailer_count = Retailer.objects.count()
-
-        return Response(
-            {
-                "orders_placed": order_count,
-                "pending_orders": pending_order_count,
-                "employees_available": employee_count,
-                "retailers_available": retailer_count,
-            },
-            status=status.HTTP_200_OK,
-        )
+        # Cache hit on the hot path until a commit bumps the order, employee or retailer version
+        return Response(get_dashboard_counts(), status=status.HTTP_200_OK)
     except Exception as e:
         return Response({"error": "Something went wrong"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -300,18 +499,34 @@ def get_logged_in_user(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated,IsEmployeeUser])
 def get_employee_shipments(request):
-    """Fetch shipments assigned to the logged-in employee."""
+    """
+    Fetch shipments assigned to the logged-in employee.
+    In-transit shipments come first, in planned delivery order, with their `stop_number`.
+    """
     
-    # Get the logged-in user's username
-    username = request.user.username  
+    # Fetch the logged-in employee's shipments (joins employee only, not auth_user)
+    shipments = list(Shipment.objects.filter(employee__user=request.user).select_related('order__retailer'))
 
-    # Fetch shipments where the employee's user has the same username
-    shipments = Shipment.objects.filter(employee__user__username=username)  
+    # Plan the delivery route of the current trip
+    route = route_for_shipments([shipment for shipment in shipments if shipment.status == 'in_transit'])
+    stop_numbers = {stop["shipment_id"]: stop["stop"] for stop in route}
 
     # Serialize the data
-    serializer = ShipmentSerializer(shipments, many=True)  
+    data = EmployeeShipmentSerializer(shipments, many=True).data
+    for item in data:
+        item["stop_number"] = stop_numbers.get(item["shipment_id"])
+    data = sorted(data, key=lambda item: (item["stop_number"] is None, item["stop_number"] or 0))
 
-    return Response(serializer.data)
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated,IsEmployeeUser])
+def get_employee_route(request):
+    """Ordered delivery stops for the logged-in employee's in-transit shipments."""
+    shipments = Shipment.objects.filter(employee__user=request.user, status='in_transit').select_related('order__retailer')
+    stops = route_for_shipments(shipments)
+    total_distance = sum(stop["leg_distance"] or 0 for stop in stops)
+    return Response({"stops": stops, "total_distance": round(total_distance, 3)})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated,IsEmployeeUser])
@@ -336,7 +551,7 @@ def update_shipment_status(request):
 
     # Find the shipment assigned to this employee
     try:
-        shipment = Shipment.objects.get(shipment_id=shipment_id, employee__user__username=username)
+        shipment = Shipment.objects.get(shipment_id=shipment_id, employee__user=request.user)
     except Shipment.DoesNotExist:
         return Response({"error": "Shipment not found or unauthorized"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -356,11 +571,12 @@ def get_employee_orders(request):
     # Get the logged-in user
     user = request.user  
 
-    # Find shipments assigned to this employee
-    shipments = Shipment.objects.filter(employee__user=user)
-
-    # Extract order details for those shipments
-    orders = [shipment.order for shipment in shipments]  
+    # Orders of the shipments assigned to this employee, in one query
+    orders = (
+        Order.objects.filter(shipment__employee__user=user)
+        .select_related('product', 'retailer')
+        .order_by('shipment__shipment_id')
+    )
 
     # Serialize the data
     serializer = OrderSerializer(orders, many=True)  
@@ -145,3 +145,44 @@ REST_FRAMEWORK = {
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # Change this to match your frontend URL
 ]
+
+# Queue AllocationEvent rows for the incremental allocator (`manage.py run_allocator`)
+INCREMENTAL_ALLOCATION = False
+
+# (latitude, longitude) of the warehouse; routes start from the nearest stop when unset
+WAREHOUSE_COORDINATES = None
+
+# Odoo XML-RPC endpoint; clients share up to ODOO_POOL_SIZE keep-alive connections per server
+ODOO_URL = "http://localhost:8069"
+ODOO_POOL_SIZE = 4
+ODOO_TIMEOUT = 30
+
+# Odoo outbox delivery (`manage.py run_odoo_outbox`): attempts before dead-lettering and
+# the exponential backoff between them, in seconds
+ODOO_OUTBOX_MAX_ATTEMPTS = 8
+ODOO_OUTBOX_BACKOFF_BASE = 30
+ODOO_OUTBOX_BACKOFF_MAX = 60 * 60
+
+# Local-memory cache for the dashboard aggregates; it is per process, so deployments
+# running several workers should switch to a shared backend such as FileBasedCache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ignyte',
+    }
+}
+
+# Seconds a cached dashboard aggregate lives even without invalidation
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Broker behind the live events stream (`/api/events/`): 'app.events.PostgresBroker' relays the
+# events of every process (workers, management commands) with LISTEN/NOTIFY, 'app.events.LocalBroker'
+# only those of the serving process; None picks PostgresBroker when the database is PostgreSQL
+EVENT_BROKER = None
+
+# Seconds between keep-alive comments on an idle live events stream
+EVENT_HEARTBEAT_SECONDS = 15
+
+# Quantity conflicts in `manage.py sync_odoo_delta` when both sides changed a product:
+# 'merge' applies both changes, 'local' keeps Ignyte's quantity, 'remote' takes Odoo's
+ODOO_QUANTITY_CONFLICT_POLICY = 'merge'
@@ -132,8 +132,8 @@ export default function EmployeePage({ params }: PageProps) {
         const mappedOrders: DeliveryOrder[] = data.map((shipment: any) => ({
           orderId: `SHIP-${shipment.shipment_id}`,
           orderName: `Order-${shipment.order}`,
-          phoneNumber: "N/A",
-          address: "N/A",
+          phoneNumber: shipment.retailer?.contact ?? "N/A",
+          address: shipment.retailer?.address ?? "N/A",
           isDelivered: shipment.status === "delivered",
           items: [`Order-${shipment.order}`],
           isCancelled: shipment.status === "cancelled",
@@ -2,6 +2,12 @@
 
 import React, { useEffect, useState, useCallback, useRef } from "react";
 import mqtt from "mqtt";
+import {
+  useLiveEvents,
+  LIVE_POLL_INTERVAL,
+  FALLBACK_POLL_INTERVAL,
+  type LiveEvent,
+} from "@/lib/liveEvents";
 import { Tabs, TabsList, TabsTrigger, TabsContent } from "@/components/ui/tabs";
 import { Card } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
@@ -446,19 +452,37 @@ const Dashboard: React.FC = () => {
     }
   }, [getAuthToken]);
 
+  // Order and shipment changes are pushed; polling only backs the stream up
+  const live = useLiveEvents(
+    ["order", "shipment"],
+    useCallback(
+      (event: LiveEvent) => {
+        if (event.type !== "shipment") fetchCounts();
+        if (event.type !== "order") fetchShipments();
+      },
+      [fetchCounts, fetchShipments]
+    )
+  );
+
   // Set up polling with cleanup
   useEffect(() => {
     fetchCounts();
     fetchShipments();
 
-    const countsIntervalId = setInterval(fetchCounts, 5000);
-    const shipmentsIntervalId = setInterval(fetchShipments, 30000);
+    const countsIntervalId = setInterval(
+      fetchCounts,
+      live ? LIVE_POLL_INTERVAL : FALLBACK_POLL_INTERVAL
+    );
+    const shipmentsIntervalId = setInterval(
+      fetchShipments,
+      live ? LIVE_POLL_INTERVAL : 30000
+    );
 
     return () => {
       clearInterval(countsIntervalId);
       clearInterval(shipmentsIntervalId);
     };
-  }, [fetchCounts, fetchShipments]);
+  }, [fetchCounts, fetchShipments, live]);
 
   // MQTT connection setup
   useEffect(() => {
@@ -1,5 +1,10 @@
 import React, { useEffect, useState } from "react";
 import { Card, CardHeader, CardTitle, CardContent } from "@/components/ui/card";
+import {
+  useLiveEvents,
+  LIVE_POLL_INTERVAL,
+  FALLBACK_POLL_INTERVAL,
+} from "@/lib/liveEvents";
 
 interface Order {
   order_id: number;
@@ -83,11 +88,17 @@ export const OrderDetails = () => {
     }
   };
 
+  // The employee's shipment changes are pushed; polling only backs the stream up
+  const live = useLiveEvents(["shipment"], () => fetchOrders());
+
   useEffect(() => {
     fetchOrders();
-    const interval = setInterval(fetchOrders, 5000); // Poll every 10 seconds
+    const interval = setInterval(
+      fetchOrders,
+      live ? LIVE_POLL_INTERVAL : FALLBACK_POLL_INTERVAL
+    );
     return () => clearInterval(interval);
-  }, []);
+  }, [live]);
 
   return (
     <Card className="bg-slate-900 border-slate-800">
@@ -1,4 +1,9 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useCallback } from "react";
+import {
+  useLiveEvents,
+  LIVE_POLL_INTERVAL,
+  FALLBACK_POLL_INTERVAL,
+} from "@/lib/liveEvents";
 
 const BASE_URL = "http://127.0.0.1:8000/api";
 
@@ -84,45 +89,51 @@ export const useStockData = () => {
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
 
-  useEffect(() => {
-    const fetchStockData = async () => {
-      try {
-        const response = await fetchWithAuth(`${BASE_URL}/stock/`);
-        if (!response.ok) throw new Error("Failed to fetch stock data");
-
-        const data = await response.json();
-        console.log("Fetched stock data:", data);
-
-        const formattedData = Array.isArray(data)
-          ? data.map((item) => ({
-              productName: item.name || "Unknown",
-              category: item.category || 0,
-              available: item.available_quantity || 0,
-              sold: item.total_shipped || 0,
-              demanded: item.total_required_quantity || 0,
-            }))
-          : [];
-
-        setStockData((prevStockData) =>
-          JSON.stringify(prevStockData) === JSON.stringify(formattedData)
-            ? prevStockData
-            : formattedData
-        );
-
-        setError(null);
-      } catch (error) {
-        console.error("Error fetching stock data:", error);
-        setError("Failed to load stock data");
-      } finally {
-        setLoading(false);
-      }
-    };
+  const fetchStockData = useCallback(async () => {
+    try {
+      const response = await fetchWithAuth(`${BASE_URL}/stock/`);
+      if (!response.ok) throw new Error("Failed to fetch stock data");
+
+      const data = await response.json();
+      console.log("Fetched stock data:", data);
+
+      const formattedData = Array.isArray(data)
+        ? data.map((item) => ({
+            productName: item.name || "Unknown",
+            category: item.category || 0,
+            available: item.available_quantity || 0,
+            sold: item.total_shipped || 0,
+            demanded: item.total_required_quantity || 0,
+          }))
+        : [];
+
+      setStockData((prevStockData) =>
+        JSON.stringify(prevStockData) === JSON.stringify(formattedData)
+          ? prevStockData
+          : formattedData
+      );
+
+      setError(null);
+    } catch (error) {
+      console.error("Error fetching stock data:", error);
+      setError("Failed to load stock data");
+    } finally {
+      setLoading(false);
+    }
+  }, []);
 
+  // Stock changes are pushed; polling only backs the stream up
+  const live = useLiveEvents(["product"], fetchStockData);
+
+  useEffect(() => {
     fetchStockData(); // Initial fetch
-    const interval = setInterval(fetchStockData, 5000); // Polling every 5 sec
+    const interval = setInterval(
+      fetchStockData,
+      live ? LIVE_POLL_INTERVAL : FALLBACK_POLL_INTERVAL
+    );
 
     return () => clearInterval(interval); // Cleanup on unmount
-  }, []);
+  }, [fetchStockData, live]);
 
   return { stockData, loading, error };
 };
@@ -132,55 +143,60 @@ export const useCategoryData = () => {
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
 
-  useEffect(() => {
-    const fetchCategoryData = async () => {
-      try {
-        const response = await fetchWithAuth(`${BASE_URL}/category-stock/`);
-        if (!response.ok) throw new Error("Failed to fetch category data");
-
-        const result = await response.json();
-        console.log("Fetched category data:", result);
-
-        const data = result.data || [];
-
-        const formattedData: CategoryItem[] = data.map(
-          (
-            category: {
-              category_id: number;
-              name: string;
-              product_count: number;
-            },
-            index: number
-          ) => ({
-            category_id: category.category_id,
-            name: category.name,
-            product_count: category.product_count,
-            fill: ["#0088FE", "#00C49F", "#FFBB28", "#FF8042", "#A28AFF"][
-              index % 5
-            ],
-          })
-        );
-
-        setCategoryData((prevCategoryData) =>
-          JSON.stringify(prevCategoryData) === JSON.stringify(formattedData)
-            ? prevCategoryData
-            : formattedData
-        );
-
-        setError(null);
-      } catch (error) {
-        console.error("Error fetching category data:", error);
-        setError("Failed to load category data");
-      } finally {
-        setLoading(false);
-      }
-    };
+  const fetchCategoryData = useCallback(async () => {
+    try {
+      const response = await fetchWithAuth(`${BASE_URL}/category-stock/`);
+      if (!response.ok) throw new Error("Failed to fetch category data");
+
+      const result = await response.json();
+      console.log("Fetched category data:", result);
+
+      const data = result.data || [];
+
+      const formattedData: CategoryItem[] = data.map(
+        (
+          category: {
+            category_id: number;
+            name: string;
+            product_count: number;
+          },
+          index: number
+        ) => ({
+          category_id: category.category_id,
+          name: category.name,
+          product_count: category.product_count,
+          fill: ["#0088FE", "#00C49F", "#FFBB28", "#FF8042", "#A28AFF"][
+            index % 5
+          ],
+        })
+      );
+
+      setCategoryData((prevCategoryData) =>
+        JSON.stringify(prevCategoryData) === JSON.stringify(formattedData)
+          ? prevCategoryData
+          : formattedData
+      );
+
+      setError(null);
+    } catch (error) {
+      console.error("Error fetching category data:", error);
+      setError("Failed to load category data");
+    } finally {
+      setLoading(false);
+    }
+  }, []);
 
+  const live = useLiveEvents(["product"], fetchCategoryData);
+
+  useEffect(() => {
     fetchCategoryData(); // Initial fetch
-    const interval = setInterval(fetchCategoryData, 5000); // Polling every 5 sec
+    const interval = setInterval(
+      fetchCategoryData,
+      live ? LIVE_POLL_INTERVAL : FALLBACK_POLL_INTERVAL
+    );
 
     return () => clearInterval(interval); // Cleanup on unmount
-  }, []);
+  }, [fetchCategoryData, live]);
 
   return { categoryData, loading, error };
 };
\ No newline at end of file
@@ -0,0 +1,67 @@
+import { useEffect, useRef, useState } from "react";
+
+const EVENTS_URL = "http://127.0.0.1:8000/api/events/";
+
+// How often dashboards still poll: a safety net while a shared live stream is up, the only source of updates otherwise
+export const LIVE_POLL_INTERVAL = 60000;
+export const FALLBACK_POLL_INTERVAL = 5000;
+
+export type LiveEventType = "order" | "product" | "shipment";
+
+export interface LiveEvent {
+  type: LiveEventType | "resync";
+  action?: "created" | "updated" | "deleted";
+  ids?: number[] | null;
+}
+
+/**
+ * Listens to the backend's change events (Server-Sent Events on `/api/events/`).
+ * `onEvent` is called for each event of `types`, and with a `resync` event when
+ * events may have been missed (reconnects, slow client), after which callers reload.
+ * Returns whether the stream is open and carries the changes of every backend
+ * process, so callers keep polling when it is not (no ASGI server, or a broker
+ * that misses the changes made by the background workers).
+ */
+export const useLiveEvents = (
+  types: LiveEventType[],
+  onEvent: (event: LiveEvent) => void
+): boolean => {
+  const [connected, setConnected] = useState(false);
+  const [shared, setShared] = useState(false);
+  const handler = useRef(onEvent);
+  const typeKey = types.join(",");
+
+  useEffect(() => {
+    handler.current = onEvent;
+  }, [onEvent]);
+
+  useEffect(() => {
+    const token = localStorage.getItem("access_token");
+    if (!token || typeof EventSource === "undefined") return;
+
+    const source = new EventSource(`${EVENTS_URL}?token=${encodeURIComponent(token)}`);
+    const listener = (message: MessageEvent) => handler.current(JSON.parse(message.data));
+    [...typeKey.split(","), "resync"].forEach((type) => source.addEventListener(type, listener));
+    source.addEventListener("ready", (message: MessageEvent) =>
+      setShared(Boolean(JSON.parse(message.data).shared))
+    );
+
+    let opened = false;
+    source.onopen = () => {
+      setConnected(true);
+      // Changes made while reconnecting were not streamed
+      if (opened) handler.current({ type: "resync" });
+      opened = true;
+    };
+    // The browser reconnects by itself; a refused stream (401, 501) stays closed
+    source.onerror = () => setConnected(false);
+
+    return () => {
+      source.close();
+      setConnected(false);
+      setShared(false);
+    };
+  }, [typeKey]);
+
+  return connected && shared;
+};